@@ -0,0 +1,134 @@
+"""Helpers for the Almond rPi to execute the action chunks replied by the inference server.
+
+Observations sent with `encode_observation(..., reply="chunk")` are answered with a whole chunk of actions
+(see `almond_protocol.encode_action_chunk`), which the robot executes locally, one action per control step.
+A new observation only needs to be sent when the current chunk is about to run out, along with the
+observations of the previous control steps which the policy uses (see `ActionChunkExecutor.make_request`).
+"""
+
+from collections import deque
+
+import numpy as np
+from almond_protocol import encode_observation
+from torch import Tensor
+
+from lerobot.common.policies.act.modeling_act import ACTTemporalEnsembler
+
+
+class ActionChunkExecutor:
+    """Executes the action chunks received from the inference server, one action per control step.
+
+    When a new chunk is received, the actions scheduled before the next control step are dropped (they are
+    outdated by the round trip to the server). The remaining ones either replace the current chunk, or are
+    averaged with it using ACT's temporal ensembling when `temporal_ensemble_coeff` is set (see
+    `ACTTemporalEnsembler`).
+
+    `needs_refill` tells when to send the next observation, so that the next chunk is received before the
+    current one runs out. The observation of every control step should be given to `observe`, so that the
+    requests carry the observations of the last `n_obs_steps` consecutive steps, as the policy was trained on.
+    """
+
+    def __init__(
+        self,
+        fps: int,
+        refill_margin_s: float = 0.2,
+        temporal_ensemble_coeff: float | None = None,
+        chunk_size: int | None = None,
+        n_obs_steps: int = 1,
+    ):
+        self.period_s = 1 / fps
+        self.n_obs_steps = n_obs_steps
+        self.refill_margin_s = refill_margin_s
+        self.ensembler = None
+        if temporal_ensemble_coeff is not None:
+            self.ensembler = ACTTemporalEnsembler(temporal_ensemble_coeff, chunk_size)
+        self.reset()
+
+    def reset(self):
+        """This should be called whenever the episode is reset."""
+        self.actions: Tensor | None = None
+        # time at which the next action is to be executed
+        self.next_timestamp: float | None = None
+        self.pending_seq: int | None = None
+        # (state, pictures) observations of the last control steps, oldest first
+        self.observations: deque[tuple[np.ndarray, dict[str, np.ndarray]]] = deque(maxlen=self.n_obs_steps)
+        # number of control steps observed since the start of the episode
+        self.num_steps = 0
+        self.episode_start = True
+        if self.ensembler is not None:
+            self.ensembler.reset()
+
+    @property
+    def num_remaining(self) -> int:
+        """Number of actions left to execute."""
+        if self.ensembler is not None:
+            return len(self.ensembler)
+        return 0 if self.actions is None else len(self.actions)
+
+    def observe(self, state: np.ndarray, pictures: dict[str, np.ndarray]):
+        """Records the observation of the current control step."""
+        self.observations.append((state, pictures))
+        self.num_steps += 1
+
+    def make_request(self, seq: int, timestamp: float, jpeg_quality: int | None = None) -> bytes:
+        """Encodes the request for a new chunk, made of the last observations given to `observe`, and records
+        that it is sent. `timestamp` is the time at which the last observation was captured.
+
+        The number of the current control step is sent along, so that the server only observes the steps which
+        were not in the previous request (see `almond_inference.run_chunk_inference`).
+        """
+        *history, (state, pictures) = self.observations
+        message = encode_observation(
+            seq,
+            state,
+            pictures,
+            jpeg_quality,
+            timestamp=timestamp,
+            reply="chunk",
+            history=history,
+            step=self.num_steps - 1,
+            episode_start=self.episode_start,
+        )
+        self.episode_start = False
+        self.request_sent(seq)
+        return message
+
+    def request_sent(self, seq: int):
+        """Records that the observation number `seq` was sent to get a new chunk."""
+        self.pending_seq = seq
+
+    def needs_refill(self) -> bool:
+        """Whether a new observation should be sent to the server."""
+        return self.pending_seq is None and self.num_remaining * self.period_s <= self.refill_margin_s
+
+    def add_chunk(self, seq: int, actions: Tensor, timestamps: Tensor, now: float):
+        """Adds the (num_actions, action_dim) chunk replied to the observation number `seq`.
+
+        `timestamps` are the times at which each action is to be executed, on the same clock as `now`.
+        """
+        if seq == self.pending_seq:
+            self.pending_seq = None
+        if self.num_remaining == 0:
+            # the previous chunk ran out (or this is the first one), so the next control step is now
+            self.next_timestamp = now
+
+        # drop the actions scheduled before the next control step
+        keep = timestamps >= self.next_timestamp - self.period_s / 2
+        actions = actions[keep]
+        if len(actions) == 0:
+            return
+
+        if self.ensembler is not None:
+            self.ensembler.add_chunk(actions.unsqueeze(0))
+        else:
+            self.actions = actions
+
+    def next_action(self) -> Tensor | None:
+        """Returns the action to execute at this control step, or None if there is no action left."""
+        if self.num_remaining == 0:
+            return None
+        self.next_timestamp += self.period_s
+        if self.ensembler is not None:
+            return self.ensembler.pop().squeeze(0)
+        action, self.actions = self.actions[0], self.actions[1:]
+        return action
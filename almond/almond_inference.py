@@ -1,22 +1,37 @@
-from argparse import ArgumentParser
 import asyncio
+import bisect
+import contextlib
+import functools
 import json
 import os
 import socket
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 
 import numpy as np
 import torch
-from torch import Tensor
 import websockets
+from almond_protocol import (
+    MessageDecoder,
+    ProtocolError,
+    encode_action,
+    encode_action_chunk,
+    observation_steps,
+)
+from torch import Tensor
 from websockets import WebSocketClientProtocol
 
 from lerobot.common.policies.act.modeling_act import ACTPolicy
 from lerobot.common.policies.diffusion.modeling_diffusion import DiffusionPolicy
+from lerobot.common.policies.exported import ExportedPolicy
 
 DEFAULT_DEVICE = "mps"
 
 client: WebSocketClientProtocol = None
 
+
 async def connect():
     global client
     uri = "ws://raspberrypi.local:8000"
@@ -30,22 +45,60 @@ async def connect():
 
     print("Connected to Almond rPi")
 
-def run_inference(policy: ACTPolicy | DiffusionPolicy, pictures: dict[str, list], positions: list[float]) -> list[float]:
-    # Read the follower state and access the frames from the cameras
+
+class LatencyHistograms:
+    """Histograms of the latency of each stage of the inference pipeline, in milliseconds."""
+
+    # "queue" is the time an observation waits on the server before its processing starts
+    STAGES = ["queue", "decode", "preprocess", "model", "send"]
+    BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf")]
+
+    def __init__(self):
+        self.counts = {stage: [0] * len(self.BUCKETS_MS) for stage in self.STAGES}
+        self.totals_ms = dict.fromkeys(self.STAGES, 0.0)
+        self.num_dropped = 0
+        self.num_malformed = 0
+
+    def record(self, stage: str, seconds: float):
+        latency_ms = seconds * 1000
+        self.counts[stage][bisect.bisect_left(self.BUCKETS_MS, latency_ms)] += 1
+        self.totals_ms[stage] += latency_ms
+
+    def summary(self) -> str:
+        lines = [
+            f"dropped stale observations: {self.num_dropped}, malformed observations: {self.num_malformed}"
+        ]
+        for stage in self.STAGES:
+            num_samples = sum(self.counts[stage])
+            if num_samples == 0:
+                continue
+            buckets = " ".join(
+                f"<={bound:g}ms:{count}" if bound != float("inf") else f">{self.BUCKETS_MS[-2]:g}ms:{count}"
+                for bound, count in zip(self.BUCKETS_MS, self.counts[stage], strict=True)
+                if count > 0
+            )
+            lines.append(f"{stage:>10}: mean {self.totals_ms[stage] / num_samples:.1f}ms | {buckets}")
+        return "\n".join(lines)
+
+
+def preprocess(pictures: dict[str, Tensor], positions: Tensor) -> dict[str, Tensor]:
+    # Read the follower state and access the frames from the cameras (uint8, channel first)
     observation: dict[str, Tensor] = {}
-    observation["observation.state"] = torch.as_tensor(positions)
+    observation["observation.state"] = positions
     for name, picture in pictures.items():
-        observation[f"observation.images.{name}"] = torch.from_numpy(np.array(picture))
+        observation[f"observation.images.{name}"] = picture
 
-    # Convert to pytorch format: chann`el first and float32 in [0,1]
-    # with batch dimension
+    # Move to the device (asynchronously when the tensors are pinned), then
+    # convert to pytorch format: float32 in [0,1] with batch dimension
     for name in observation:
+        observation[name] = observation[name].to(DEFAULT_DEVICE, non_blocking=True)
         if "image" in name:
             observation[name] = observation[name].type(torch.float32) / 255
-            observation[name] = observation[name].permute(2, 0, 1).contiguous()
         observation[name] = observation[name].unsqueeze(0)
-        observation[name] = observation[name].to(DEFAULT_DEVICE)
+    return observation
+
 
+def run_inference(policy: ACTPolicy | DiffusionPolicy, observation: dict[str, Tensor]) -> Tensor:
     # Compute the next action with the policy
     # based on the current observation
     action = policy.select_action(observation)
@@ -55,38 +108,222 @@ def run_inference(policy: ACTPolicy | DiffusionPolicy, pictures: dict[str, list]
     if DEFAULT_DEVICE != "cpu":
         action = action.to("cpu")
     # Order the robot to move
-    return list(action.numpy())
+    return action
+
+
+class ObservedSteps:
+    """Number of the last control step of the episode whose observation was given to the policy, so that the
+    history carried by each chunk request is only observed once (see `run_chunk_inference`)."""
+
+    def __init__(self):
+        self.last_step: int | None = None
+
+
+def run_chunk_inference(
+    policy: ACTPolicy | DiffusionPolicy,
+    observations: list[dict[str, Tensor]],
+    meta: dict,
+    observed: ObservedSteps,
+) -> Tensor:
+    # The request carries the observations of the last control steps (oldest first), since the robot only
+    # sends an observation every few steps. The policy keeps its history between requests and only observes
+    # the steps newer than the last one it has seen. It is reset when an episode starts, or when steps are
+    # missing since the previous request (e.g. a dropped observation), and then observes the whole history.
+    step = meta.get("step")
+    if hasattr(policy, "observe"):
+        first_step = None if step is None else step - len(observations) + 1
+        if (
+            step is None
+            or meta.get("episode_start", False)
+            or observed.last_step is None
+            or step <= observed.last_step
+            or first_step > observed.last_step + 1
+        ):
+            policy.reset()
+        else:
+            observations = observations[observed.last_step - first_step + 1 :]
+        for observation in observations[:-1]:
+            policy.observe(observation)
+    observed.last_step = step
+    # Compute the whole chunk of actions predicted from the current observation,
+    # which the robot executes on its own (see `almond_client.ActionChunkExecutor`)
+    actions = policy.select_action_chunk(observations[-1])
+    # Remove batch dimension and move to cpu, if not already the case
+    return actions.squeeze(0).to("cpu")
+
+
+def process(
+    policy: ACTPolicy | DiffusionPolicy,
+    decoder: MessageDecoder,
+    data: bytes | str,
+    histograms: LatencyHistograms,
+    fps: int,
+    observed: ObservedSteps,
+) -> bytes | str:
+    """Decodes an observation, runs the policy on it and encodes the reply. Runs in the inference thread.
+
+    `observed` tracks the control steps already given to the policy in the current session."""
+    start = time.perf_counter()
+    if isinstance(data, bytes):
+        # binary observation (see `almond_protocol`), with a binary reply
+        seq, meta, arrays, images = decoder.decode(data)
+        steps = observation_steps(meta, arrays, images)
+    else:
+        # legacy JSON observation, where pictures are nested lists (height, width, channel)
+        try:
+            data = json.loads(data)
+            seq, meta = data.get("seq"), {}
+            pictures = {
+                name: torch.from_numpy(np.array(picture, dtype=np.uint8)).permute(2, 0, 1)
+                for name, picture in data["pictures"].items()
+            }
+            positions = torch.as_tensor(data["positions"], dtype=torch.float32)
+        except (ValueError, TypeError, KeyError, AttributeError, RuntimeError) as e:
+            raise ProtocolError(f"Malformed JSON observation: {e!r}") from e
+        steps = [(positions, pictures)]
+    decoded = time.perf_counter()
+    histograms.record("decode", decoded - start)
 
-async def inference_loop(model: str, model_path: str):
+    observations = [preprocess(pictures, positions) for positions, pictures in steps]
+    preprocessed = time.perf_counter()
+    histograms.record("preprocess", preprocessed - decoded)
+
+    if meta.get("reply") == "chunk":
+        actions = run_chunk_inference(policy, observations, meta, observed)
+        histograms.record("model", time.perf_counter() - preprocessed)
+        # the i-th action of the chunk is to be executed i control steps after the observation
+        timestamps = meta.get("timestamp", 0.0) + np.arange(len(actions)) / fps
+        return encode_action_chunk(seq, actions.numpy(), timestamps)
+
+    inference = run_inference(policy, observations[-1])
+    histograms.record("model", time.perf_counter() - preprocessed)
+
+    if isinstance(data, dict):
+        return json.dumps({"seq": seq, "inference": inference.tolist()})
+    return encode_action(seq, inference.numpy())
+
+
+async def serve(
+    connection,
+    handle: Callable[[bytes | str], bytes | str],
+    histograms: LatencyHistograms,
+    log_every: int = 0,
+):
+    """Replies to each observation received on `connection` with `handle(observation)`, which runs in a single
+    thread (the decoder buffers and the policy state are not thread safe). Malformed observations (for which
+    `handle` raises a `ProtocolError`) are counted and skipped without a reply.
+
+    Only the newest observation is kept: when inference is slower than the rPi, older observations are
+    dropped instead of queuing up, so that the robot never acts on stale frames.
+    """
+    latest: tuple[bytes | str, float] | None = None
+    new_observation = asyncio.Event()
+    connection_closed = False
+
+    async def receive_loop():
+        nonlocal latest, connection_closed
+        try:
+            async for data in connection:
+                if latest is not None:
+                    histograms.num_dropped += 1
+                latest = (data, time.perf_counter())
+                new_observation.set()
+        finally:
+            connection_closed = True
+            new_observation.set()
+
+    receive_task = asyncio.create_task(receive_loop())
+    executor = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+    num_replies = 0
+    try:
+        while True:
+            # the state is checked before waiting, since the event may have been set (and cleared) while the
+            # previous observation was processed
+            if latest is None:
+                if connection_closed:
+                    break
+                await new_observation.wait()
+                new_observation.clear()
+                continue
+            (data, received_at), latest = latest, None
+            histograms.record("queue", time.perf_counter() - received_at)
+
+            try:
+                reply = await loop.run_in_executor(executor, handle, data)
+            except ProtocolError as e:
+                histograms.num_malformed += 1
+                print(f"Skipping malformed observation: {e}")
+                continue
+
+            start = time.perf_counter()
+            await connection.send(reply)
+            histograms.record("send", time.perf_counter() - start)
+
+            num_replies += 1
+            if log_every > 0 and num_replies % log_every == 0:
+                print(histograms.summary())
+    finally:
+        receive_task.cancel()
+        executor.shutdown(wait=False)
+        # re-raise the errors of the receive loop (e.g. an abnormal closure), which would otherwise be lost
+        with contextlib.suppress(asyncio.CancelledError):
+            await receive_task
+
+
+async def inference_loop(model: str, model_path: str, log_every: int, fps: int):
     if model == "act":
         policy = ACTPolicy.from_pretrained(model_path)
     elif model == "diffusion":
         policy = DiffusionPolicy.from_pretrained(model_path)
+    elif model == "exported":
+        # artifact of `lerobot/scripts/export_policy.py`, run without the training stack
+        policy = ExportedPolicy.load(model_path, device=DEFAULT_DEVICE)
 
-    policy.to(DEFAULT_DEVICE)
+    if model != "exported":
+        policy.to(DEFAULT_DEVICE)
 
-    async for data in client:
-        data = json.loads(data)
+    # pinned buffers are only useful for asynchronous host to GPU copies
+    decoder = MessageDecoder(pin_memory=torch.cuda.is_available())
+    histograms = LatencyHistograms()
+    handle = functools.partial(
+        process, policy, decoder, histograms=histograms, fps=fps, observed=ObservedSteps()
+    )
+    await serve(client, handle, histograms, log_every)
 
-        inference = run_inference(policy, data["pictures"], data["positions"])
-        client.send(json.dumps({"inference": inference}))
 
-async def main(model: str, model_path: str):
+async def main(model: str, model_path: str, log_every: int, fps: int):
     if not os.path.isfile(model_path):
         print(f"Model file not found: {model_path}")
         exit(1)
 
     await connect()
-    await inference_loop(model, model_path)
+    await inference_loop(model, model_path, log_every, fps)
+
 
 if __name__ == "__main__":
-    parser = ArgumentParser(
-        prog="Almond Intellignece",
-        description="Control Almond rPi with AI"
-    )
+    parser = ArgumentParser(prog="Almond Intellignece", description="Control Almond rPi with AI")
 
-    parser.add_argument("--model", type=str.lower, choices=["act", "diffusion"], required=True, help="Model to use for inference.")
+    parser.add_argument(
+        "--model",
+        type=str.lower,
+        choices=["act", "diffusion", "exported"],
+        required=True,
+        help="Model to use for inference.",
+    )
     parser.add_argument("--model_path", required=True, help="Path to the model file.")
+    parser.add_argument(
+        "--fps",
+        type=int,
+        default=30,
+        help="Control frequency of the robot, used to timestamp the actions of the chunks.",
+    )
+    parser.add_argument(
+        "--log_every",
+        type=int,
+        default=100,
+        help="Print the latency histograms every N replies (0 to disable).",
+    )
     args = vars(parser.parse_args())
 
-    asyncio.run(main(**args))
\ No newline at end of file
+    asyncio.run(main(**args))
@@ -0,0 +1,271 @@
+"""Binary framing used between the Almond rPi and the inference server.
+
+Every message is laid out as:
+- `MAGIC` (4 bytes) and the length of the header (little endian uint32),
+- a JSON header with the sequence number of the message, optional metadata and, for each array, its shape,
+  dtype, encoding ("raw" or "jpeg"), offset and size in the payload,
+- the payload, i.e. the raw (or JPEG-compressed) bytes of all the arrays, concatenated.
+
+Observations contain the float32 state vector of the follower arms under the "state" key, and one uint8
+(height, width, channel) picture per camera under the "images" key. Their metadata can contain the time at
+which they were captured ("timestamp"), and whether the reply should be a single action or an action chunk
+("reply": "action" or "chunk"). An observation can also carry the history of the previous control steps, which
+policies with several observation steps (e.g. Diffusion) need when they are only queried every few steps: the
+states of the `num_steps` steps (oldest first) are then stacked in a (num_steps, state_dim) "state" array, and
+the picture of camera `name` at step `i` is named "{i}/{name}" (see `observation_steps`). The metadata then
+also carries the number of the current control step since the start of the episode ("step"), and whether the
+message is the first one of the episode ("episode_start"), so that the server only observes the steps it has not
+seen yet. Actions contain the float32 action vector under the "action" key, while action
+chunks contain the (num_actions, action_dim) float32 actions under the "actions" key and the float64 time at
+which each action should be executed under the "timestamps" key.
+"""
+
+import json
+import struct
+import warnings
+
+import numpy as np
+import torch
+from torch import Tensor
+
+MAGIC = b"ALMD"
+PREFIX = struct.Struct("<4sI")
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def encode_message(
+    seq: int,
+    arrays: dict[str, np.ndarray],
+    images: dict[str, bytes | np.ndarray] | None = None,
+    image_shapes: dict[str, tuple] | None = None,
+    meta: dict | None = None,
+) -> bytes:
+    """Encodes the arrays into a binary message.
+
+    `images` maps camera names to either a uint8 (height, width, channel) array, sent raw, or the bytes of a
+    JPEG-compressed picture, in which case its (height, width, channel) shape must be given in `image_shapes`.
+    """
+    header = {"seq": seq, "meta": meta or {}, "arrays": {}, "images": {}}
+    chunks = []
+    offset = 0
+
+    def add_chunk(entries: dict, name: str, data: bytes, shape: tuple, dtype: str, encoding: str):
+        nonlocal offset
+        entries[name] = {
+            "shape": list(shape),
+            "dtype": dtype,
+            "encoding": encoding,
+            "offset": offset,
+            "nbytes": len(data),
+        }
+        chunks.append(data)
+        offset += len(data)
+
+    for name, array in arrays.items():
+        # `tobytes` always returns the bytes in C order
+        array = np.asarray(array)
+        add_chunk(header["arrays"], name, array.tobytes(), array.shape, array.dtype.str, "raw")
+
+    for name, image in (images or {}).items():
+        if isinstance(image, np.ndarray):
+            image = np.asarray(image, dtype=np.uint8)
+            add_chunk(header["images"], name, image.tobytes(), image.shape, "|u1", "raw")
+        else:
+            add_chunk(header["images"], name, bytes(image), image_shapes[name], "|u1", "jpeg")
+
+    header = json.dumps(header).encode()
+    return b"".join([PREFIX.pack(MAGIC, len(header)), header, *chunks])
+
+
+def encode_observation(
+    seq: int,
+    state: np.ndarray,
+    pictures: dict[str, np.ndarray],
+    jpeg_quality: int | None = None,
+    timestamp: float | None = None,
+    reply: str = "action",
+    history: list[tuple[np.ndarray, dict[str, np.ndarray]]] | None = None,
+    step: int | None = None,
+    episode_start: bool = False,
+) -> bytes:
+    """Encodes an observation, as sent by the rPi. Pictures are JPEG-compressed when `jpeg_quality` is set.
+
+    `history` holds the (state, pictures) observations of the previous control steps, oldest first. `step` is
+    the number of the current control step since the start of the episode, and `episode_start` tells that this
+    is the first observation sent in the episode.
+    """
+    state = np.asarray(state, dtype=np.float32)
+    meta = {"reply": reply}
+    if timestamp is not None:
+        meta["timestamp"] = timestamp
+    if step is not None:
+        meta["step"] = step
+    if episode_start:
+        meta["episode_start"] = True
+    if history:
+        steps = [*history, (state, pictures)]
+        meta["num_steps"] = len(steps)
+        state = np.stack([np.asarray(step_state, dtype=np.float32) for step_state, _ in steps])
+        pictures = {
+            f"{i}/{name}": picture
+            for i, (_, step_pictures) in enumerate(steps)
+            for name, picture in step_pictures.items()
+        }
+    if jpeg_quality is None:
+        return encode_message(seq, {"state": state}, pictures, meta=meta)
+
+    import cv2
+
+    images, image_shapes = {}, {}
+    for name, picture in pictures.items():
+        # pictures are RGB, while opencv expects BGR
+        picture_bgr = cv2.cvtColor(picture, cv2.COLOR_RGB2BGR)
+        ok, encoded = cv2.imencode(".jpg", picture_bgr, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+        if not ok:
+            raise ProtocolError(f"Failed to encode the picture of camera '{name}' as JPEG.")
+        images[name] = encoded.tobytes()
+        image_shapes[name] = picture.shape
+    return encode_message(seq, {"state": state}, images, image_shapes, meta=meta)
+
+
+def observation_steps(
+    meta: dict, arrays: dict[str, Tensor], images: dict[str, Tensor]
+) -> list[tuple[Tensor, dict[str, Tensor]]]:
+    """Returns the (state, pictures) of each step of a decoded observation, oldest first, the last one being
+    the current step."""
+    if "num_steps" not in meta:
+        return [(arrays["state"], images)]
+    steps = [(state, {}) for state in arrays["state"]]
+    for key, image in images.items():
+        step, name = key.split("/", 1)
+        steps[int(step)][1][name] = image
+    return steps
+
+
+def encode_action(seq: int, action: np.ndarray) -> bytes:
+    """Encodes the reply of the inference server to the observation number `seq`."""
+    return encode_message(seq, {"action": np.asarray(action, dtype=np.float32)})
+
+
+def encode_action_chunk(seq: int, actions: np.ndarray, timestamps: np.ndarray) -> bytes:
+    """Encodes the chunk of actions replied to the observation number `seq`, with their execution times."""
+    arrays = {
+        "actions": np.asarray(actions, dtype=np.float32),
+        "timestamps": np.asarray(timestamps, dtype=np.float64),
+    }
+    return encode_message(seq, arrays, meta={"reply": "chunk"})
+
+
+def _view(message: bytes, entry: dict) -> Tensor:
+    dtype = np.dtype(entry["dtype"])
+    array = np.frombuffer(
+        message, dtype=dtype, count=entry["nbytes"] // dtype.itemsize, offset=entry["offset"]
+    )
+    with warnings.catch_warnings():
+        # the view on the (read-only) message is never written to
+        warnings.filterwarnings("ignore", message="The given NumPy array is not writable")
+        return torch.from_numpy(array).view(entry["shape"])
+
+
+def _check_header(header) -> None:
+    """Raises a `ProtocolError` if the decoded JSON header does not follow the schema written by `encode_message`."""
+    if not isinstance(header, dict):
+        raise ProtocolError("Message header is not a JSON object.")
+    if not isinstance(header.get("seq"), int):
+        raise ProtocolError("Message header has no integer 'seq'.")
+    if not isinstance(header.get("meta", {}), dict):
+        raise ProtocolError("Message header 'meta' is not an object.")
+    for section in ("arrays", "images"):
+        entries = header.get(section)
+        if not isinstance(entries, dict):
+            raise ProtocolError(f"Message header has no '{section}' object.")
+        for name, entry in entries.items():
+            if not isinstance(entry, dict):
+                raise ProtocolError(f"Entry '{name}' of '{section}' is not an object.")
+            for key in ("offset", "nbytes"):
+                if not isinstance(entry.get(key), int) or entry[key] < 0:
+                    raise ProtocolError(f"Entry '{name}' of '{section}' has no valid '{key}'.")
+            shape = entry.get("shape")
+            if not isinstance(shape, list) or not all(isinstance(size, int) and size >= 0 for size in shape):
+                raise ProtocolError(f"Entry '{name}' of '{section}' has no valid 'shape'.")
+            if not isinstance(entry.get("encoding"), str):
+                raise ProtocolError(f"Entry '{name}' of '{section}' has no 'encoding'.")
+            try:
+                dtype = np.dtype(entry["dtype"]) if isinstance(entry.get("dtype"), str) else None
+            except TypeError:
+                dtype = None
+            if dtype is None or dtype.hasobject:
+                raise ProtocolError(f"Entry '{name}' of '{section}' has no valid 'dtype'.")
+            if entry["encoding"] == "raw" and entry["nbytes"] != int(np.prod(shape)) * dtype.itemsize:
+                raise ProtocolError(f"Entry '{name}' of '{section}' does not match its shape and dtype.")
+            if section == "images" and len(shape) != 3:
+                raise ProtocolError(f"Picture '{name}' is not (height, width, channel).")
+
+
+class MessageDecoder:
+    """Decodes binary messages into tensors without copying the raw arrays out of the message.
+
+    When `pin_memory` is set, the arrays and pictures are copied once into page-locked buffers reused across
+    messages, so that they can be transferred to the GPU asynchronously. Note that the returned tensors are then
+    overwritten by the next decoded message.
+
+    Pictures are returned as uint8 tensors in channel first format (channel, height, width).
+    """
+
+    def __init__(self, pin_memory: bool = False):
+        self.pin_memory = pin_memory
+        self._buffers: dict[str, Tensor] = {}
+
+    def decode(self, message: bytes) -> tuple[int, dict, dict[str, Tensor], dict[str, Tensor]]:
+        """Returns the sequence number, the metadata, the arrays and the pictures of the message."""
+        if len(message) < PREFIX.size:
+            raise ProtocolError("Message is too short.")
+        magic, header_len = PREFIX.unpack_from(message)
+        if magic != MAGIC:
+            raise ProtocolError(f"Unexpected magic bytes {magic!r}.")
+        if len(message) < PREFIX.size + header_len:
+            raise ProtocolError("Message is truncated.")
+        try:
+            header = json.loads(message[PREFIX.size : PREFIX.size + header_len])
+        except ValueError as e:
+            raise ProtocolError("Message header is not valid JSON.") from e
+        _check_header(header)
+        payload_offset = PREFIX.size + header_len
+
+        def locate(entry: dict) -> dict:
+            entry = dict(entry, offset=payload_offset + entry["offset"])
+            if entry["offset"] + entry["nbytes"] > len(message):
+                raise ProtocolError("Message is truncated.")
+            return entry
+
+        arrays = {}
+        for name, entry in header["arrays"].items():
+            arrays[name] = self._pin(f"arrays.{name}", _view(message, locate(entry)))
+
+        images = {}
+        for name, entry in header["images"].items():
+            entry = locate(entry)
+            if entry["encoding"] == "jpeg":
+                from torchvision.io import decode_jpeg
+
+                image = decode_jpeg(_view(message, dict(entry, shape=[entry["nbytes"]])))
+            elif entry["encoding"] == "raw":
+                image = _view(message, entry).permute(2, 0, 1)
+            else:
+                raise ProtocolError(f"Unknown encoding '{entry['encoding']}' for camera '{name}'.")
+            images[name] = self._pin(f"images.{name}", image)
+
+        return header["seq"], header.get("meta", {}), arrays, images
+
+    def _pin(self, key: str, tensor: Tensor) -> Tensor:
+        if not self.pin_memory:
+            return tensor
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.shape != tensor.shape or buffer.dtype != tensor.dtype:
+            buffer = torch.empty(tensor.shape, dtype=tensor.dtype).pin_memory()
+            self._buffers[key] = buffer
+        buffer.copy_(tensor)
+        return buffer
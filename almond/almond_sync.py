@@ -0,0 +1,372 @@
+"""Content-addressed, resumable and delta sync of a dataset directory to the training server.
+
+Every file of the dataset (mp4 videos, arrow shards, json metadata...) is described in a manifest by its size, its
+sha256 and the sha256 of each of its `CHUNK_SIZE` chunks. The manifest of the remote copy is computed on the
+server by this same script (run as `python3 almond_sync.py manifest <root>`), so that only the missing or
+different chunks are sent:
+- a file already present on the server under another path (same sha256) is copied remotely instead of being sent,
+  and so is a file identical to another one sent in the same sync, once the latter is written,
+- the chunks are written in place over several SFTP channels opened on the same SSH transport,
+- after a dropped connection, the sync reconnects and resumes, since the chunks already written are up to date,
+- the hashes of the written files are verified on the server, and mismatching chunks are sent again.
+
+Hashes are cached next to the files (in `CACHE_NAME`) and only recomputed for files whose size or modification
+time changed.
+
+With `delete=True`, the files of the server which are not in the local directory are removed (after the remote
+copies, so that a renamed file is copied rather than sent again). Only whole directories can be synced this way.
+
+`LocalRemote` syncs to a local directory, and can be used instead of `SSHRemote` to test the sync without a
+server. A remote is not closed by `sync`, so that one `SSHRemote` (and its SSH connection) can be shared by
+concurrent syncs.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 4 * 1024 * 1024
+CACHE_NAME = ".almond_manifest.json"
+
+
+def remote_script_name() -> str:
+    """Name of this script on the server, which changes with its content so that an upload never overwrites the
+    script while another sync runs it."""
+    with open(__file__, "rb") as f:
+        return f".almond_sync-{hashlib.sha256(f.read()).hexdigest()[:16]}.py"
+
+
+class SyncError(RuntimeError):
+    pass
+
+
+# MARK: Manifests
+
+
+def hash_file(path: str) -> dict:
+    file_hash = hashlib.sha256()
+    chunks = []
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            file_hash.update(chunk)
+            chunks.append(hashlib.sha256(chunk).hexdigest())
+            size += len(chunk)
+    return {"size": size, "sha256": file_hash.hexdigest(), "chunks": chunks}
+
+
+def build_manifest(root: str, paths: list[str] | None = None, use_cache: bool = True) -> dict[str, dict]:
+    """Returns the manifest of the files under `root` (or only of `paths`), keyed by their path relative to `root`."""
+    cache_path = os.path.join(root, CACHE_NAME)
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+
+    if paths is None:
+        paths = []
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename != CACHE_NAME:
+                    paths.append(os.path.relpath(os.path.join(dirpath, filename), root))
+
+    manifest = {}
+    for path in sorted(paths):
+        full_path = os.path.join(root, path)
+        if not os.path.isfile(full_path):
+            continue
+        stat = os.stat(full_path)
+        cached = cache.get(path)
+        if (
+            use_cache
+            and cached is not None
+            and cached["size"] == stat.st_size
+            and cached["mtime_ns"] == stat.st_mtime_ns
+        ):
+            entry = cached
+        else:
+            entry = dict(hash_file(full_path), mtime_ns=stat.st_mtime_ns)
+        cache[path] = manifest[path] = entry
+
+    if os.path.isdir(root):
+        with open(cache_path, "w") as f:
+            json.dump(cache, f)
+
+    return {path: {k: v for k, v in entry.items() if k != "mtime_ns"} for path, entry in manifest.items()}
+
+
+def diff_manifests(
+    local: dict[str, dict], remote: dict[str, dict]
+) -> tuple[dict, list[tuple[str, str]], list[tuple[str, int]], list[tuple[str, str]]]:
+    """Returns the files to create or resize on the server (path to size), the files to copy on the server
+    (source, destination), the chunks to send (path, chunk index), and the files to copy on the server once the
+    chunks are sent (source, destination), which are identical to a file sent in the same sync."""
+    remote_by_hash = {entry["sha256"]: path for path, entry in remote.items()}
+    sent_by_hash = {}
+
+    sizes, copies, chunks, deferred_copies = {}, [], [], []
+    for path, entry in local.items():
+        remote_entry = remote.get(path)
+        if remote_entry is not None and remote_entry["sha256"] == entry["sha256"]:
+            continue
+        if remote_entry is None and entry["sha256"] in remote_by_hash:
+            copies.append((remote_by_hash[entry["sha256"]], path))
+            continue
+        if remote_entry is None and entry["sha256"] in sent_by_hash:
+            deferred_copies.append((sent_by_hash[entry["sha256"]], path))
+            continue
+        sent_by_hash.setdefault(entry["sha256"], path)
+
+        sizes[path] = entry["size"]
+        remote_chunks = remote_entry["chunks"] if remote_entry is not None else []
+        for i, chunk_hash in enumerate(entry["chunks"]):
+            if i >= len(remote_chunks) or remote_chunks[i] != chunk_hash:
+                chunks.append((path, i))
+
+    return sizes, copies, chunks, deferred_copies
+
+
+# MARK: Server side
+
+
+def prepare_files(
+    root: str, sizes: dict[str, int], copies: list[tuple[str, str]], deletes: list[str] | tuple = ()
+):
+    for src, dst in copies:
+        os.makedirs(os.path.dirname(os.path.join(root, dst)), exist_ok=True)
+        shutil.copyfile(os.path.join(root, src), os.path.join(root, dst))
+
+    for path in deletes:
+        os.remove(os.path.join(root, path))
+
+    for path, size in sizes.items():
+        full_path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "ab") as f:
+            f.truncate(size)
+
+
+def verify_files(root: str, expected: dict[str, dict]) -> list[tuple[str, int]]:
+    """Rehashes the files and returns the chunks which do not match the `expected` manifest."""
+    actual = build_manifest(root, list(expected), use_cache=False)
+    mismatches = []
+    for path, entry in expected.items():
+        actual_chunks = actual.get(path, {"chunks": []})["chunks"]
+        for i, chunk_hash in enumerate(entry["chunks"]):
+            if i >= len(actual_chunks) or actual_chunks[i] != chunk_hash:
+                mismatches.append((path, i))
+    return mismatches
+
+
+def agent_main():
+    parser = argparse.ArgumentParser(description="Server side of the Almond dataset sync.")
+    parser.add_argument("command", choices=["manifest", "prepare", "verify"])
+    parser.add_argument("root")
+    args = parser.parse_args()
+
+    if args.command == "manifest":
+        result = build_manifest(args.root) if os.path.isdir(args.root) else {}
+    elif args.command == "prepare":
+        request = json.load(sys.stdin)
+        prepare_files(args.root, request["sizes"], request["copies"], request.get("deletes", []))
+        result = {}
+    else:
+        result = verify_files(args.root, json.load(sys.stdin))
+
+    json.dump(result, sys.stdout)
+
+
+# MARK: Remotes
+
+
+class LocalRemote:
+    """Stand-in for `SSHRemote` syncing to a local directory, e.g. to test the sync."""
+
+    retryable_errors = (OSError, EOFError)
+
+    def run(self, command: str, root: str, data: dict | None = None):
+        stdin = json.dumps(data).encode() if data is not None else b""
+        result = subprocess.run(
+            [sys.executable, __file__, command, root], input=stdin, capture_output=True, check=True
+        )
+        return json.loads(result.stdout)
+
+    def write_chunk(self, path: str, offset: int, data: bytes):
+        with open(path, "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+
+    def close(self):
+        pass
+
+
+class SSHRemote:
+    """Runs this script on the server through `ssh_client`, and writes chunks over a pool of SFTP channels, one per
+    concurrent write. It can be shared by concurrent syncs, and is closed by its owner.
+
+    Remote paths are relative to the home directory of the server user.
+    """
+
+    def __init__(self, ssh_client):
+        import paramiko
+
+        self.retryable_errors = (OSError, EOFError, paramiko.SSHException)
+        self.transport = ssh_client.get_transport()
+        self.ssh_client = ssh_client
+        self.idle_sftp_clients = []
+        self.lock = threading.Lock()
+
+        self.script = remote_script_name()
+        sftp = self.acquire_sftp()
+        try:
+            sftp.stat(self.script)
+        except FileNotFoundError:
+            # upload under a temporary name first, so that the script is never seen partially written
+            tmp_name = f"{self.script}.{uuid.uuid4().hex}.tmp"
+            sftp.put(__file__, tmp_name)
+            sftp.posix_rename(tmp_name, self.script)
+        self.release_sftp(sftp)
+
+    def acquire_sftp(self):
+        import paramiko
+
+        with self.lock:
+            if self.idle_sftp_clients:
+                return self.idle_sftp_clients.pop()
+        return paramiko.SFTPClient.from_transport(self.transport)
+
+    def release_sftp(self, sftp):
+        with self.lock:
+            self.idle_sftp_clients.append(sftp)
+
+    def run(self, command: str, root: str, data: dict | None = None):
+        stdin, stdout, stderr = self.ssh_client.exec_command(f"python3 {self.script} {command} '{root}'")
+        if data is not None:
+            stdin.write(json.dumps(data))
+        stdin.channel.shutdown_write()
+        output = stdout.read()
+        if stdout.channel.recv_exit_status() != 0:
+            raise SyncError(f"Remote command '{command}' failed: {stderr.read().decode()}")
+        return json.loads(output)
+
+    def write_chunk(self, path: str, offset: int, data: bytes):
+        sftp = self.acquire_sftp()
+        try:
+            with sftp.open(path, "r+b") as f:
+                # don't wait for the acknowledgement of each 32KB write request before sending the next one
+                f.set_pipelined(True)
+                f.seek(offset)
+                f.write(data)
+        except BaseException:
+            # the channel may be broken, it is not reused
+            sftp.close()
+            raise
+        self.release_sftp(sftp)
+
+    def close(self):
+        with self.lock:
+            for sftp in self.idle_sftp_clients:
+                sftp.close()
+            self.idle_sftp_clients.clear()
+
+
+# MARK: Sync
+
+
+def read_chunk(path: str, index: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(index * CHUNK_SIZE)
+        return f.read(CHUNK_SIZE)
+
+
+def sync_once(
+    remote, local_root: str, remote_root: str, local_manifest: dict, num_channels: int, delete: bool = False
+) -> int:
+    remote_manifest = remote.run("manifest", remote_root)
+    sizes, copies, chunks, deferred_copies = diff_manifests(local_manifest, remote_manifest)
+    deletes = [path for path in remote_manifest if path not in local_manifest] if delete else []
+    if not sizes and not copies and not deletes:
+        return 0
+
+    remote.run("prepare", remote_root, {"sizes": sizes, "copies": copies, "deletes": deletes})
+
+    total = len(chunks)
+    sent = 0
+    num_bytes = 0
+    lock = threading.Lock()
+
+    def send(path: str, index: int):
+        nonlocal sent, num_bytes
+        data = read_chunk(os.path.join(local_root, path), index)
+        remote.write_chunk(f"{remote_root}/{path}", index * CHUNK_SIZE, data)
+        with lock:
+            sent += 1
+            num_bytes += len(data)
+            print(f"\rSent {sent}/{total} chunks ({num_bytes / 1e6:.1f} MB)", end="")
+
+    # send the chunks of each file in order, files being spread over the channels
+    with ThreadPoolExecutor(max_workers=num_channels) as executor:
+        for future in [executor.submit(send, path, index) for path, index in chunks]:
+            future.result()
+    if total > 0:
+        print()
+    if deferred_copies:
+        remote.run("prepare", remote_root, {"sizes": {}, "copies": deferred_copies})
+
+    copied = [dst for _, dst in copies + deferred_copies]
+    expected = {path: local_manifest[path] for path in list(sizes) + copied}
+    mismatches = remote.run("verify", remote_root, expected)
+    if mismatches:
+        raise SyncError(f"{len(mismatches)} chunks do not match after the transfer.")
+    return num_bytes
+
+
+def sync(
+    local_root: str,
+    remote_root: str,
+    connect,
+    num_channels: int = 4,
+    max_attempts: int = 5,
+    paths: list[str] | None = None,
+    delete: bool = False,
+) -> int:
+    """Syncs `local_root` (or only the given `paths` relative to it) to `remote_root` and returns the number of bytes
+    sent. With `delete`, the files of `remote_root` which are not in `local_root` are removed.
+
+    `connect` returns a remote (e.g. `SSHRemote` or `LocalRemote`), which is not closed by the sync. It is called
+    again to reconnect when the connection is dropped, or when the verification fails, and the sync resumes from
+    the chunks already sent.
+    """
+    if delete and paths is not None:
+        raise ValueError("`delete` can only be used to sync a whole directory, without `paths`.")
+    local_manifest = build_manifest(local_root, paths)
+    start = time.perf_counter()
+
+    num_bytes = 0
+    for attempt in range(max_attempts):
+        remote = connect()
+        try:
+            num_bytes += sync_once(remote, local_root, remote_root, local_manifest, num_channels, delete)
+            break
+        except (SyncError, *remote.retryable_errors) as e:
+            if attempt == max_attempts - 1:
+                raise
+            print(f"\nSync interrupted ({e!r}), resuming...")
+            time.sleep(min(2**attempt, 30))
+
+    print(
+        f"Synced {len(local_manifest)} files ({num_bytes / 1e6:.1f} MB sent) in {time.perf_counter() - start:.1f}s"
+    )
+    return num_bytes
+
+
+if __name__ == "__main__":
+    agent_main()
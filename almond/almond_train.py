@@ -1,7 +1,9 @@
 import argparse
 import requests
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import paramiko
 from paramiko import SSHClient
@@ -9,6 +11,7 @@ from paramiko.ssh_exception import NoValidConnectionsError
 from scp import SCPClient
 
 import env
+from almond_sync import SSHRemote, build_manifest, sync
 
 DIR_PATH = os.path.dirname(__file__)
 USERNAME = "shawnptl8"
@@ -47,6 +50,12 @@ ssh_client = None
 scp_client = None
 
 current_scp_file = None
+connect_lock = threading.Lock()
+# shared by the concurrent syncs of the provisioning stages
+sync_remote = None
+
+# duration of each provisioning stage, in seconds
+stage_times = {}
 
 def scp_progress(filename: bytes, size: int, sent: int):
     global current_scp_file
@@ -62,7 +71,7 @@ def scp_progress(filename: bytes, size: int, sent: int):
     percent = int(sent / size * 100)
     print(f"\r{filename}: {percent}% complete", end="")
 
-def exec_remote_command(command: str | list[str], single: bool = False) -> int:
+def exec_remote_command(command: str | list[str], single: bool = False, check: bool = False) -> int:
     assert ssh_client is not None, "SSH client not connected."
 
     if isinstance(command, str):
@@ -71,12 +80,27 @@ def exec_remote_command(command: str | list[str], single: bool = False) -> int:
         command = [" && ".join(command)]
 
     for cmd in command:
-        _, stdout, _ = ssh_client.exec_command(cmd)
+        _, stdout, stderr = ssh_client.exec_command(cmd)
         exit_status = stdout.channel.recv_exit_status()
 
         if exit_status != 0:
+            if check:
+                raise RuntimeError(f"Remote command failed with exit status {exit_status}: {stderr.read().decode()}")
             return exit_status
 
+    return 0
+
+def timed_stage(name: str, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    stage_times[name] = time.perf_counter() - start
+    print(f"{name} done in {stage_times[name]:.1f}s")
+    return result
+
+def print_stage_times():
+    for name, duration in stage_times.items():
+        print(f"{name}: {duration:.1f}s")
+
 def transfer_file(local_path: str, remote_path: str):
     assert scp_client is not None, "SCP client not connected."
     global current_scp_file
@@ -180,7 +204,8 @@ def connect_to_server():
 
     while ssh_client.get_transport() is None or not ssh_client.get_transport().is_active():
         try:
-            ssh_client.connect(hostname=ip, port=port, username=user)
+            # compress the traffic, which mostly benefits the json and arrow files of the datasets
+            ssh_client.connect(hostname=ip, port=port, username=user, compress=True)
         except NoValidConnectionsError as e:
             time.sleep(5)
 
@@ -239,7 +264,7 @@ def create_server():
 # MARK: Clone & setup repo
 
 def clone_repo():
-    exec_remote_command(f"git clone https://{env.GITHUB_TOKEN}@github.com/Almond-Mart/almond-intelligence.git")
+    exec_remote_command(f"[ -d almond-intelligence ] || git clone https://{env.GITHUB_TOKEN}@github.com/Almond-Mart/almond-intelligence.git", check=True)
 
 def install_miniconda():
     exec_remote_command(
@@ -251,10 +276,52 @@ def install_miniconda():
             "source ~/miniconda3/bin/activate",
             "conda init --all"
         ],
-        single=True
+        single=True,
+        check=True
     )
 
-def install_dependencies():
+def ship_environment(env_archive: str):
+    """Sends a prebuilt environment (a conda-pack or venv tarball built for the server) and unpacks it in
+    ~/envs/lerobot, instead of resolving the dependencies on the server.
+
+    The archive is stored on the server under its sha256, so it is only sent and unpacked once per server, and
+    `sync` does not send it again when its content did not change.
+    """
+    archive_dir, archive_name = os.path.split(os.path.abspath(env_archive))
+    env_hash = build_manifest(archive_dir, [archive_name])[archive_name]["sha256"][:16]
+    remote_dir = f"envs/{env_hash}"
+
+    if exec_remote_command(f"[ -f {remote_dir}/.ready ]") != 0:
+        sync(archive_dir, remote_dir, connect_remote, paths=[archive_name])
+        exec_remote_command(
+            [
+                f"mkdir -p {remote_dir}/env",
+                f"tar -xzf {remote_dir}/{archive_name} -C {remote_dir}/env",
+                # conda-pack archives need their prefixes fixed, venv archives don't have this script
+                f"if [ -x {remote_dir}/env/bin/conda-unpack ]; then {remote_dir}/env/bin/conda-unpack; fi",
+                f"touch {remote_dir}/.ready",
+            ],
+            single=True,
+            check=True
+        )
+
+    exec_remote_command(f"ln -sfn ~/{remote_dir}/env ~/envs/lerobot", check=True)
+
+def install_dependencies(prebuilt_env: bool = False):
+    if prebuilt_env:
+        # the dependencies are already in the prebuilt environment, only the repo needs to be installed
+        exec_remote_command(
+            [
+                "cd almond-intelligence",
+                "source ~/envs/lerobot/bin/activate",
+                "pip install --no-deps -e .",
+                f"wandb login {env.WANDB_API_KEY}"
+            ],
+            single=True,
+            check=True
+        )
+        return
+
     exec_remote_command(
         [
             "cd almond-intelligence",
@@ -264,17 +331,59 @@ def install_dependencies():
             "pip install -e .",
             f"wandb login {env.WANDB_API_KEY}"
         ],
-        single=True
+        single=True,
+        check=True
     )
 
-def transfer_training_data():
-    exec_remote_command(f"mkdir -p ~/almond-intelligence/data/{USERNAME}")
+def connect_remote() -> SSHRemote:
+    global sync_remote
+    # stages run concurrently and share the connection: it is only replaced once it is dropped (so it never changes
+    # under a running command), and by one stage only
+    with connect_lock:
+        if ssh_client is None or ssh_client.get_transport() is None or not ssh_client.get_transport().is_active():
+            connect_to_server()
+        if sync_remote is None or sync_remote.ssh_client is not ssh_client:
+            if sync_remote is not None:
+                sync_remote.close()
+            sync_remote = SSHRemote(ssh_client)
+        return sync_remote
 
-    transfer_file(
+def transfer_training_data():
+    # only the chunks missing on the server are sent, over several channels, and the transfer resumes after a
+    # dropped connection (see almond_sync.py)
+    sync(
         os.path.join(DIR_PATH, "data", USERNAME, dataset),
-        os.path.join("~", "almond-intelligence", "data", USERNAME)
+        f"almond-intelligence/data/{USERNAME}/{dataset}",
+        connect_remote,
+        # the episodes removed from the local dataset are removed from the server copy as well
+        delete=True,
     )
 
+def provision_server(env_archive: str | None = None):
+    """Runs the provisioning stages concurrently: the repo is cloned while miniconda is installed (or the prebuilt
+    environment is sent), and the training data is transferred while the dependencies are installed."""
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        clone = executor.submit(timed_stage, "clone_repo", clone_repo)
+        if env_archive is not None:
+            environment = executor.submit(timed_stage, "ship_environment", ship_environment, env_archive)
+        else:
+            environment = executor.submit(timed_stage, "install_miniconda", install_miniconda)
+
+        def clone_then_transfer():
+            # the data is transferred inside the repo, which must be cloned first
+            clone.result()
+            timed_stage("transfer_training_data", transfer_training_data)
+
+        transfer = executor.submit(clone_then_transfer)
+
+        clone.result()
+        environment.result()
+        timed_stage("install_dependencies", install_dependencies, env_archive is not None)
+        transfer.result()
+
+    if sync_remote is not None:
+        sync_remote.close()
+
 def main():
     datasets = available_datasets()
 
@@ -283,6 +392,7 @@ def main():
 
     start_parser = subparsers.add_parser("start", help="Start training service.")
     start_parser.add_argument("--dataset", choices=datasets, help="Dataset to use for training.")
+    start_parser.add_argument("--env-archive", help="Prebuilt environment tarball (conda-pack or venv built for the server) to use instead of installing the dependencies.")
 
     train_parser = subparsers.add_parser("train", help="Train model.")
 
@@ -294,15 +404,11 @@ def main():
         global dataset
         dataset = args.dataset
 
-        create_server()
-
-        print("Cloning repo and installing miniconda")
-        clone_repo()
-        install_miniconda()
+        timed_stage("create_server", create_server)
 
-        print("Installing dependencies and transferring training data")
-        install_dependencies()
-        transfer_training_data()
+        print("Provisioning server")
+        timed_stage("provision_server", provision_server, args.env_archive)
+        print_stage_times()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Assess the trade-off between speed and accuracy of few-step sampling for Diffusion Policy.
+
+For each inference noise scheduler and number of denoising steps, this reports the latency of generating a
+chunk of actions (for a batch of one observation, as when controlling a robot), and the mean squared error of
+the (normalized) actions with respect to the ones sampled with all the `num_train_timesteps` steps of the
+training noise scheduler, starting from the same noise and observations (taken from the dataset).
+
+Example:
+```
+python benchmarks/diffusion/run_sampling_benchmark.py \
+    -p lerobot/diffusion_pusht \
+    --schedulers DDIM DPMSolver \
+    --num-steps 2 5 10 20 \
+    device=cpu
+```
+"""
+
+import argparse
+import dataclasses
+import statistics
+
+import pandas as pd
+import torch
+
+from lerobot.common.datasets.factory import make_dataset
+from lerobot.common.policies.diffusion.modeling_diffusion import DiffusionModel
+from lerobot.common.policies.factory import make_policy
+from lerobot.common.utils.benchmark import TimeBenchmark
+from lerobot.common.utils.utils import get_safe_torch_device, init_hydra_config, seeded_context
+from lerobot.scripts.eval import get_pretrained_policy_path
+
+
+def make_observations(hydra_cfg, policy, num_samples: int, device: torch.device) -> dict[str, torch.Tensor]:
+    """Normalized observations of `num_samples` random frames of the dataset, as expected by `DiffusionModel`."""
+    dataset = make_dataset(hydra_cfg)
+    with seeded_context(0):
+        indices = torch.randperm(len(dataset))[:num_samples].tolist()
+    batch = torch.utils.data.default_collate([dataset[i] for i in indices])
+    batch = {k: v.to(device) for k, v in batch.items() if k in policy.config.input_shapes}
+    batch = policy.normalize_inputs(batch)
+    if len(policy.expected_image_keys) > 0:
+        batch["observation.images"] = torch.stack([batch[k] for k in policy.expected_image_keys], dim=-4)
+    return batch
+
+
+def sample_actions(model: DiffusionModel, batch: dict[str, torch.Tensor], seed: int = 0) -> torch.Tensor:
+    # the same seed gives the same initial noise to all the schedulers
+    with seeded_context(seed), torch.inference_mode():
+        return model.generate_actions(batch)
+
+
+def measure_latency(model: DiffusionModel, batch: dict[str, torch.Tensor], num_repeats: int) -> float:
+    """Median time (in ms) to generate a chunk of actions for the first observation of `batch`."""
+    batch = {k: v[:1] for k, v in batch.items()}
+    device = next(model.parameters()).device
+    sample_actions(model, batch)  # warmup
+    benchmark = TimeBenchmark()
+    latencies = []
+    for _ in range(num_repeats):
+        with benchmark:
+            sample_actions(model, batch)
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+        latencies.append(benchmark.result_ms)
+    return statistics.median(latencies)
+
+
+def main(
+    pretrained_policy_name_or_path: str,
+    schedulers: list[str],
+    num_steps: list[int],
+    num_samples: int,
+    num_repeats: int,
+    output_path: str | None = None,
+    config_overrides: list[str] | None = None,
+):
+    pretrained_policy_path = get_pretrained_policy_path(pretrained_policy_name_or_path)
+    hydra_cfg = init_hydra_config(str(pretrained_policy_path / "config.yaml"), config_overrides)
+    if hydra_cfg.policy.name != "diffusion":
+        raise ValueError(f"Only diffusion policies can be benchmarked, got {hydra_cfg.policy.name}.")
+    device = get_safe_torch_device(hydra_cfg.device, log=True)
+    policy = make_policy(hydra_cfg=hydra_cfg, pretrained_policy_name_or_path=str(pretrained_policy_path))
+    policy.eval().to(device)
+    batch = make_observations(hydra_cfg, policy, num_samples, device)
+
+    def make_model(scheduler: str, steps: int) -> DiffusionModel:
+        config = dataclasses.replace(
+            policy.config, inference_noise_scheduler_type=scheduler, num_inference_steps=steps
+        )
+        model = DiffusionModel(config)
+        model.load_state_dict(policy.diffusion.state_dict())
+        return model.eval().to(device)
+
+    reference_model = make_model(policy.config.noise_scheduler_type, policy.config.num_train_timesteps)
+    reference_actions = sample_actions(reference_model, batch)
+    results = [
+        {
+            "scheduler": policy.config.noise_scheduler_type,
+            "num_steps": policy.config.num_train_timesteps,
+            "latency_ms": measure_latency(reference_model, batch, num_repeats),
+            "action_mse": 0.0,
+        }
+    ]
+    for scheduler in schedulers:
+        for steps in num_steps:
+            model = make_model(scheduler, steps)
+            actions = sample_actions(model, batch)
+            results.append(
+                {
+                    "scheduler": scheduler,
+                    "num_steps": steps,
+                    "latency_ms": measure_latency(model, batch, num_repeats),
+                    "action_mse": torch.nn.functional.mse_loss(actions, reference_actions).item(),
+                }
+            )
+            print(results[-1])
+
+    df = pd.DataFrame(results)
+    print(df.to_string(index=False, float_format="%.4f"))
+    if output_path is not None:
+        df.to_csv(output_path, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "-p",
+        "--pretrained-policy-name-or-path",
+        required=True,
+        help="Either the repo ID of a diffusion policy hosted on the Hub or a path to a directory containing "
+        "weights saved using `Policy.save_pretrained`.",
+    )
+    parser.add_argument(
+        "--schedulers",
+        nargs="*",
+        default=["DDIM", "DPMSolver"],
+        help="Inference noise schedulers to benchmark.",
+    )
+    parser.add_argument(
+        "--num-steps",
+        type=int,
+        nargs="*",
+        default=[1, 2, 5, 10, 20],
+        help="Numbers of denoising steps to benchmark.",
+    )
+    parser.add_argument(
+        "--num-samples",
+        type=int,
+        default=32,
+        help="Number of observations of the dataset used to compute the mean squared error.",
+    )
+    parser.add_argument(
+        "--num-repeats",
+        type=int,
+        default=10,
+        help="Number of chunks generated to measure the latency.",
+    )
+    parser.add_argument("--output-path", help="Optional path of a csv file where the results are saved.")
+    parser.add_argument(
+        "overrides",
+        nargs="*",
+        help="Any key=value arguments to override config values (use dots for.nested=overrides)",
+    )
+    args = parser.parse_args()
+    main(
+        pretrained_policy_name_or_path=args.pretrained_policy_name_or_path,
+        schedulers=args.schedulers,
+        num_steps=args.num_steps,
+        num_samples=args.num_samples,
+        num_repeats=args.num_repeats,
+        output_path=args.output_path,
+        config_overrides=args.overrides,
+    )
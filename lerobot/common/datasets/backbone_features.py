@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Feature maps of the camera frames of a dataset, precomputed with a frozen vision backbone.
+
+When the vision backbone of a policy is frozen, its output only depends on the frame, so it can be computed
+once for the whole dataset (see `lerobot/scripts/precompute_backbone_features.py`) instead of at every
+training step. The feature maps of each camera are stored in a `.npy` file, which is memory-mapped when
+training, so that neither the video decoding nor the backbone are on the critical path of a training step.
+
+Layout of a features directory:
+```
+info.json                       # shapes and dtypes of the features, number of frames of the dataset
+observation.images.top.npy      # (num_frames, *feature_shape) feature maps of the "observation.images.top" camera
+...
+```
+
+A `LeRobotDataset` with backbone features (see `LeRobotDataset.backbone_features`) returns the feature maps of
+a camera under `backbone_features_key(camera_key)`, instead of its frames.
+"""
+
+import copy
+import json
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import torch
+import tqdm
+from torch import Tensor
+
+INFO_FILE = "info.json"
+
+
+def backbone_features_key(image_key: str) -> str:
+    """Key of the backbone features of the images of `image_key` (e.g. "observation.images.top")."""
+    return f"{image_key}.backbone_features"
+
+
+class BackboneFeatures:
+    """Read-only access to the backbone features saved by `compute_backbone_features`.
+
+    The `.npy` files are memory-mapped lazily, so that each DataLoader worker maps them on its own.
+    """
+
+    def __init__(self, features_dir: str | Path):
+        self.features_dir = Path(features_dir)
+        with open(self.features_dir / INFO_FILE) as f:
+            self.info = json.load(f)
+        self._arrays = {}
+
+    @property
+    def keys(self) -> list[str]:
+        """The camera keys which have backbone features."""
+        return list(self.info["features"])
+
+    @property
+    def num_frames(self) -> int:
+        return self.info["num_frames"]
+
+    def __getstate__(self):
+        # don't pickle the memory-mapped arrays (which would copy their content) when sent to the workers
+        state = self.__dict__.copy()
+        state["_arrays"] = {}
+        return state
+
+    def array(self, key: str) -> np.ndarray:
+        if key not in self._arrays:
+            self._arrays[key] = np.load(self.features_dir / f"{key}.npy", mmap_mode="r")
+        return self._arrays[key]
+
+    def get(self, key: str, indices: np.ndarray) -> Tensor:
+        """Returns the float32 features of the frames at the dataset `indices` (of any shape) for `key`."""
+        indices = np.asarray(indices)
+        features = self.array(key)[indices.reshape(-1)]
+        return torch.from_numpy(features.astype(np.float32)).reshape(*indices.shape, *features.shape[1:])
+
+
+def compute_backbone_features(
+    dataset,
+    encode: Callable[[str, Tensor], Tensor],
+    features_dir: str | Path,
+    batch_size: int = 64,
+    num_workers: int = 0,
+    dtype: str = "float16",
+    device: str | torch.device = "cpu",
+) -> BackboneFeatures:
+    """Computes the backbone features of all the camera frames of `dataset` and saves them in `features_dir`.
+
+    Args:
+        dataset: The `LeRobotDataset`. Its `delta_timestamps` and `image_transforms` are ignored.
+        encode: Function of the camera key and a (batch, C, H, W) batch of its frames (float32 in [0, 1], on
+            `device`), which returns their (batch, *feature_shape) backbone features.
+        features_dir: Directory where the features are saved.
+        dtype: The dtype in which the features are saved. "float16" halves the size of the files.
+    """
+    features_dir = Path(features_dir)
+    features_dir.mkdir(parents=True, exist_ok=True)
+
+    # one item per frame, without augmentations
+    frames = copy.copy(dataset)
+    frames.delta_timestamps = None
+    frames.image_transforms = None
+    frames.backbone_features = None
+    dataloader = torch.utils.data.DataLoader(
+        frames, batch_size=batch_size, num_workers=num_workers, shuffle=False
+    )
+
+    arrays = {}
+    start = 0
+    with torch.no_grad():
+        for batch in tqdm.tqdm(dataloader, desc="Computing backbone features"):
+            for key in dataset.camera_keys:
+                features = encode(key, batch[key].to(device)).cpu().numpy()
+                if key not in arrays:
+                    arrays[key] = np.lib.format.open_memmap(
+                        features_dir / f"{key}.npy",
+                        mode="w+",
+                        dtype=np.dtype(dtype),
+                        shape=(len(frames), *features.shape[1:]),
+                    )
+                arrays[key][start : start + len(features)] = features
+            start += len(batch["index"])
+
+    info = {
+        "num_frames": len(frames),
+        "features": {key: {"shape": list(array.shape[1:]), "dtype": dtype} for key, array in arrays.items()},
+    }
+    for array in arrays.values():
+        array.flush()
+    with open(features_dir / INFO_FILE, "w") as f:
+        json.dump(info, f, indent=4)
+    return BackboneFeatures(features_dir)
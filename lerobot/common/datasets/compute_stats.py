@@ -13,9 +13,6 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from copy import deepcopy
-from math import ceil
-
 import einops
 import torch
 import tqdm
@@ -44,122 +41,174 @@ def get_stats_einops_patterns(dataset, num_workers=0):
         if key == "language_instruction":
             continue
 
-        # sanity check that tensors are not float64
-        assert batch[key].dtype != torch.float64
+        stats_patterns[key] = get_einops_pattern(key, feats_type, batch[key])
 
-        if isinstance(feats_type, (VideoFrame, Image)):
-            # sanity check that images are channel first
-            _, c, h, w = batch[key].shape
-            assert c < h and c < w, f"expect channel first images, but instead {batch[key].shape}"
+    return stats_patterns
 
-            # sanity check that images are float32 in range [0,1]
-            assert batch[key].dtype == torch.float32, f"expect torch.float32, but instead {batch[key].dtype=}"
-            assert batch[key].max() <= 1, f"expect pixels lower than 1, but instead {batch[key].max()=}"
-            assert batch[key].min() >= 0, f"expect pixels greater than 1, but instead {batch[key].min()=}"
 
-            stats_patterns[key] = "b c h w -> c 1 1"
-        elif batch[key].ndim == 2:
-            stats_patterns[key] = "b c -> c "
-        elif batch[key].ndim == 1:
-            stats_patterns[key] = "b -> 1"
-        else:
-            raise ValueError(f"{key}, {feats_type}, {batch[key].shape}")
+def get_einops_pattern(key, feats_type, batch_values: torch.Tensor) -> str:
+    """Returns the einops pattern used to aggregate a batch of values of a data key (see
+    `get_stats_einops_patterns`).
+    """
+    # sanity check that tensors are not float64
+    assert batch_values.dtype != torch.float64
+
+    if isinstance(feats_type, (VideoFrame, Image)):
+        # sanity check that images are channel first
+        _, c, h, w = batch_values.shape
+        assert c < h and c < w, f"expect channel first images, but instead {batch_values.shape}"
+
+        # sanity check that images are float32 in range [0,1]
+        assert batch_values.dtype == torch.float32, f"expect torch.float32, but instead {batch_values.dtype=}"
+        assert batch_values.max() <= 1, f"expect pixels lower than 1, but instead {batch_values.max()=}"
+        assert batch_values.min() >= 0, f"expect pixels greater than 1, but instead {batch_values.min()=}"
+
+        return "b c h w -> c 1 1"
+    elif batch_values.ndim == 2:
+        return "b c -> c "
+    elif batch_values.ndim == 1:
+        return "b -> 1"
+    else:
+        raise ValueError(f"{key}, {feats_type}, {batch_values.shape}")
+
+
+class RunningStats:
+    """Streaming mean/std/min/max of a data key, where batches are aggregated with an einops pattern (see
+    `get_stats_einops_patterns`).
+
+    The mean and the sum of squared differences to the mean are updated with the parallel variant of Welford's
+    algorithm (Chan et al.), so that the statistics are computed in a single pass over the data, and so that
+    the statistics of separate shards of the data can be merged together with `merge`.
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.count = 0
+        # accumulated in float64 to limit the loss of precision over large datasets
+        self.mean = torch.tensor(0.0, dtype=torch.float64)
+        self.m2 = torch.tensor(0.0, dtype=torch.float64)
+        self.max = torch.tensor(-float("inf"))
+        self.min = torch.tensor(float("inf"))
+
+    def update(self, batch_values: torch.Tensor):
+        batch_values = batch_values.float()
+        batch_mean = einops.reduce(batch_values, self.pattern, "mean")
+        self._merge(
+            count=batch_values.numel() // batch_mean.numel(),
+            mean=batch_mean.double(),
+            m2=einops.reduce((batch_values - batch_mean) ** 2, self.pattern, "sum").double(),
+            max=einops.reduce(batch_values, self.pattern, "max"),
+            min=einops.reduce(batch_values, self.pattern, "min"),
+        )
+
+    def merge(self, other: "RunningStats"):
+        self._merge(other.count, other.mean, other.m2, other.max, other.min)
+
+    def _merge(self, count: int, mean: torch.Tensor, m2: torch.Tensor, max: torch.Tensor, min: torch.Tensor):
+        if count == 0:
+            return
+        total_count = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total_count)
+        self.m2 = self.m2 + m2 + delta**2 * (self.count * count / total_count)
+        self.count = total_count
+        self.max = torch.maximum(self.max, max)
+        self.min = torch.minimum(self.min, min)
+
+    def to_stats(self) -> dict[str, torch.Tensor]:
+        return {
+            "mean": self.mean.float(),
+            "std": torch.sqrt(self.m2 / self.count).float(),
+            "max": self.max,
+            "min": self.min,
+        }
 
-    return stats_patterns
 
+def compute_running_stats(
+    dataset,
+    batch_size=8,
+    num_workers=8,
+    max_num_samples=None,
+    skip_camera_keys=False,
+    shard_index=0,
+    num_shards=1,
+) -> dict[str, RunningStats]:
+    """Compute the `RunningStats` of all data keys of a shard of a LeRobotDataset.
 
-def compute_stats(dataset, batch_size=8, num_workers=8, max_num_samples=None):
-    """Compute mean/std and min/max statistics of all data keys in a LeRobotDataset."""
+    Only the camera keys are loaded through the dataset (and thus decoded from the videos), the other keys are
+    read directly from the arrow columns of `dataset.hf_dataset`. When `skip_camera_keys` is True, nothing is
+    decoded and the camera keys are missing from the returned stats.
+
+    The (at most `max_num_samples`) sampled frames are split into `num_shards` shards, so that the shards can
+    be processed by separate processes or machines. The `RunningStats` of all the shards are then merged with
+    `merge_running_stats`.
+    """
     if max_num_samples is None:
         max_num_samples = len(dataset)
 
-    # for more info on why we need to set the same number of workers, see `load_from_videos`
-    stats_patterns = get_stats_einops_patterns(dataset, num_workers)
+    generator = torch.Generator()
+    generator.manual_seed(1337)
+    indices = torch.randperm(len(dataset), generator=generator)[:max_num_samples]
+    # the order doesn't matter for the statistics, and sorted indices make the reads contiguous
+    indices = indices[shard_index::num_shards].sort().values.tolist()
 
-    # mean and std will be computed incrementally while max and min will track the running value.
-    mean, std, max, min = {}, {}, {}, {}
-    for key in stats_patterns:
-        mean[key] = torch.tensor(0.0).float()
-        std[key] = torch.tensor(0.0).float()
-        max[key] = torch.tensor(-float("inf")).float()
-        min[key] = torch.tensor(float("inf")).float()
+    camera_keys = [] if skip_camera_keys else dataset.camera_keys
+    if len(camera_keys) > 0:
+        # for more info on why we need to set the same number of workers, see `load_from_videos`
+        stats_patterns = get_stats_einops_patterns(dataset, num_workers)
+    else:
+        batch = dataset.hf_dataset[:2]
+        stats_patterns = {
+            key: get_einops_pattern(key, feats_type, torch.stack(batch[key]))
+            for key, feats_type in dataset.features.items()
+            # NOTE: skip language_instruction embedding in stats computation
+            if key != "language_instruction" and not isinstance(feats_type, (VideoFrame, Image))
+        }
+    running_stats = {key: RunningStats(pattern) for key, pattern in stats_patterns.items()}
+
+    # non camera keys are read straight from the arrow table, without loading the items
+    arrow_keys = [key for key in stats_patterns if key not in camera_keys]
+    hf_dataset = dataset.hf_dataset.select(indices).with_format("torch", columns=arrow_keys)
+    # Note: these columns are small, so they are read in much larger batches than the camera keys
+    for batch in tqdm.tqdm(hf_dataset.iter(batch_size=10_000), desc="Compute stats of the non camera keys"):
+        for key in arrow_keys:
+            running_stats[key].update(batch[key])
 
-    def create_seeded_dataloader(dataset, batch_size, seed):
-        generator = torch.Generator()
-        generator.manual_seed(seed)
+    if len(camera_keys) > 0:
         dataloader = torch.utils.data.DataLoader(
-            dataset,
+            torch.utils.data.Subset(dataset, indices),
             num_workers=num_workers,
             batch_size=batch_size,
-            shuffle=True,
+            shuffle=False,
             drop_last=False,
-            generator=generator,
         )
-        return dataloader
-
-    # Note: Due to be refactored soon. The point of storing `first_batch` is to make sure we don't get
-    # surprises when rerunning the sampler.
-    first_batch = None
-    running_item_count = 0  # for online mean computation
-    dataloader = create_seeded_dataloader(dataset, batch_size, seed=1337)
-    for i, batch in enumerate(
-        tqdm.tqdm(dataloader, total=ceil(max_num_samples / batch_size), desc="Compute mean, min, max")
-    ):
-        this_batch_size = len(batch["index"])
-        running_item_count += this_batch_size
-        if first_batch is None:
-            first_batch = deepcopy(batch)
-        for key, pattern in stats_patterns.items():
-            batch[key] = batch[key].float()
-            # Numerically stable update step for mean computation.
-            batch_mean = einops.reduce(batch[key], pattern, "mean")
-            # Hint: to update the mean we need x̄ₙ = (Nₙ₋₁x̄ₙ₋₁ + Bₙxₙ) / Nₙ, where the subscript represents
-            # the update step, N is the running item count, B is this batch size, x̄ is the running mean,
-            # and x is the current batch mean. Some rearrangement is then required to avoid risking
-            # numerical overflow. Another hint: Nₙ₋₁ = Nₙ - Bₙ. Rearrangement yields
-            # x̄ₙ = x̄ₙ₋₁ + Bₙ * (xₙ - x̄ₙ₋₁) / Nₙ
-            mean[key] = mean[key] + this_batch_size * (batch_mean - mean[key]) / running_item_count
-            max[key] = torch.maximum(max[key], einops.reduce(batch[key], pattern, "max"))
-            min[key] = torch.minimum(min[key], einops.reduce(batch[key], pattern, "min"))
-
-        if i == ceil(max_num_samples / batch_size) - 1:
-            break
-
-    first_batch_ = None
-    running_item_count = 0  # for online std computation
-    dataloader = create_seeded_dataloader(dataset, batch_size, seed=1337)
-    for i, batch in enumerate(
-        tqdm.tqdm(dataloader, total=ceil(max_num_samples / batch_size), desc="Compute std")
-    ):
-        this_batch_size = len(batch["index"])
-        running_item_count += this_batch_size
-        # Sanity check to make sure the batches are still in the same order as before.
-        if first_batch_ is None:
-            first_batch_ = deepcopy(batch)
-            for key in stats_patterns:
-                assert torch.equal(first_batch_[key], first_batch[key])
-        for key, pattern in stats_patterns.items():
-            batch[key] = batch[key].float()
-            # Numerically stable update step for mean computation (where the mean is over squared
-            # residuals).See notes in the mean computation loop above.
-            batch_std = einops.reduce((batch[key] - mean[key]) ** 2, pattern, "mean")
-            std[key] = std[key] + this_batch_size * (batch_std - std[key]) / running_item_count
-
-        if i == ceil(max_num_samples / batch_size) - 1:
-            break
-
-    for key in stats_patterns:
-        std[key] = torch.sqrt(std[key])
-
-    stats = {}
-    for key in stats_patterns:
-        stats[key] = {
-            "mean": mean[key],
-            "std": std[key],
-            "max": max[key],
-            "min": min[key],
-        }
-    return stats
+        for batch in tqdm.tqdm(dataloader, desc="Compute stats of the camera keys"):
+            for key in camera_keys:
+                running_stats[key].update(batch[key])
+
+    return running_stats
+
+
+def merge_running_stats(ls_running_stats: list[dict[str, RunningStats]]) -> dict[str, RunningStats]:
+    """Merge the `RunningStats` computed on separate shards of a dataset by `compute_running_stats`."""
+    merged = {}
+    for running_stats in ls_running_stats:
+        for key, key_running_stats in running_stats.items():
+            if key not in merged:
+                merged[key] = RunningStats(key_running_stats.pattern)
+            merged[key].merge(key_running_stats)
+    return merged
+
+
+def compute_stats(dataset, batch_size=8, num_workers=8, max_num_samples=None, skip_camera_keys=False):
+    """Compute mean/std and min/max statistics of all data keys in a LeRobotDataset.
+
+    See `compute_running_stats` for computing the statistics of a dataset split into shards.
+    """
+    running_stats = compute_running_stats(
+        dataset, batch_size, num_workers, max_num_samples, skip_camera_keys=skip_camera_keys
+    )
+    return {key: key_running_stats.to_stats() for key, key_running_stats in running_stats.items()}
 
 
 def aggregate_stats(ls_datasets) -> dict[str, torch.Tensor]:
@@ -97,8 +97,11 @@ def make_dataset(cfg, split: str = "train") -> LeRobotDataset | MultiLeRobotData
             delta_timestamps=cfg.training.get("delta_timestamps"),
             image_transforms=image_transforms,
             video_backend=cfg.video_backend,
+            backbone_features_dir=cfg.training.get("backbone_features_dir"),
         )
     else:
+        if cfg.training.get("backbone_features_dir") is not None:
+            raise NotImplementedError("Backbone features are not supported with multiple datasets.")
         dataset = MultiLeRobotDataset(
             cfg.dataset_repo_id,
             split=split,
@@ -13,27 +13,39 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import bisect
+import itertools
 import logging
 import os
+from functools import cached_property
 from pathlib import Path
 from typing import Callable
 
 import datasets
+import numpy as np
 import torch
 import torch.utils
 
+from lerobot.common.datasets.backbone_features import BackboneFeatures, backbone_features_key
 from lerobot.common.datasets.compute_stats import aggregate_stats
 from lerobot.common.datasets.utils import (
+    EpisodeTimestampsIndex,
     calculate_episode_data_index,
     load_episode_data_index,
     load_hf_dataset,
     load_info,
     load_previous_and_future_frames,
+    load_previous_and_future_frames_batch,
     load_stats,
     load_videos,
     reset_episode_index,
 )
-from lerobot.common.datasets.video_utils import VideoFrame, load_from_videos
+from lerobot.common.datasets.video_utils import (
+    VideoDecoderPool,
+    VideoFrame,
+    load_from_videos,
+    load_from_videos_batch,
+)
 
 # For maintainers, see lerobot/common/datasets/push_dataset_to_hub/CODEBASE_VERSION.md
 CODEBASE_VERSION = "v1.6"
@@ -49,6 +61,7 @@ class LeRobotDataset(torch.utils.data.Dataset):
         image_transforms: Callable | None = None,
         delta_timestamps: dict[list[float]] | None = None,
         video_backend: str | None = None,
+        backbone_features_dir: Path | None = None,
     ):
         super().__init__()
         self.repo_id = repo_id
@@ -70,12 +83,34 @@ class LeRobotDataset(torch.utils.data.Dataset):
         if self.video:
             self.videos_dir = load_videos(repo_id, CODEBASE_VERSION, root)
             self.video_backend = video_backend if video_backend is not None else "pyav"
+            # keeps the videos open across items, each DataLoader worker gets its own pool
+            self.video_decoder_pool = VideoDecoderPool()
+        # precomputed backbone features returned instead of the frames of the cameras (see `backbone_features`)
+        self.backbone_features = None
+        if backbone_features_dir is not None:
+            self.backbone_features = BackboneFeatures(backbone_features_dir)
+            if self.backbone_features.num_frames != len(self.hf_dataset):
+                raise ValueError(
+                    f"The backbone features in {backbone_features_dir} were computed for "
+                    f"{self.backbone_features.num_frames} frames, but the dataset has {len(self.hf_dataset)}."
+                )
 
     @property
     def fps(self) -> int:
         """Frames per second used during data collection."""
         return self.info["fps"]
 
+    @property
+    def timestamps_index(self) -> EpisodeTimestampsIndex:
+        """Used to resolve `delta_timestamps` without reading the timestamps of an episode for every item. It is
+        built on first use, and again when `hf_dataset` or `episode_data_index` are reassigned."""
+        cached = getattr(self, "_timestamps_index", None)
+        if cached is None or cached[0] is not self.hf_dataset or cached[1] is not self.episode_data_index:
+            timestamps_index = EpisodeTimestampsIndex(self.hf_dataset, self.episode_data_index)
+            cached = (self.hf_dataset, self.episode_data_index, timestamps_index)
+            self._timestamps_index = cached
+        return cached[2]
+
     @property
     def video(self) -> bool:
         """Returns True if this dataset loads video frames from mp4 files.
@@ -115,7 +150,7 @@ class LeRobotDataset(torch.utils.data.Dataset):
         """Number of samples/frames."""
         return len(self.hf_dataset)
 
-    @property
+    @cached_property
     def num_episodes(self) -> int:
         """Number of episodes."""
         return len(self.hf_dataset.unique("episode_index"))
@@ -133,6 +168,9 @@ class LeRobotDataset(torch.utils.data.Dataset):
         return self.num_samples
 
     def __getitem__(self, idx):
+        if self.backbone_features is not None:
+            return self.__getitems__([idx])[0]
+
         item = self.hf_dataset[idx]
 
         if self.delta_timestamps is not None:
@@ -142,6 +180,7 @@ class LeRobotDataset(torch.utils.data.Dataset):
                 self.episode_data_index,
                 self.delta_timestamps,
                 self.tolerance_s,
+                self.timestamps_index,
             )
 
         if self.video:
@@ -151,6 +190,7 @@ class LeRobotDataset(torch.utils.data.Dataset):
                 self.videos_dir,
                 self.tolerance_s,
                 self.video_backend,
+                self.video_decoder_pool,
             )
 
         if self.image_transforms is not None:
@@ -159,6 +199,88 @@ class LeRobotDataset(torch.utils.data.Dataset):
 
         return item
 
+    def __getitems__(self, indices: list[int]) -> list[dict]:
+        """Batched version of `__getitem__`, used by `torch.utils.data.DataLoader` to fetch a whole batch.
+
+        The columns of all the items are read with a single take on the underlying arrow table, the
+        `delta_timestamps` of all the items are resolved at once, and the video frames of the batch are
+        decoded once per video file. Items are returned as a list so that they are collated by the DataLoader
+        as usual.
+        """
+        if self.backbone_features is not None:
+            # the columns of the cameras replaced by their backbone features are not read
+            batch = self._hf_dataset_without_feature_columns()[indices]
+        else:
+            batch = self.hf_dataset[indices]
+
+        delta_timestamps = self.delta_timestamps
+        video_frame_keys = self.video_frame_keys if self.video else []
+        camera_keys = self.camera_keys
+        if self.backbone_features is not None:
+            # the frames of these cameras are neither loaded nor decoded
+            batch = self._load_backbone_features(batch, indices)
+            feature_keys = self.backbone_features.keys
+            if delta_timestamps is not None:
+                delta_timestamps = {k: v for k, v in delta_timestamps.items() if k not in feature_keys}
+            video_frame_keys = [k for k in video_frame_keys if k not in feature_keys]
+            camera_keys = [k for k in camera_keys if k not in feature_keys]
+
+        if delta_timestamps:
+            batch = load_previous_and_future_frames_batch(
+                batch,
+                self.hf_dataset,
+                self.episode_data_index,
+                delta_timestamps,
+                self.tolerance_s,
+                self.timestamps_index,
+            )
+
+        if len(video_frame_keys) > 0:
+            batch = load_from_videos_batch(
+                batch,
+                video_frame_keys,
+                self.videos_dir,
+                self.tolerance_s,
+                self.video_backend,
+                self.video_decoder_pool,
+            )
+
+        items = [{key: values[i] for key, values in batch.items()} for i in range(len(indices))]
+
+        if self.image_transforms is not None:
+            for item in items:
+                for cam in camera_keys:
+                    item[cam] = self.image_transforms(item[cam])
+
+        return items
+
+    def _hf_dataset_without_feature_columns(self) -> datasets.Dataset:
+        """`hf_dataset` without the columns of the cameras of `backbone_features`, cached as long as `hf_dataset`
+        is not reassigned."""
+        cached = getattr(self, "_hf_dataset_without_features", None)
+        if cached is None or cached[0] is not self.hf_dataset:
+            columns = [c for c in self.hf_dataset.column_names if c not in self.backbone_features.keys]
+            cached = (self.hf_dataset, self.hf_dataset.select_columns(columns))
+            self._hf_dataset_without_features = cached
+        return cached[1]
+
+    def _load_backbone_features(self, batch: dict[str, list], indices: list[int]) -> dict[str, list]:
+        """Adds the backbone features of the cameras of `backbone_features` to `batch`, under
+        `backbone_features_key(camera_key)`, resolving their `delta_timestamps` like the frames."""
+        for key in self.backbone_features.keys:
+            if self.delta_timestamps is not None and key in self.delta_timestamps:
+                data_ids, is_pad = self.timestamps_index.query(
+                    np.array([ep_idx.item() for ep_idx in batch["episode_index"]]),
+                    np.array([ts.item() for ts in batch["timestamp"]]),
+                    np.asarray(self.delta_timestamps[key], dtype=np.float32),
+                    self.tolerance_s,
+                )
+                batch[f"{key}_is_pad"] = list(torch.from_numpy(is_pad))
+            else:
+                data_ids = np.asarray(indices)
+            batch[backbone_features_key(key)] = list(self.backbone_features.get(key, data_ids))
+        return batch
+
     def __repr__(self):
         return (
             f"{self.__class__.__name__}(\n"
@@ -212,6 +334,8 @@ class LeRobotDataset(torch.utils.data.Dataset):
         obj.info = info if info is not None else {}
         obj.videos_dir = videos_dir
         obj.video_backend = video_backend if video_backend is not None else "pyav"
+        obj.video_decoder_pool = VideoDecoderPool()
+        obj.backbone_features = None
         return obj
 
 
@@ -246,10 +370,16 @@ class MultiLeRobotDataset(torch.utils.data.Dataset):
             )
             for repo_id in repo_ids
         ]
+
         # Check that some properties are consistent across datasets. Note: We may relax some of these
         # consistency requirements in future iterations of this class.
+        # Note: the recording diagnostics (e.g. the per episode "control_loop_timing") are specific to each
+        # dataset and are not compared.
+        def comparable_info(info):
+            return {k: v for k, v in info.items() if k != "control_loop_timing"}
+
         for repo_id, dataset in zip(self.repo_ids, self._datasets, strict=True):
-            if dataset.info != self._datasets[0].info:
+            if comparable_info(dataset.info) != comparable_info(self._datasets[0].info):
                 raise ValueError(
                     f"Detected a mismatch in dataset info between {self.repo_ids[0]} and {repo_id}. This is "
                     "not yet supported."
@@ -273,6 +403,14 @@ class MultiLeRobotDataset(torch.utils.data.Dataset):
                 "other datasets."
             )
             self.disabled_data_keys.update(extra_keys)
+        # the disabled keys which are actually in the items of each dataset, so that items are only filtered
+        # by the keys they contain
+        self._disabled_keys_per_dataset = [
+            tuple(sorted(self.disabled_data_keys.intersection(dataset.hf_dataset.features)))
+            for dataset in self._datasets
+        ]
+        # index of the first item after each dataset, to locate an item with a binary search
+        self._cumulative_sizes = list(itertools.accumulate(dataset.num_samples for dataset in self._datasets))
 
         self.root = root
         self.split = split
@@ -344,9 +482,9 @@ class MultiLeRobotDataset(torch.utils.data.Dataset):
     @property
     def num_samples(self) -> int:
         """Number of samples/frames."""
-        return sum(d.num_samples for d in self._datasets)
+        return self._cumulative_sizes[-1]
 
-    @property
+    @cached_property
     def num_episodes(self) -> int:
         """Number of episodes."""
         return sum(d.num_episodes for d in self._datasets)
@@ -363,28 +501,44 @@ class MultiLeRobotDataset(torch.utils.data.Dataset):
     def __len__(self):
         return self.num_samples
 
-    def __getitem__(self, idx: int) -> dict[str, torch.Tensor]:
+    def _locate(self, idx: int) -> tuple[int, int]:
+        """Returns the index of the dataset containing `idx` and the index of the item in this dataset."""
         if idx >= len(self):
             raise IndexError(f"Index {idx} out of bounds.")
-        # Determine which dataset to get an item from based on the index.
-        start_idx = 0
-        dataset_idx = 0
-        for dataset in self._datasets:
-            if idx >= start_idx + dataset.num_samples:
-                start_idx += dataset.num_samples
-                dataset_idx += 1
-                continue
-            break
-        else:
-            raise AssertionError("We expect the loop to break out as long as the index is within bounds.")
-        item = self._datasets[dataset_idx][idx - start_idx]
-        item["dataset_index"] = torch.tensor(dataset_idx)
-        for data_key in self.disabled_data_keys:
-            if data_key in item:
-                del item[data_key]
+        # The dataset of the index is the first one which ends after it.
+        dataset_idx = bisect.bisect_right(self._cumulative_sizes, idx)
+        start_idx = self._cumulative_sizes[dataset_idx - 1] if dataset_idx > 0 else 0
+        return dataset_idx, idx - start_idx
 
+    def _finalize_item(self, item: dict, dataset_idx: int) -> dict:
+        item["dataset_index"] = torch.tensor(dataset_idx)
+        for data_key in self._disabled_keys_per_dataset[dataset_idx]:
+            del item[data_key]
         return item
 
+    def __getitem__(self, idx: int) -> dict[str, torch.Tensor]:
+        dataset_idx, local_idx = self._locate(idx)
+        return self._finalize_item(self._datasets[dataset_idx][local_idx], dataset_idx)
+
+    def __getitems__(self, indices: list[int]) -> list[dict]:
+        """Batched version of `__getitem__`: the indices are grouped by underlying dataset, and each group is
+        fetched with a single call to `LeRobotDataset.__getitems__`. Items are returned in the order of
+        `indices`.
+        """
+        positions_per_dataset = {}
+        local_indices_per_dataset = {}
+        for position, idx in enumerate(indices):
+            dataset_idx, local_idx = self._locate(idx)
+            positions_per_dataset.setdefault(dataset_idx, []).append(position)
+            local_indices_per_dataset.setdefault(dataset_idx, []).append(local_idx)
+
+        items = [None] * len(indices)
+        for dataset_idx, positions in positions_per_dataset.items():
+            dataset_items = self._datasets[dataset_idx].__getitems__(local_indices_per_dataset[dataset_idx])
+            for position, item in zip(positions, dataset_items, strict=True):
+                items[position] = self._finalize_item(item, dataset_idx)
+        return items
+
     def __repr__(self):
         return (
             f"{self.__class__.__name__}(\n"
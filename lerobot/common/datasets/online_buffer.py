@@ -22,6 +22,7 @@ supports in-place slicing and mutation which is very handy for a dynamic buffer.
 """
 
 import os
+import time
 from pathlib import Path
 from typing import Any
 
@@ -59,11 +60,14 @@ class OnlineBuffer(torch.utils.data.Dataset):
     The underlying data structure will have data inserted in a circular fashion. Always insert after the
     last index, and when you reach the end, wrap around to the start.
 
-    The data is stored in a numpy memmap.
+    The data is stored in a numpy memmap, which is shared with the DataLoader workers (the memmap files are
+    opened again when the buffer is pickled to a worker). Each process keeps its own episode tables, which are
+    rebuilt when the data was changed by another process (see `_sync_episode_tables`).
     """
 
     NEXT_INDEX_KEY = "_next_index"
     OCCUPANCY_MASK_KEY = "_occupancy_mask"
+    VERSION_KEY = "_version"
     INDEX_KEY = "index"
     FRAME_INDEX_KEY = "frame_index"
     EPISODE_INDEX_KEY = "episode_index"
@@ -107,6 +111,7 @@ class OnlineBuffer(torch.utils.data.Dataset):
         self._buffer_capacity = buffer_capacity
         data_spec = self._make_data_spec(data_spec, buffer_capacity)
         Path(write_dir).mkdir(parents=True, exist_ok=True)
+        self._write_dir = Path(write_dir)
         self._data = {}
         for k, v in data_spec.items():
             self._data[k] = _make_memmap_safe(
@@ -115,6 +120,33 @@ class OnlineBuffer(torch.utils.data.Dataset):
                 mode="r+" if (Path(write_dir) / k).exists() else "w+",
                 shape=tuple(v["shape"]) if v is not None else None,
             )
+        if self._version() % 2 == 1:
+            # `add_data` was interrupted, e.g. by a crash during training
+            self._data[OnlineBuffer.VERSION_KEY][...] += 1
+        self._init_episode_tables()
+        self._tables_version = self._version()
+
+    def _init_episode_tables(self):
+        """Initializes the number of samples and the episode tables from the data of the buffer.
+
+        The episode tables hold the buffer index of the first frame (`_episode_from`) and the number of frames
+        (`_episode_lengths`) of each episode in the buffer, ordered from the oldest episode, whose episode index
+        is `_first_episode_index`. The frames of an episode are contiguous in the circular buffer. These are
+        then maintained by `add_data`, so that neither the length of the buffer nor the frames of an episode
+        require a scan of the whole buffer.
+        """
+        self._num_samples = int(np.count_nonzero(self._data[OnlineBuffer.OCCUPANCY_MASK_KEY]))
+        # The occupied indices, ordered from the oldest frame.
+        if self._num_samples == self._buffer_capacity:
+            order = np.roll(np.arange(self._buffer_capacity), -int(self._data[OnlineBuffer.NEXT_INDEX_KEY]))
+        else:
+            order = np.arange(self._num_samples)
+        episode_index = self._data[OnlineBuffer.EPISODE_INDEX_KEY][order]
+        starts = np.flatnonzero(np.diff(episode_index) != 0) + 1
+        starts = np.concatenate([[0], starts]) if self._num_samples > 0 else starts
+        self._episode_from = order[starts]
+        self._episode_lengths = np.diff(np.append(starts, self._num_samples))
+        self._first_episode_index = episode_index[0] if self._num_samples > 0 else 0
 
     @property
     def delta_timestamps(self) -> dict[str, np.ndarray] | None:
@@ -155,6 +187,10 @@ class OnlineBuffer(torch.utils.data.Dataset):
             # Since the memmap is initialized with all-zeros, this keeps track of which indices are occupied
             # with real data rather than the dummy initialization.
             OnlineBuffer.OCCUPANCY_MASK_KEY: {"dtype": np.dtype("?"), "shape": (buffer_capacity,)},
+            # Incremented before and after adding data, so that it is odd while data is being added. The other
+            # processes (e.g. DataLoader workers) use it to know when to rebuild their episode tables, and to
+            # retry the reads which raced with `add_data`.
+            OnlineBuffer.VERSION_KEY: {"dtype": np.dtype("int64"), "shape": ()},
             OnlineBuffer.INDEX_KEY: {"dtype": np.dtype("int64"), "shape": (buffer_capacity,)},
             OnlineBuffer.FRAME_INDEX_KEY: {"dtype": np.dtype("int64"), "shape": (buffer_capacity,)},
             OnlineBuffer.EPISODE_INDEX_KEY: {"dtype": np.dtype("int64"), "shape": (buffer_capacity,)},
@@ -180,7 +216,7 @@ class OnlineBuffer(torch.utils.data.Dataset):
         if not all(len(data[k]) == new_data_length for k in self.data_keys):
             raise ValueError("All data items should have the same length")
 
-        next_index = self._data[OnlineBuffer.NEXT_INDEX_KEY]
+        next_index = int(self._data[OnlineBuffer.NEXT_INDEX_KEY])
 
         # Sanity check to make sure that the new data indices start from 0.
         assert data[OnlineBuffer.EPISODE_INDEX_KEY][0].item() == 0
@@ -193,6 +229,9 @@ class OnlineBuffer(torch.utils.data.Dataset):
             data[OnlineBuffer.EPISODE_INDEX_KEY] += last_episode_index + 1
             data[OnlineBuffer.INDEX_KEY] += last_data_index + 1
 
+        version = self._version()
+        self._data[OnlineBuffer.VERSION_KEY][...] = version + 1
+
         # Insert the new data starting from next_index. It may be necessary to wrap around to the start.
         n_surplus = max(0, new_data_length - (self._buffer_capacity - next_index))
         for k in self.data_keys:
@@ -205,16 +244,76 @@ class OnlineBuffer(torch.utils.data.Dataset):
                 self._data[OnlineBuffer.OCCUPANCY_MASK_KEY][next_index:] = True
                 self._data[k][:n_surplus] = data[k][-n_surplus:]
         if n_surplus == 0:
-            self._data[OnlineBuffer.NEXT_INDEX_KEY] = next_index + new_data_length
+            self._data[OnlineBuffer.NEXT_INDEX_KEY][...] = next_index + new_data_length
         else:
-            self._data[OnlineBuffer.NEXT_INDEX_KEY] = n_surplus
+            self._data[OnlineBuffer.NEXT_INDEX_KEY][...] = n_surplus
+
+        self._update_episode_tables(np.asarray(data[OnlineBuffer.EPISODE_INDEX_KEY]), next_index)
+        self._data[OnlineBuffer.VERSION_KEY][...] = version + 2
+        self._tables_version = version + 2
+
+    def __getstate__(self) -> dict:
+        # the memmaps are opened again from their files rather than pickled as in-memory copies
+        state = self.__dict__.copy()
+        state["_data"] = {k: (v.dtype, v.shape) for k, v in self._data.items()}
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._data = {
+            k: np.memmap(filename=self._write_dir / k, dtype=dtype, mode="r+", shape=shape)
+            for k, (dtype, shape) in state["_data"].items()
+        }
+
+    def _version(self) -> int:
+        return int(self._data[OnlineBuffer.VERSION_KEY])
+
+    def _sync_episode_tables(self) -> int:
+        """Rebuilds the episode tables if data was added by another process (e.g. by the main process, when
+        this is a DataLoader worker), and returns the version of the data they describe."""
+        while True:
+            version = self._version()
+            if version % 2 == 1:
+                # data is being added
+                time.sleep(1e-4)
+                continue
+            if version == self._tables_version:
+                return version
+            self._init_episode_tables()
+            if self._version() == version:
+                self._tables_version = version
+                return version
+
+    def _update_episode_tables(self, new_episode_index: np.ndarray, start: int):
+        """Updates the number of samples and the episode tables after adding the frames of `new_episode_index`
+        starting from the buffer index `start`."""
+        # The oldest frames were overwritten: drop the episodes which were entirely, and trim the next one.
+        n_overwritten = max(0, self._num_samples + len(new_episode_index) - self._buffer_capacity)
+        if n_overwritten > 0:
+            cumulative_lengths = np.cumsum(self._episode_lengths)
+            n_dropped = int(np.searchsorted(cumulative_lengths, n_overwritten, side="right"))
+            n_trimmed = n_overwritten - (cumulative_lengths[n_dropped - 1] if n_dropped > 0 else 0)
+            self._episode_from = self._episode_from[n_dropped:].copy()
+            self._episode_lengths = self._episode_lengths[n_dropped:].copy()
+            self._first_episode_index += n_dropped
+            if n_trimmed > 0:
+                self._episode_from[0] = (self._episode_from[0] + n_trimmed) % self._buffer_capacity
+                self._episode_lengths[0] -= n_trimmed
+        self._num_samples = min(self._buffer_capacity, self._num_samples + len(new_episode_index))
+
+        # Append the new episodes.
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(new_episode_index) != 0) + 1])
+        if len(self._episode_lengths) == 0:
+            self._first_episode_index = new_episode_index[0].item()
+        self._episode_from = np.append(self._episode_from, (start + starts) % self._buffer_capacity)
+        self._episode_lengths = np.append(
+            self._episode_lengths, np.diff(np.append(starts, len(new_episode_index)))
+        )
 
     @property
     def data_keys(self) -> list[str]:
-        keys = set(self._data)
-        keys.remove(OnlineBuffer.OCCUPANCY_MASK_KEY)
-        keys.remove(OnlineBuffer.NEXT_INDEX_KEY)
-        return sorted(keys)
+        # the keys starting with "_" are reserved for internal logic
+        return sorted(k for k in self._data if not k.startswith("_"))
 
     @property
     def fps(self) -> float | None:
@@ -222,13 +321,13 @@ class OnlineBuffer(torch.utils.data.Dataset):
 
     @property
     def num_episodes(self) -> int:
-        return len(
-            np.unique(self._data[OnlineBuffer.EPISODE_INDEX_KEY][self._data[OnlineBuffer.OCCUPANCY_MASK_KEY]])
-        )
+        self._sync_episode_tables()
+        return len(self._episode_lengths)
 
     @property
     def num_samples(self) -> int:
-        return np.count_nonzero(self._data[OnlineBuffer.OCCUPANCY_MASK_KEY])
+        self._sync_episode_tables()
+        return self._num_samples
 
     def __len__(self):
         return self.num_samples
@@ -244,52 +343,97 @@ class OnlineBuffer(torch.utils.data.Dataset):
                 item_[k] = torch.tensor(v)
         return item_
 
-    def __getitem__(self, idx: int) -> dict[str, torch.Tensor]:
-        if idx >= len(self) or idx < -len(self):
-            raise IndexError
+    def _episode_data_indices(self, episode_index: int) -> np.ndarray:
+        """Returns the buffer indices of the frames of an episode, in order."""
+        row = episode_index - self._first_episode_index
+        offsets = np.arange(self._episode_lengths[row])
+        return (self._episode_from[row] + offsets) % self._buffer_capacity
+
+    def _get_items(self, indices: np.ndarray) -> dict[str, np.ndarray]:
+        """Returns the items at the buffer `indices`, with all the values stacked along the first dimension.
 
-        item = {k: v[idx] for k, v in self._data.items() if not k.startswith("_")}
+        The items are read again if data was added by another process in the meantime.
+        """
+        while True:
+            version = self._sync_episode_tables()
+            try:
+                items = self._read_items(indices)
+            except (IndexError, AssertionError):
+                # the frames read may belong to episodes added after the episode tables were rebuilt
+                if self._version() == version:
+                    raise
+                continue
+            if self._version() == version:
+                return items
+
+    def _read_items(self, indices: np.ndarray) -> dict[str, np.ndarray]:
+        items = {k: v[indices] for k, v in self._data.items() if not k.startswith("_")}
 
         if self.delta_timestamps is None:
-            return self._item_to_tensors(item)
-
-        episode_index = item[OnlineBuffer.EPISODE_INDEX_KEY]
-        current_ts = item[OnlineBuffer.TIMESTAMP_KEY]
-        episode_data_indices = np.where(
-            np.bitwise_and(
-                self._data[OnlineBuffer.EPISODE_INDEX_KEY] == episode_index,
-                self._data[OnlineBuffer.OCCUPANCY_MASK_KEY],
+            return items
+
+        # Buffer indices of the frames to load for each item and data key, and whether they are padding.
+        data_indices = {}
+        for data_key, delta_ts in self.delta_timestamps.items():
+            data_indices[data_key] = np.empty((len(indices), len(delta_ts)), dtype=np.int64)
+            items[f"{data_key}{OnlineBuffer.IS_PAD_POSTFIX}"] = np.empty(
+                (len(indices), len(delta_ts)), dtype=bool
             )
-        )[0]
-        episode_timestamps = self._data[OnlineBuffer.TIMESTAMP_KEY][episode_data_indices]
-
+        for i, (episode_index, current_ts) in enumerate(
+            zip(items[OnlineBuffer.EPISODE_INDEX_KEY], items[OnlineBuffer.TIMESTAMP_KEY], strict=True)
+        ):
+            episode_data_indices = self._episode_data_indices(episode_index)
+            episode_timestamps = self._data[OnlineBuffer.TIMESTAMP_KEY][episode_data_indices]
+
+            for data_key in self.delta_timestamps:
+                # Note: The logic in this loop follows `load_previous_and_future_frames`, but only compares
+                # each query timestamp to its neighbours in the (sorted) timestamps of the episode.
+                # Get timestamps used as query to retrieve data of previous/future frames.
+                query_ts = current_ts + self.delta_timestamps[data_key]
+
+                after = np.searchsorted(episode_timestamps, query_ts).clip(max=len(episode_timestamps) - 1)
+                before = (after - 1).clip(min=0)
+                # On a tie, take the first of the closest frames, like `np.argmin`.
+                before = np.searchsorted(episode_timestamps, episode_timestamps[before])
+                dist_before = np.abs(query_ts - episode_timestamps[before])
+                dist_after = np.abs(query_ts - episode_timestamps[after])
+                argmin_ = np.where(dist_before <= dist_after, before, after)
+                min_ = np.minimum(dist_before, dist_after)
+
+                is_pad = min_ > self.tolerance_s
+
+                # Check violated query timestamps are all outside the episode range.
+                assert (
+                    (query_ts[is_pad] < episode_timestamps[0]) | (episode_timestamps[-1] < query_ts[is_pad])
+                ).all(), (
+                    f"One or several timestamps unexpectedly violate the tolerance ({min_} > {self.tolerance_s=}"
+                    ") inside the episode range."
+                )
+
+                data_indices[data_key][i] = episode_data_indices[argmin_]
+                items[f"{data_key}{OnlineBuffer.IS_PAD_POSTFIX}"][i] = is_pad
+
+        # Load the frames of each data key at once.
         for data_key in self.delta_timestamps:
-            # Note: The logic in this loop is copied from `load_previous_and_future_frames`.
-            # Get timestamps used as query to retrieve data of previous/future frames.
-            query_ts = current_ts + self.delta_timestamps[data_key]
-
-            # Compute distances between each query timestamp and all timestamps of all the frames belonging to
-            # the episode.
-            dist = np.abs(query_ts[:, None] - episode_timestamps[None, :])
-            argmin_ = np.argmin(dist, axis=1)
-            min_ = dist[np.arange(dist.shape[0]), argmin_]
-
-            is_pad = min_ > self.tolerance_s
-
-            # Check violated query timestamps are all outside the episode range.
-            assert (
-                (query_ts[is_pad] < episode_timestamps[0]) | (episode_timestamps[-1] < query_ts[is_pad])
-            ).all(), (
-                f"One or several timestamps unexpectedly violate the tolerance ({min_} > {self.tolerance_s=}"
-                ") inside the episode range."
-            )
+            items[data_key] = self._data[data_key][data_indices[data_key]]
 
-            # Load frames for this data key.
-            item[data_key] = self._data[data_key][episode_data_indices[argmin_]]
+        return items
 
-            item[f"{data_key}{OnlineBuffer.IS_PAD_POSTFIX}"] = is_pad
+    def _check_index(self, idx: int):
+        if idx >= len(self) or idx < -len(self):
+            raise IndexError
 
-        return self._item_to_tensors(item)
+    def __getitem__(self, idx: int) -> dict[str, torch.Tensor]:
+        self._check_index(idx)
+        items = self._get_items(np.array([idx]))
+        return self._item_to_tensors({k: v[0] for k, v in items.items()})
+
+    def __getitems__(self, indices: list[int]) -> list[dict[str, torch.Tensor]]:
+        """Batched `__getitem__`, used by the DataLoader to load the frames of a whole batch at once."""
+        for idx in indices:
+            self._check_index(idx)
+        items = self._get_items(np.array(indices))
+        return [self._item_to_tensors({k: v[i] for k, v in items.items()}) for i in range(len(indices))]
 
     def get_data_by_key(self, key: str) -> torch.Tensor:
         """Returns all data for a given data key as a Tensor."""
@@ -17,7 +17,7 @@ from lerobot.common.datasets.lerobot_dataset import CODEBASE_VERSION, LeRobotDat
 from lerobot.common.datasets.push_dataset_to_hub.aloha_hdf5_format import to_hf_dataset
 from lerobot.common.datasets.push_dataset_to_hub.utils import concatenate_episodes, get_default_encoding
 from lerobot.common.datasets.utils import calculate_episode_data_index, create_branch
-from lerobot.common.datasets.video_utils import encode_video_frames
+from lerobot.common.datasets.video_utils import StreamingVideoEncoder, encode_video_frames
 from lerobot.common.utils.utils import log_say
 from lerobot.scripts.push_dataset_to_hub import (
     push_dataset_card_to_hub,
@@ -38,10 +38,13 @@ def safe_stop_image_writer(func):
         try:
             return func(*args, **kwargs)
         except Exception as e:
-            image_writer = kwargs.get("dataset", {}).get("image_writer")
+            dataset = kwargs.get("dataset") or {}
+            image_writer = dataset.get("image_writer")
             if image_writer is not None:
                 print("Waiting for image writer to terminate...")
                 stop_image_writer(image_writer, timeout=20)
+            if dataset.get("video_encoders"):
+                abort_video_encoders(dataset)
             raise e
 
     return wrapper
@@ -172,6 +175,37 @@ def stop_image_writer(image_writer, timeout):
         stop_processes(processes_pool, image_queue, timeout=timeout)
 
 
+########################################################################################
+# Streaming encoding of videos while recording
+########################################################################################
+
+
+def stream_video_frame(dataset, image, key, episode_index):
+    """Sends the frame to the video encoder of the camera `key`, which is started at the first frame of the
+    episode. Compared to saving png images and encoding them with `encode_videos` at the end of the recording,
+    this saves the cost of png compression during recording and the encoding time afterward.
+    """
+    encoders = dataset["video_encoders"]
+    if key not in encoders:
+        video_path = dataset["videos_dir"] / f"{key}_episode_{episode_index:06d}.mp4"
+        encoders[key] = StreamingVideoEncoder(video_path, dataset["fps"])
+    encoders[key].write(image)
+
+
+def close_video_encoders(dataset):
+    """Finalizes the videos of the current episode."""
+    encoders = dataset["video_encoders"]
+    for key in list(encoders):
+        encoders.pop(key).close()
+
+
+def abort_video_encoders(dataset):
+    """Stops encoding the videos of the current episode, and deletes them."""
+    encoders = dataset["video_encoders"]
+    for key in list(encoders):
+        encoders.pop(key).abort()
+
+
 ########################################################################################
 # Functions to initialize, resume and populate a dataset
 ########################################################################################
@@ -186,6 +220,7 @@ def init_dataset(
     write_images,
     num_image_writer_processes,
     num_image_writer_threads,
+    stream_video=False,
 ):
     local_dir = Path(root) / repo_id
     if local_dir.exists() and force_override:
@@ -217,7 +252,11 @@ def init_dataset(
         "num_episodes": num_episodes,
     }
 
-    if write_images:
+    if write_images and video and stream_video:
+        # Frames are piped to one video encoder per camera while recording, instead of being saved as png
+        # images and encoded at the end of the recording.
+        dataset["video_encoders"] = {}
+    elif write_images:
         # Initialize processes or/and threads dedicated to save images on disk asynchronously,
         # which is critical to control a robot and record data at a high frame rate.
         image_writer = start_image_writer(
@@ -271,22 +310,24 @@ def add_frame(dataset, observation, action):
     for key in action:
         ep_dict[key].append(action[key])
 
-    if "image_writer" not in dataset:
+    if "image_writer" not in dataset and "video_encoders" not in dataset:
         dataset["current_frame_index"] += 1
         return
 
     # Save images
-    image_writer = dataset["image_writer"]
     for key in img_keys:
         imgs_dir = videos_dir / f"{key}_episode_{episode_index:06d}"
-        async_save_image(
-            image_writer,
-            image=observation[key],
-            key=key,
-            frame_index=frame_index,
-            episode_index=episode_index,
-            videos_dir=str(videos_dir),
-        )
+        if "video_encoders" in dataset:
+            stream_video_frame(dataset, observation[key], key, episode_index)
+        else:
+            async_save_image(
+                dataset["image_writer"],
+                image=observation[key],
+                key=key,
+                frame_index=frame_index,
+                episode_index=episode_index,
+                videos_dir=str(videos_dir),
+            )
 
         if video:
             fname = f"{key}_episode_{episode_index:06d}.mp4"
@@ -302,6 +343,10 @@ def add_frame(dataset, observation, action):
 def delete_current_episode(dataset):
     del dataset["current_episode"]
     del dataset["current_frame_index"]
+    dataset.pop("current_episode_timing", None)
+
+    if dataset.get("video_encoders"):
+        abort_video_encoders(dataset)
 
     # delete temporary images
     episode_index = dataset["num_episodes"]
@@ -328,11 +373,23 @@ def save_current_episode(dataset):
     ep_dict["timestamp"] = torch.tensor(ep_dict["timestamp"])
     ep_dict["next.done"] = torch.tensor(ep_dict["next.done"])
 
+    if dataset.get("video_encoders"):
+        close_video_encoders(dataset)
+
     ep_path = episodes_dir / f"episode_{episode_index}.pth"
     torch.save(ep_dict, ep_path)
 
+    # timing statistics of the control loop (jitter and overruns), per episode
+    control_loop_timing = {}
+    if rec_info_path.exists():
+        with open(rec_info_path) as f:
+            control_loop_timing = json.load(f).get("control_loop_timing", {})
+    if "current_episode_timing" in dataset:
+        control_loop_timing[str(episode_index)] = dataset.pop("current_episode_timing")
+
     rec_info = {
         "last_episode_index": episode_index,
+        "control_loop_timing": control_loop_timing,
     }
     with open(rec_info_path, "w") as f:
         json.dump(rec_info, f)
@@ -359,7 +416,8 @@ def encode_videos(dataset, image_keys, play_sounds):
             fname = f"{key}_episode_{episode_index:06d}.mp4"
             video_path = local_dir / "videos" / fname
             if video_path.exists():
-                # Skip if video is already encoded. Could be the case when resuming data recording.
+                # Skip if video is already encoded. Could be the case when resuming data recording, or when
+                # videos were encoded while recording (see `stream_video_frame`).
                 continue
             # note: `encode_video_frames` is a blocking call. Making it asynchronous shouldn't speedup encoding,
             # since video encoding with ffmpeg is already using multithreading.
@@ -376,6 +434,7 @@ def from_dataset_to_lerobot_dataset(dataset, play_sounds):
     video = dataset["video"]
     fps = dataset["fps"]
     repo_id = dataset["repo_id"]
+    rec_info_path = dataset["rec_info_path"]
 
     ep_dicts = []
     for episode_index in tqdm.tqdm(range(num_episodes)):
@@ -399,6 +458,14 @@ def from_dataset_to_lerobot_dataset(dataset, play_sounds):
     if video:
         info["encoding"] = get_default_encoding()
 
+    if rec_info_path.exists():
+        with open(rec_info_path) as f:
+            control_loop_timing = json.load(f).get("control_loop_timing", {})
+        if control_loop_timing:
+            info["control_loop_timing"] = [
+                control_loop_timing.get(str(episode_index)) for episode_index in range(num_episodes)
+            ]
+
     lerobot_dataset = LeRobotDataset.from_preloaded(
         repo_id=repo_id,
         hf_dataset=hf_dataset,
@@ -15,12 +15,15 @@
 # limitations under the License.
 import json
 import re
+import time
 import warnings
+from contextlib import nullcontext
 from functools import cache
 from pathlib import Path
 from typing import Dict
 
 import datasets
+import numpy as np
 import torch
 from datasets import load_dataset, load_from_disk
 from huggingface_hub import DatasetCard, HfApi, hf_hub_download, snapshot_download
@@ -216,12 +219,139 @@ def load_videos(repo_id, version, root) -> Path:
     return path
 
 
+def load_column_as_numpy(hf_dataset: datasets.Dataset, key: str) -> np.ndarray:
+    """Loads a whole column of a Hugging Face dataset as a numpy array, bypassing its transform.
+
+    When the column is stored in a single chunk of the memory-mapped arrow table (which is the case of datasets
+    loaded from disk or from the hub), the returned array is a view on it rather than a copy.
+    """
+    column = hf_dataset.with_format("arrow", columns=[key])[key]
+    if column.num_chunks == 1:
+        return column.chunk(0).to_numpy(zero_copy_only=False)
+    return column.to_numpy()
+
+
+class EpisodeTimestampsIndex:
+    """Table of the timestamps of all the frames of a dataset, ordered by episode, used to resolve the dataset
+    indices of the frames closest to query timestamps (see `load_previous_and_future_frames`).
+
+    It is meant to be built once per dataset, so that resolving the frames of an item doesn't require reading
+    the timestamps of its episode from the arrow table anymore. With `episode_indices`, only the frames of these
+    episodes are indexed (the other episodes are empty), e.g. to resolve the frames of a few items without a
+    prebuilt index. The timestamps of each episode are assumed to be sorted.
+
+    To resolve the queries of any number of items and episodes with a single `np.searchsorted`, the timestamps
+    of each episode are shifted so that episodes don't overlap once concatenated. The search result is then
+    clipped to the range of the episode of each query, and the closest frame is picked among the neighbors of
+    the insertion point using the original (unshifted) timestamps.
+    """
+
+    def __init__(
+        self,
+        hf_dataset: datasets.Dataset,
+        episode_data_index: dict[str, torch.Tensor],
+        episode_indices: np.ndarray | None = None,
+    ):
+        ep_from = episode_data_index["from"].numpy().astype(np.int64)
+        ep_to = episode_data_index["to"].numpy().astype(np.int64)
+        ep_lengths = ep_to - ep_from
+        if episode_indices is not None:
+            indexed = np.zeros(len(ep_lengths), dtype=bool)
+            indexed[np.asarray(episode_indices, dtype=np.int64)] = True
+            ep_lengths = np.where(indexed, ep_lengths, 0)
+
+        # start and end of each episode in `self.timestamps`
+        self.episode_to = np.cumsum(ep_lengths)
+        self.episode_from = self.episode_to - ep_lengths
+        # dataset indices of the frames of all the episodes, concatenated in the order of the episodes
+        self.data_ids = np.arange(ep_lengths.sum(), dtype=np.int64)
+        self.data_ids += np.repeat(ep_from - self.episode_from, ep_lengths)
+
+        if episode_indices is not None:
+            # only read the timestamps of the indexed episodes
+            table = hf_dataset.with_format("arrow", columns=["timestamp"])[self.data_ids.tolist()]
+            self.timestamps = table["timestamp"].to_numpy()
+        else:
+            timestamps = load_column_as_numpy(hf_dataset, "timestamp")
+            if np.array_equal(self.data_ids, np.arange(len(timestamps))):
+                # episodes are contiguous and ordered, which is the usual case, so no copy is needed
+                self.timestamps = timestamps
+            else:
+                self.timestamps = timestamps[self.data_ids]
+
+        # shift each episode to start 1 second after the end of the previous one
+        non_empty = ep_lengths > 0
+        ep_first_ts = np.zeros(len(ep_lengths))
+        ep_last_ts = np.zeros(len(ep_lengths))
+        ep_first_ts[non_empty] = self.timestamps[self.episode_from[non_empty]]
+        ep_last_ts[non_empty] = self.timestamps[self.episode_to[non_empty] - 1]
+        ep_spans = ep_last_ts - ep_first_ts + 1
+        self._episode_shifts = np.cumsum(ep_spans) - ep_spans - ep_first_ts
+        self._sorted_keys = self.timestamps.astype(np.float64) + np.repeat(self._episode_shifts, ep_lengths)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def query(
+        self,
+        episode_indices: np.ndarray,
+        current_ts: np.ndarray,
+        delta_ts: np.ndarray,
+        tolerance_s: float,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Resolves the frames closest to `current_ts + delta_ts` for a batch of items.
+
+        Parameters:
+        - episode_indices (np.ndarray): Episode index of each item, of shape (batch,).
+        - current_ts (np.ndarray): Timestamp of each item, of shape (batch,).
+        - delta_ts (np.ndarray): Time differences to the timestamp of the items, of shape (num_deltas,).
+        - tolerance_s (float): See `load_previous_and_future_frames`.
+
+        Returns:
+        - The dataset indices of the closest frames, and a boolean array indicating which query timestamps are
+          outside of the episode range. Both are of shape (batch, num_deltas).
+
+        Raises:
+        - AssertionError: If any of the frames unexpectedly violate the tolerance level inside the episode range.
+        """
+        episode_indices = np.asarray(episode_indices, dtype=np.int64)
+        ep_from = self.episode_from[episode_indices][:, None]
+        ep_last = self.episode_to[episode_indices][:, None] - 1
+
+        # same float32 arithmetic as the timestamps stored in the dataset
+        query_ts = np.asarray(current_ts, dtype=np.float32)[:, None] + np.asarray(delta_ts, dtype=np.float32)
+        query_keys = query_ts.astype(np.float64) + self._episode_shifts[episode_indices][:, None]
+        insert_pos = np.searchsorted(self._sorted_keys, query_keys)
+
+        # the closest frame is one of the neighbors of the insertion point, inside the episode range
+        candidates = np.clip(insert_pos[..., None] + np.arange(-1, 2), ep_from[..., None], ep_last[..., None])
+        dist = np.abs(query_ts[..., None] - self.timestamps[candidates])
+        argmin_ = np.argmin(dist, axis=-1)
+        min_ = np.take_along_axis(dist, argmin_[..., None], axis=-1)[..., 0]
+        positions = np.take_along_axis(candidates, argmin_[..., None], axis=-1)[..., 0]
+
+        # TODO(rcadene): synchronize timestamps + interpolation if needed
+
+        is_pad = min_ > tolerance_s
+
+        # check violated query timestamps are all outside the episode range
+        ep_first_ts = np.broadcast_to(self.timestamps[ep_from], query_ts.shape)
+        ep_last_ts = np.broadcast_to(self.timestamps[ep_last], query_ts.shape)
+        assert ((query_ts[is_pad] < ep_first_ts[is_pad]) | (ep_last_ts[is_pad] < query_ts[is_pad])).all(), (
+            f"One or several timestamps unexpectedly violate the tolerance ({min_} > {tolerance_s=}) inside episode range."
+            "This might be due to synchronization issues with timestamps during data collection."
+        )
+
+        return self.data_ids[positions], is_pad
+
+
 def load_previous_and_future_frames(
     item: dict[str, torch.Tensor],
     hf_dataset: datasets.Dataset,
     episode_data_index: dict[str, torch.Tensor],
     delta_timestamps: dict[str, list[float]],
     tolerance_s: float,
+    timestamps_index: EpisodeTimestampsIndex | None = None,
 ) -> dict[torch.Tensor]:
     """
     Given a current item in the dataset containing a timestamp (e.g. 0.6 seconds), and a list of time differences of
@@ -249,6 +379,8 @@ def load_previous_and_future_frames(
     - tolerance_s (float, optional): The tolerance level (in seconds) used to determine if a data point is close enough to the query
       timestamp by asserting `tol > difference`. It is suggested to set `tol` to a smaller value than the
       smallest expected inter-frame period, but large enough to account for jitter.
+    - timestamps_index (EpisodeTimestampsIndex, optional): The timestamps of `hf_dataset` precomputed with
+      `EpisodeTimestampsIndex`. When not provided, only the timestamps of the episode of the item are read.
 
     Returns:
     - The same item with the queried frames for each modality specified in delta_timestamps, with an additional key for
@@ -258,55 +390,65 @@ def load_previous_and_future_frames(
     - AssertionError: If any of the frames unexpectedly violate the tolerance level. This could indicate synchronization
       issues with timestamps during data collection.
     """
-    # get indices of the frames associated to the episode, and their timestamps
-    ep_id = item["episode_index"].item()
-    ep_data_id_from = episode_data_index["from"][ep_id].item()
-    ep_data_id_to = episode_data_index["to"][ep_id].item()
-    ep_data_ids = torch.arange(ep_data_id_from, ep_data_id_to, 1)
-
-    # load timestamps
-    ep_timestamps = hf_dataset.select_columns("timestamp")[ep_data_id_from:ep_data_id_to]["timestamp"]
-    ep_timestamps = torch.stack(ep_timestamps)
-
-    # we make the assumption that the timestamps are sorted
-    ep_first_ts = ep_timestamps[0]
-    ep_last_ts = ep_timestamps[-1]
-    current_ts = item["timestamp"].item()
-
-    for key in delta_timestamps:
-        # get timestamps used as query to retrieve data of previous/future frames
-        delta_ts = delta_timestamps[key]
-        query_ts = current_ts + torch.tensor(delta_ts)
-
-        # compute distances between each query timestamp and all timestamps of all the frames belonging to the episode
-        dist = torch.cdist(query_ts[:, None], ep_timestamps[:, None], p=1)
-        min_, argmin_ = dist.min(1)
-
-        # TODO(rcadene): synchronize timestamps + interpolation if needed
-
-        is_pad = min_ > tolerance_s
-
-        # check violated query timestamps are all outside the episode range
-        assert ((query_ts[is_pad] < ep_first_ts) | (ep_last_ts < query_ts[is_pad])).all(), (
-            f"One or several timestamps unexpectedly violate the tolerance ({min_} > {tolerance_s=}) inside episode range."
-            "This might be due to synchronization issues with timestamps during data collection."
-        )
-
-        # get dataset indices corresponding to frames to be loaded
-        data_ids = ep_data_ids[argmin_]
+    batch = load_previous_and_future_frames_batch(
+        {key: [value] for key, value in item.items()},
+        hf_dataset,
+        episode_data_index,
+        delta_timestamps,
+        tolerance_s,
+        timestamps_index,
+    )
+    item.update({key: values[0] for key, values in batch.items()})
+    return item
 
-        # load frames modality
-        item[key] = hf_dataset.select_columns(key)[data_ids][key]
 
-        if isinstance(item[key][0], dict) and "path" in item[key][0]:
+def load_previous_and_future_frames_batch(
+    batch: dict[str, list],
+    hf_dataset: datasets.Dataset,
+    episode_data_index: dict[str, torch.Tensor],
+    delta_timestamps: dict[str, list[float]],
+    tolerance_s: float,
+    timestamps_index: EpisodeTimestampsIndex | None = None,
+) -> dict[str, list]:
+    """Batched version of `load_previous_and_future_frames`.
+
+    `batch` is the result of `hf_dataset[indices]`, i.e. a dictionary containing for each modality the list of
+    the values of the items. The query timestamps of all the items and modalities are resolved at once, and
+    the frames they point to are loaded with a single read of `hf_dataset`. The queried frames of each item
+    are added to the lists of `batch` in place.
+    """
+    episode_indices = np.array([ep_idx.item() for ep_idx in batch["episode_index"]])
+    if timestamps_index is None:
+        # only the timestamps of the episodes of the batch are read
+        timestamps_index = EpisodeTimestampsIndex(hf_dataset, episode_data_index, np.unique(episode_indices))
+
+    keys = list(delta_timestamps)
+    splits = np.cumsum([len(delta_timestamps[key]) for key in keys])[:-1]
+
+    # resolve the query timestamps of all the items and modalities at once
+    data_ids, is_pad = timestamps_index.query(
+        episode_indices,
+        np.array([ts.item() for ts in batch["timestamp"]]),
+        np.concatenate([np.asarray(delta_timestamps[key], dtype=np.float32) for key in keys]),
+        tolerance_s,
+    )
+
+    # load the frames of all the items and modalities with a single read
+    unique_data_ids, inverse = np.unique(data_ids.reshape(-1), return_inverse=True)
+    inverse = np.split(inverse.reshape(data_ids.shape), splits, axis=1)
+    is_pad = np.split(is_pad, splits, axis=1)
+    frames = hf_dataset.select_columns(keys)[unique_data_ids.tolist()]
+
+    for i, key in enumerate(keys):
+        if isinstance(frames[key][0], dict) and "path" in frames[key][0]:
             # video mode where frame are expressed as dict of path and timestamp
-            item[key] = item[key]
+            batch[key] = [[frames[key][j] for j in item_inverse] for item_inverse in inverse[i]]
         else:
-            item[key] = torch.stack(item[key])
+            batch[key] = list(torch.stack(frames[key])[torch.from_numpy(inverse[i])])
 
-        item[f"{key}_is_pad"] = is_pad
+        batch[f"{key}_is_pad"] = list(torch.from_numpy(is_pad[i]))
 
-    return item
+    return batch
 
 
 def calculate_episode_data_index(hf_dataset: datasets.Dataset) -> Dict[str, torch.Tensor]:
@@ -400,6 +542,89 @@ def cycle(iterable):
             iterator = iter(iterable)
 
 
+class DevicePrefetcher:
+    """Iterates over the batches of `iterator`, moved to `device`.
+
+    On CUDA, the next batch is copied on a side stream while the current one is being used, so that the copy
+    overlaps with the computations of the training step (the batches should be in pinned memory for the copy to
+    be asynchronous, e.g. with `DataLoader(..., pin_memory=True)`). On other devices, or when `prefetch` is False
+    (e.g. when the sampled data changes between steps, as with an online buffer, so that a batch sampled ahead
+    would be stale), each batch is loaded and moved when it is requested.
+
+    After each `next`, `dataloading_s` is the time spent waiting for `iterator` to produce the batch, and
+    `h2d_s` the duration of its copy to the device (reading it waits for the copy to be done).
+    """
+
+    def __init__(self, iterator, device: torch.device, prefetch: bool = True):
+        self.iterator = iterator
+        self.device = device
+        self.stream = torch.cuda.Stream(device) if device.type == "cuda" and prefetch else None
+        self.dataloading_s = None
+        self._h2d_events = None
+        self._next = None
+
+    def __iter__(self):
+        return self
+
+    def _now(self):
+        if self.stream is not None:
+            event = torch.cuda.Event(enable_timing=True)
+            event.record(self.stream)
+            return event
+        return time.perf_counter()
+
+    def _load(self):
+        start_time = time.perf_counter()
+        batch = next(self.iterator)
+        dataloading_s = time.perf_counter() - start_time
+
+        with torch.cuda.stream(self.stream) if self.stream is not None else nullcontext():
+            h2d_start = self._now()
+            batch = {
+                key: value.to(self.device, non_blocking=True) if isinstance(value, torch.Tensor) else value
+                for key, value in batch.items()
+            }
+            h2d_end = self._now()
+        return batch, dataloading_s, (h2d_start, h2d_end)
+
+    def __next__(self) -> dict:
+        if self.stream is None:
+            batch, self.dataloading_s, self._h2d_events = self._load()
+            return batch
+
+        if self._next is None:
+            # the first batch is loaded lazily, so that nothing is sampled before the first step
+            self._next = self._load()
+        elif self._next is StopIteration:
+            raise StopIteration
+        batch, self.dataloading_s, self._h2d_events = self._next
+
+        current_stream = torch.cuda.current_stream(self.device)
+        current_stream.wait_stream(self.stream)
+        for value in batch.values():
+            if isinstance(value, torch.Tensor):
+                # the memory of the batch, allocated on the side stream, must not be reused before the current
+                # stream is done with it
+                value.record_stream(current_stream)
+
+        try:
+            self._next = self._load()
+        except StopIteration:
+            # the current batch is the last one
+            self._next = StopIteration
+        return batch
+
+    @property
+    def h2d_s(self) -> float | None:
+        if self._h2d_events is None:
+            return None
+        start, end = self._h2d_events
+        if self.stream is not None:
+            end.synchronize()
+            return start.elapsed_time(end) / 1e3
+        return end - start
+
+
 def create_branch(repo_id, *, branch: str, repo_type: str | None = None):
     """Create a branch on a existing Hugging Face repo. Delete the branch if it already
     exists before creating it.
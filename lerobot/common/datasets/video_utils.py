@@ -13,8 +13,12 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import contextlib
 import logging
+import os
+import queue
 import subprocess
+import threading
 import warnings
 from collections import OrderedDict
 from dataclasses import dataclass, field
@@ -33,14 +37,19 @@ def load_from_videos(
     videos_dir: Path,
     tolerance_s: float,
     backend: str = "pyav",
+    decoder_pool: "VideoDecoderPool | None" = None,
 ):
     """Note: When using data workers (e.g. DataLoader with num_workers>0), do not call this function
     in the main process (e.g. by using a second Dataloader with num_workers=0). It will result in a Segmentation Fault.
     This probably happens because a memory reference to the video loader is created in the main process and a
     subprocess fails to access it.
+
+    When `decoder_pool` is provided, the frames are decoded through its open decoders instead of opening a new
+    video reader for every call (see `VideoDecoderPool`).
     """
     # since video path already contains "videos" (e.g. videos_dir="data/videos", path="videos/episode_0.mp4")
     data_dir = videos_dir.parent
+    decode_fn = decode_video_frames_torchvision if decoder_pool is None else decoder_pool.decode
 
     for key in video_frame_keys:
         if isinstance(item[key], list):
@@ -51,19 +60,69 @@ def load_from_videos(
                 raise NotImplementedError("All video paths are expected to be the same for now.")
             video_path = data_dir / paths[0]
 
-            frames = decode_video_frames_torchvision(video_path, timestamps, tolerance_s, backend)
+            frames = decode_fn(video_path, timestamps, tolerance_s, backend)
             item[key] = frames
         else:
             # load one frame
             timestamps = [item[key]["timestamp"]]
             video_path = data_dir / item[key]["path"]
 
-            frames = decode_video_frames_torchvision(video_path, timestamps, tolerance_s, backend)
+            frames = decode_fn(video_path, timestamps, tolerance_s, backend)
             item[key] = frames[0]
 
     return item
 
 
+def load_from_videos_batch(
+    batch: dict[str, list],
+    video_frame_keys: list[str],
+    videos_dir: Path,
+    tolerance_s: float,
+    backend: str = "pyav",
+    decoder_pool: "VideoDecoderPool | None" = None,
+    max_gap_s: float = 1.0,
+):
+    """Batched version of `load_from_videos` where `batch` contains for each key the list of the values of the
+    items (e.g. the result of `hf_dataset[indices]`).
+
+    The frame requests of all the items are grouped by video file, and the timestamps requested in the same
+    file are decoded together, in increasing order, so that each frame is decoded at most once per batch.
+    Requested timestamps that are more than `max_gap_s` seconds apart are decoded with separate calls (i.e.
+    after a new seek) rather than by decoding all the frames in between.
+    """
+    # since video path already contains "videos" (e.g. videos_dir="data/videos", path="videos/episode_0.mp4")
+    data_dir = videos_dir.parent
+    decode_fn = decode_video_frames_torchvision if decoder_pool is None else decoder_pool.decode
+
+    for key in video_frame_keys:
+        is_multi_frame = isinstance(batch[key][0], list)
+        items_frames = batch[key] if is_multi_frame else [[frame] for frame in batch[key]]
+
+        # group the requested timestamps by video file
+        requested_ts = {}
+        for frames in items_frames:
+            for frame in frames:
+                requested_ts.setdefault(frame["path"], set()).add(frame["timestamp"])
+
+        decoded = {}
+        for path, timestamps in requested_ts.items():
+            timestamps = sorted(timestamps)
+            gaps = torch.tensor(timestamps[1:]) - torch.tensor(timestamps[:-1])
+            run_starts = [0] + (torch.nonzero(gaps > max_gap_s)[:, 0] + 1).tolist() + [len(timestamps)]
+            for start, end in zip(run_starts[:-1], run_starts[1:], strict=True):
+                run_ts = timestamps[start:end]
+                run_frames = decode_fn(data_dir / path, run_ts, tolerance_s, backend)
+                decoded.update({(path, ts): frame for ts, frame in zip(run_ts, run_frames, strict=True)})
+
+        items_frames = [
+            torch.stack([decoded[(frame["path"], frame["timestamp"])] for frame in frames])
+            for frames in items_frames
+        ]
+        batch[key] = items_frames if is_multi_frame else [frames[0] for frames in items_frames]
+
+    return batch
+
+
 def decode_video_frames_torchvision(
     video_path: str,
     timestamps: list[float],
@@ -129,6 +188,23 @@ def decode_video_frames_torchvision(
 
     reader = None
 
+    return select_closest_frames(
+        loaded_frames, loaded_ts, timestamps, tolerance_s, video_path, backend, log_loaded_timestamps
+    )
+
+
+def select_closest_frames(
+    loaded_frames: list[torch.Tensor],
+    loaded_ts: list[float],
+    timestamps: list[float],
+    tolerance_s: float,
+    video_path: str,
+    backend: str,
+    log_loaded_timestamps: bool = False,
+) -> torch.Tensor:
+    """Picks, among the decoded frames, the closest one to each query timestamp and converts them to the
+    pytorch format (float32 in [0,1] range and channel first).
+    """
     query_ts = torch.tensor(timestamps)
     loaded_ts = torch.tensor(loaded_ts)
 
@@ -162,27 +238,198 @@ def decode_video_frames_torchvision(
     return closest_frames
 
 
-def encode_video_frames(
-    imgs_dir: Path,
-    video_path: Path,
-    fps: int,
+class _OpenVideoDecoder:
+    """An open video reader along with the frames it decoded since its last seek."""
+
+    def __init__(self, video_path: str, backend: str):
+        torchvision.set_video_backend(backend)
+        self.reader = torchvision.io.VideoReader(video_path, "video")
+        self.backend = backend
+        self.frames: list[torch.Tensor] = []
+        self.timestamps: list[float] = []
+        self.nbytes = 0
+        self.exhausted = False
+
+    def seek(self, ts: float):
+        # pyav doesnt support accuracte seek, so we land on the closest previous key frame
+        self.reader.seek(ts, keyframes_only=self.backend == "pyav")
+        self.clear()
+        self.exhausted = False
+
+    def decode_until(self, ts: float, log_loaded_timestamps: bool = False):
+        while not self.exhausted and (len(self.timestamps) == 0 or self.timestamps[-1] < ts):
+            try:
+                frame = next(self.reader)
+            except StopIteration:
+                self.exhausted = True
+                break
+            if log_loaded_timestamps:
+                logging.info(f"frame loaded at timestamp={frame['pts']:.4f}")
+            self.frames.append(frame["data"])
+            self.timestamps.append(frame["pts"])
+            self.nbytes += frame["data"].nbytes
+
+    def drop_frames_before(self, ts: float):
+        num_dropped = 0
+        while num_dropped < len(self.timestamps) and self.timestamps[num_dropped] < ts:
+            self.nbytes -= self.frames[num_dropped].nbytes
+            num_dropped += 1
+        del self.frames[:num_dropped]
+        del self.timestamps[:num_dropped]
+
+    def clear(self):
+        self.frames = []
+        self.timestamps = []
+        self.nbytes = 0
+
+    def close(self):
+        self.clear()
+        if self.backend == "pyav":
+            self.reader.container.close()
+        self.reader = None
+
+
+class VideoDecoderPool:
+    """Per-process LRU pool of open video decoders keyed by video path.
+
+    `decode_video_frames_torchvision` opens, seeks, decodes and closes the video container on every call. This
+    pool keeps the last used containers open, as well as the frames they already decoded, so that consecutive
+    queries in the same video (e.g. consecutive frames of an episode sampled with `EpisodeAwareSampler`) only
+    decode the frames that were not decoded yet. A new seek is only done when the query goes backward in time or
+    jumps more than `max_forward_decode_s` seconds ahead of the last decoded frame.
+
+    The pool is bounded by the number of open decoders (least recently used ones are closed first) and by the
+    number of bytes of decoded frames it keeps around.
+
+    The pool is fork-safe: decoders opened by a parent process are never used nor closed by its children (e.g.
+    DataLoader workers), which start with an empty pool. It can also be pickled, in which case it is sent empty.
+    """
+
+    def __init__(
+        self,
+        max_open_decoders: int = 16,
+        max_cached_bytes: int = 256 * 1024**2,
+        max_forward_decode_s: float = 1.0,
+    ):
+        self.max_open_decoders = max_open_decoders
+        self.max_cached_bytes = max_cached_bytes
+        self.max_forward_decode_s = max_forward_decode_s
+        self._pid = os.getpid()
+        self._decoders: OrderedDict[tuple[str, str], _OpenVideoDecoder] = OrderedDict()
+
+    def __len__(self) -> int:
+        self._reset_if_forked()
+        return len(self._decoders)
+
+    @property
+    def cached_bytes(self) -> int:
+        """Number of bytes taken by the decoded frames kept in the pool."""
+        self._reset_if_forked()
+        return sum(decoder.nbytes for decoder in self._decoders.values())
+
+    def decode(
+        self,
+        video_path: str,
+        timestamps: list[float],
+        tolerance_s: float,
+        backend: str = "pyav",
+        log_loaded_timestamps: bool = False,
+    ) -> torch.Tensor:
+        """Same as `decode_video_frames_torchvision` but reusing the open decoder of `video_path` if any."""
+        video_path = str(video_path)
+        self._reset_if_forked()
+
+        decoder = self._get_decoder(video_path, backend)
+
+        # set the first and last requested timestamps
+        first_ts = timestamps[0]
+        last_ts = timestamps[-1]
+
+        # decoded frames can be reused when the query starts after the first decoded frame (i.e. after the key frame
+        # we seeked to), and not too far after the last decoded frame
+        ts = decoder.timestamps
+        can_reuse = len(ts) > 0 and ts[0] <= first_ts <= ts[-1] + self.max_forward_decode_s
+        if can_reuse:
+            # frames further than the tolerance before the first query timestamp can't be selected anymore
+            decoder.drop_frames_before(first_ts - tolerance_s)
+        else:
+            decoder.seek(first_ts)
+
+        decoder.decode_until(last_ts, log_loaded_timestamps)
+
+        frames = select_closest_frames(
+            decoder.frames,
+            decoder.timestamps,
+            timestamps,
+            tolerance_s,
+            video_path,
+            backend,
+            log_loaded_timestamps,
+        )
+        self._enforce_budget()
+        return frames
+
+    def close(self):
+        """Close all the open decoders."""
+        self._reset_if_forked()
+        while len(self._decoders) > 0:
+            _, decoder = self._decoders.popitem(last=False)
+            decoder.close()
+
+    def _get_decoder(self, video_path: str, backend: str) -> _OpenVideoDecoder:
+        key = (video_path, backend)
+        if key in self._decoders:
+            self._decoders.move_to_end(key)
+        else:
+            self._decoders[key] = _OpenVideoDecoder(video_path, backend)
+        return self._decoders[key]
+
+    def _enforce_budget(self):
+        # close the least recently used decoders (the last used one is at the end)
+        while len(self._decoders) > self.max_open_decoders:
+            _, decoder = self._decoders.popitem(last=False)
+            decoder.close()
+
+        # drop the decoded frames of the least recently used decoders, but never those of the last used one
+        cached_bytes = self.cached_bytes
+        for decoder in list(self._decoders.values())[:-1]:
+            if cached_bytes <= self.max_cached_bytes:
+                break
+            cached_bytes -= decoder.nbytes
+            decoder.clear()
+
+    def _reset_if_forked(self):
+        # decoders opened in a parent process must not be used by a child process
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._decoders = OrderedDict()
+
+    def __getstate__(self) -> dict:
+        return {
+            "max_open_decoders": self.max_open_decoders,
+            "max_cached_bytes": self.max_cached_bytes,
+            "max_forward_decode_s": self.max_forward_decode_s,
+        }
+
+    def __setstate__(self, state: dict):
+        self.__init__(**state)
+
+    def __del__(self):
+        if getattr(self, "_pid", None) == os.getpid():
+            self.close()
+
+
+def get_encoding_args(
     vcodec: str = "libsvtav1",
     pix_fmt: str = "yuv420p",
     g: int | None = 2,
     crf: int | None = 30,
     fast_decode: int = 0,
     log_level: str | None = "error",
-    overwrite: bool = False,
-) -> None:
-    """More info on ffmpeg arguments tuning on `benchmark/video/README.md`"""
-    video_path = Path(video_path)
-    video_path.parent.mkdir(parents=True, exist_ok=True)
-
+) -> list[str]:
+    """Returns the ffmpeg output arguments shared by `encode_video_frames` and `StreamingVideoEncoder`."""
     ffmpeg_args = OrderedDict(
         [
-            ("-f", "image2"),
-            ("-r", str(fps)),
-            ("-i", str(imgs_dir / "frame_%06d.png")),
             ("-vcodec", vcodec),
             ("-pix_fmt", pix_fmt),
         ]
@@ -202,7 +449,34 @@ def encode_video_frames(
     if log_level is not None:
         ffmpeg_args["-loglevel"] = str(log_level)
 
-    ffmpeg_args = [item for pair in ffmpeg_args.items() for item in pair]
+    return [item for pair in ffmpeg_args.items() for item in pair]
+
+
+def encode_video_frames(
+    imgs_dir: Path,
+    video_path: Path,
+    fps: int,
+    vcodec: str = "libsvtav1",
+    pix_fmt: str = "yuv420p",
+    g: int | None = 2,
+    crf: int | None = 30,
+    fast_decode: int = 0,
+    log_level: str | None = "error",
+    overwrite: bool = False,
+) -> None:
+    """More info on ffmpeg arguments tuning on `benchmark/video/README.md`"""
+    video_path = Path(video_path)
+    video_path.parent.mkdir(parents=True, exist_ok=True)
+
+    ffmpeg_args = [
+        "-f",
+        "image2",
+        "-r",
+        str(fps),
+        "-i",
+        str(imgs_dir / "frame_%06d.png"),
+    ]
+    ffmpeg_args += get_encoding_args(vcodec, pix_fmt, g, crf, fast_decode, log_level)
     if overwrite:
         ffmpeg_args.append("-y")
 
@@ -217,6 +491,113 @@ def encode_video_frames(
         )
 
 
+class StreamingVideoEncoder:
+    """Encodes frames into a video while they are recorded, by piping them to a persistent ffmpeg process.
+
+    Contrary to `encode_video_frames`, frames are not saved as png images first: the raw RGB frames are written
+    to the standard input of ffmpeg, which encodes them on the fly with the same arguments. Writing happens in a
+    background thread, so that `write` only blocks when more than `max_queue_size` frames are pending.
+
+    The ffmpeg process is started at the first frame, once the resolution is known. The video is finalized by
+    `close`, or deleted by `abort` (e.g. when an episode is re-recorded).
+
+    Example:
+    ```python
+    encoder = StreamingVideoEncoder("videos/observation.images.laptop_episode_000000.mp4", fps=30)
+    for frame in frames:  # uint8 (height, width, 3) tensors or arrays
+        encoder.write(frame)
+    encoder.close()
+    ```
+    """
+
+    def __init__(
+        self,
+        video_path: Path,
+        fps: int,
+        vcodec: str = "libsvtav1",
+        pix_fmt: str = "yuv420p",
+        g: int | None = 2,
+        crf: int | None = 30,
+        fast_decode: int = 0,
+        log_level: str | None = "error",
+        max_queue_size: int = 64,
+    ):
+        self.video_path = Path(video_path)
+        self.fps = fps
+        self.encoding_args = get_encoding_args(vcodec, pix_fmt, g, crf, fast_decode, log_level)
+        self.frames = queue.Queue(maxsize=max_queue_size)
+        self.process = None
+        self.thread = None
+        self.shape = None
+        self.num_frames = 0
+        self.error = None
+
+    def _start(self, height: int, width: int):
+        self.video_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ffmpeg_cmd = (
+            ["ffmpeg", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(self.fps)]
+            + ["-i", "pipe:0"]
+            + self.encoding_args
+            + ["-y", str(self.video_path)]
+        )
+        self.process = subprocess.Popen(self.ffmpeg_cmd, stdin=subprocess.PIPE)
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def _write_loop(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                # keep consuming the queue so that `write` never blocks
+                continue
+            try:
+                self.process.stdin.write(frame)
+            except (BrokenPipeError, OSError) as e:
+                self.error = e
+
+    def write(self, frame: torch.Tensor):
+        """Queues a uint8 (height, width, 3) RGB frame to be encoded."""
+        if self.error is not None:
+            raise OSError(f"Video encoding of {self.video_path} failed.") from self.error
+        if self.process is None:
+            height, width = frame.shape[:2]
+            self.shape = tuple(frame.shape)
+            self._start(height, width)
+        elif tuple(frame.shape) != self.shape:
+            raise ValueError(f"Expected a frame of shape {self.shape}, but {tuple(frame.shape)} was given.")
+        if isinstance(frame, torch.Tensor):
+            frame = frame.numpy()
+        self.frames.put(frame.tobytes())
+        self.num_frames += 1
+
+    def _stop(self):
+        self.frames.put(None)
+        self.thread.join()
+        with contextlib.suppress(BrokenPipeError):
+            self.process.stdin.close()
+        return self.process.wait()
+
+    def close(self) -> None:
+        """Waits for all the frames to be encoded, and finalizes the video."""
+        if self.process is None:
+            return
+        returncode = self._stop()
+        if self.error is not None or returncode != 0 or not self.video_path.exists():
+            raise OSError(
+                f"Video encoding did not work for {self.video_path} (ffmpeg exit code {returncode}). "
+                f"Try running the command manually to debug: `{' '.join(self.ffmpeg_cmd)}`"
+            ) from self.error
+
+    def abort(self) -> None:
+        """Stops encoding and deletes the (incomplete) video."""
+        if self.process is not None:
+            self.process.kill()
+            self._stop()
+        self.video_path.unlink(missing_ok=True)
+
+
 @dataclass
 class VideoFrame:
     # TODO(rcadene, lhoestq): move to Hugging Face `datasets` repo
@@ -34,6 +34,7 @@ from torch import Tensor, nn
 from torchvision.models._utils import IntermediateLayerGetter
 from torchvision.ops.misc import FrozenBatchNorm2d
 
+from lerobot.common.datasets.backbone_features import backbone_features_key
 from lerobot.common.policies.act.configuration_act import ACTConfig
 from lerobot.common.policies.normalize import Normalize, Unnormalize
 
@@ -103,40 +104,68 @@ class ACTPolicy(
         environment. It works by managing the actions in a queue and only calling `select_actions` when the
         queue is empty.
         """
-        self.eval()
-
-        batch = self.normalize_inputs(batch)
-        if len(self.expected_image_keys) > 0:
-            batch = dict(batch)  # shallow copy so that adding a key doesn't modify the original
-            batch["observation.images"] = torch.stack([batch[k] for k in self.expected_image_keys], dim=-4)
-
         # If we are doing temporal ensembling, do online updates where we keep track of the number of actions
         # we are ensembling over.
         if self.config.temporal_ensemble_coeff is not None:
-            actions = self.model(batch)[0]  # (batch_size, chunk_size, action_dim)
-            actions = self.unnormalize_outputs({"action": actions})["action"]
+            actions = self.select_action_chunk(batch)  # (batch_size, chunk_size, action_dim)
             action = self.temporal_ensembler.update(actions)
             return action
 
         # Action queue logic for n_action_steps > 1. When the action_queue is depleted, populate it by
         # querying the policy.
         if len(self._action_queue) == 0:
-            actions = self.model(batch)[0][:, : self.config.n_action_steps]
-
-            # TODO(rcadene): make _forward return output dictionary?
-            actions = self.unnormalize_outputs({"action": actions})["action"]
+            actions = self.select_action_chunk(batch)[:, : self.config.n_action_steps]
 
-            # `self.model.forward` returns a (batch_size, n_action_steps, action_dim) tensor, but the queue
-            # effectively has shape (n_action_steps, batch_size, *), hence the transpose.
+            # `self.select_action_chunk` returns a (batch_size, n_action_steps, action_dim) tensor, but the
+            # queue effectively has shape (n_action_steps, batch_size, *), hence the transpose.
             self._action_queue.extend(actions.transpose(0, 1))
         return self._action_queue.popleft()
 
+    @torch.no_grad
+    def select_action_chunk(self, batch: dict[str, Tensor]) -> Tensor:
+        """Select the whole chunk of actions predicted from the current observations.
+
+        Unlike `select_action`, the action queue and the temporal ensembler are left untouched, so that the
+        chunk can be executed (and ensembled, see `ACTTemporalEnsembler.add_chunk`) by the caller, e.g. on the
+        robot side of a remote inference server.
+
+        Returns a (batch_size, chunk_size, action_dim) tensor, where the first action is the one to execute at
+        the time step of the observations.
+        """
+        self.eval()
+
+        batch = self.normalize_inputs(batch)
+        if len(self.expected_image_keys) > 0:
+            batch = dict(batch)  # shallow copy so that adding a key doesn't modify the original
+            batch["observation.images"] = torch.stack([batch[k] for k in self.expected_image_keys], dim=-4)
+
+        actions = self.model(batch)[0]
+        # TODO(rcadene): make _forward return output dictionary?
+        return self.unnormalize_outputs({"action": actions})["action"]
+
+    @torch.no_grad
+    def encode_backbone_features(self, key: str, images: Tensor) -> Tensor:
+        """Returns the (B, C', H', W') backbone feature maps of (B, C, H, W) images of the camera `key`, as used
+        by `forward` when the dataset provides them (see `lerobot/scripts/precompute_backbone_features.py`).
+        """
+        images = self.normalize_inputs({key: images})[key]
+        return self.model.backbone(images)["feature_map"]
+
     def forward(self, batch: dict[str, Tensor]) -> dict[str, Tensor]:
         """Run the batch through the model and compute the loss for training or validation."""
         batch = self.normalize_inputs(batch)
         if len(self.expected_image_keys) > 0:
             batch = dict(batch)  # shallow copy so that adding a key doesn't modify the original
-            batch["observation.images"] = torch.stack([batch[k] for k in self.expected_image_keys], dim=-4)
+            features_keys = [backbone_features_key(k) for k in self.expected_image_keys]
+            if all(k in batch for k in features_keys):
+                # precomputed features of the frozen backbone
+                batch[backbone_features_key("observation.images")] = torch.stack(
+                    [batch[k] for k in features_keys], dim=-4
+                )
+            else:
+                batch["observation.images"] = torch.stack(
+                    [batch[k] for k in self.expected_image_keys], dim=-4
+                )
         batch = self.normalize_targets(batch)
         actions_hat, (mu_hat, log_sigma_x2_hat) = self.model(batch)
 
@@ -144,7 +173,7 @@ class ACTPolicy(
             F.l1_loss(batch["action"], actions_hat, reduction="none") * ~batch["action_is_pad"].unsqueeze(-1)
         ).mean()
 
-        loss_dict = {"l1_loss": l1_loss.item()}
+        loss_dict = {"l1_loss": l1_loss.detach()}
         if self.config.use_vae:
             # Calculate Dₖₗ(latent_pdf || standard_normal). Note: After computing the KL-divergence for
             # each dimension independently, we sum over the latent dimension to get the total
@@ -153,7 +182,7 @@ class ACTPolicy(
             mean_kld = (
                 (-0.5 * (1 + log_sigma_x2_hat - mu_hat.pow(2) - (log_sigma_x2_hat).exp())).sum(-1).mean()
             )
-            loss_dict["kld_loss"] = mean_kld.item()
+            loss_dict["kld_loss"] = mean_kld.detach()
             loss_dict["loss"] = l1_loss + mean_kld * self.config.kl_weight
         else:
             loss_dict["loss"] = l1_loss
@@ -162,7 +191,7 @@ class ACTPolicy(
 
 
 class ACTTemporalEnsembler:
-    def __init__(self, temporal_ensemble_coeff: float, chunk_size: int) -> None:
+    def __init__(self, temporal_ensemble_coeff: float, chunk_size: int, capturable: bool = False) -> None:
         """Temporal ensembling as described in Algorithm 2 of https://arxiv.org/abs/2304.13705.
 
         The weights are calculated as wᵢ = exp(-temporal_ensemble_coeff * i) where w₀ is the oldest action.
@@ -203,54 +232,159 @@ class ACTTemporalEnsembler:
             avg /= exp_weights[:i+1].sum()
         print("online", avg)
         ```
+
+        The online averages of the upcoming time steps are kept in a preallocated (batch, chunk_size,
+        action_dim) ring buffer, as the weighted sums Σ(aᵢ*wᵢ) and the sums of weights Σwᵢ of each time step.
+        Since wᵢ₊₁ = wᵢ * exp(-temporal_ensemble_coeff), the weight of the next action added to a time step is
+        kept per slot and updated in place, so that adding a chunk only takes a few in-place operations on (at
+        most two) contiguous slices of the buffer, without any allocation nor device to host synchronization.
+
+        With `capturable=True`, the position of the ring buffer and the number of upcoming time steps are kept
+        on device, so that `update` (as well as `add_chunk` for a given number of actions, and `pop`) has
+        static shapes and addresses and can be captured in a CUDA graph (after a first warmup call, which
+        allocates the buffers). `len` and `ensembled_actions` then read them back from the device.
         """
         self.chunk_size = chunk_size
-        self.ensemble_weights = torch.exp(-temporal_ensemble_coeff * torch.arange(chunk_size))
-        self.ensemble_weights_cumsum = torch.cumsum(self.ensemble_weights, dim=0)
+        self.decay = math.exp(-temporal_ensemble_coeff)
+        self.capturable = capturable
+        # Ring buffer, allocated at the first chunk once the batch size and action dimension are known.
+        # (batch, chunk_size, action_dim) weighted sums of the actions predicted for each time step.
+        self._weighted_sum: Tensor | None = None
+        # (chunk_size,) sums of the weights, and weights of the next action to add, for each time step.
+        self._weights_sum: Tensor | None = None
+        self._next_weight: Tensor | None = None
+        if capturable:
+            # (chunk_size,) positions of the time steps relative to the head, and head and number of time
+            # steps in the ensemble kept on device.
+            self._positions: Tensor | None = None
+            self._head_t: Tensor | None = None
+            self._num_actions_t: Tensor | None = None
         self.reset()
 
     def reset(self):
         """Resets the online computation variables."""
-        self.ensembled_actions = None
-        # (chunk_size,) count of how many actions are in the ensemble for each time step in the sequence.
-        self.ensembled_actions_count = None
+        # slot of the current time step in the ring buffer, and number of time steps in the ensemble
+        self._head = 0
+        self._num_actions = 0
+        if self._weighted_sum is not None:
+            self._weighted_sum.zero_()
+            self._weights_sum.zero_()
+            self._next_weight.fill_(1.0)
+            if self.capturable:
+                self._head_t.zero_()
+                self._num_actions_t.zero_()
+
+    def _allocate(self, actions: Tensor):
+        batch_size, _, action_dim = actions.shape
+        if (
+            self._weighted_sum is not None
+            and self._weighted_sum.shape == (batch_size, self.chunk_size, action_dim)
+            and self._weighted_sum.device == actions.device
+            and self._weighted_sum.dtype == actions.dtype
+        ):
+            return
+        kwargs = {"device": actions.device, "dtype": actions.dtype}
+        self._weighted_sum = torch.zeros(batch_size, self.chunk_size, action_dim, **kwargs)
+        self._weights_sum = torch.zeros(self.chunk_size, **kwargs)
+        self._next_weight = torch.ones(self.chunk_size, **kwargs)
+        if self.capturable:
+            self._positions = torch.arange(self.chunk_size, device=actions.device)
+            self._head_t = torch.zeros((), dtype=torch.long, device=actions.device)
+            self._num_actions_t = torch.zeros((), dtype=torch.long, device=actions.device)
+        self.reset()
+
+    def _slots(self, num_actions: int) -> Tensor:
+        """(num_actions,) slots of the upcoming time steps in the ring buffer, computed on device."""
+        return (self._positions[:num_actions] + self._head_t) % self.chunk_size
+
+    def __len__(self) -> int:
+        """Number of upcoming time steps in the ensemble."""
+        if self.capturable:
+            return 0 if self._num_actions_t is None else int(self._num_actions_t)
+        return self._num_actions
+
+    @property
+    def ensembled_actions(self) -> Tensor | None:
+        """The (batch, num_actions, action_dim) ensembled actions of the upcoming time steps."""
+        if self._weighted_sum is None:
+            return None
+        if self.capturable:
+            slots = self._slots(len(self))
+        else:
+            slots = [(self._head + i) % self.chunk_size for i in range(self._num_actions)]
+        return self._weighted_sum[:, slots] / self._weights_sum[slots, None]
 
     def update(self, actions: Tensor) -> Tensor:
         """
         Takes a (batch, chunk_size, action_dim) sequence of actions, update the temporal ensemble for all
         time steps, and pop/return the next batch of actions in the sequence.
         """
-        self.ensemble_weights = self.ensemble_weights.to(device=actions.device)
-        self.ensemble_weights_cumsum = self.ensemble_weights_cumsum.to(device=actions.device)
-        if self.ensembled_actions is None:
-            # Initializes `self._ensembled_action` to the sequence of actions predicted during the first
-            # time step of the episode.
-            self.ensembled_actions = actions.clone()
-            # Note: The last dimension is unsqueeze to make sure we can broadcast properly for tensor
-            # operations later.
-            self.ensembled_actions_count = torch.ones(
-                (self.chunk_size, 1), dtype=torch.long, device=self.ensembled_actions.device
-            )
-        else:
-            # self.ensembled_actions will have shape (batch_size, chunk_size - 1, action_dim). Compute
-            # the online update for those entries.
-            self.ensembled_actions *= self.ensemble_weights_cumsum[self.ensembled_actions_count - 1]
-            self.ensembled_actions += actions[:, :-1] * self.ensemble_weights[self.ensembled_actions_count]
-            self.ensembled_actions /= self.ensemble_weights_cumsum[self.ensembled_actions_count]
-            self.ensembled_actions_count = torch.clamp(self.ensembled_actions_count + 1, max=self.chunk_size)
-            # The last action, which has no prior online average, needs to get concatenated onto the end.
-            self.ensembled_actions = torch.cat([self.ensembled_actions, actions[:, -1:]], dim=1)
-            self.ensembled_actions_count = torch.cat(
-                [self.ensembled_actions_count, torch.ones_like(self.ensembled_actions_count[-1:])]
-            )
-        # "Consume" the first action.
-        action, self.ensembled_actions, self.ensembled_actions_count = (
-            self.ensembled_actions[:, 0],
-            self.ensembled_actions[:, 1:],
-            self.ensembled_actions_count[1:],
-        )
+        self.add_chunk(actions)
+        return self.pop()
+
+    def add_chunk(self, actions: Tensor):
+        """
+        Takes a (batch, num_actions, action_dim) sequence of actions starting at the current time step, and
+        update the temporal ensemble for all these time steps.
+
+        `update` adds a chunk of `chunk_size` actions at every time step, but chunks can also be added less
+        often (e.g. when the chunks are computed remotely), in which case the ensemble is consumed with `pop`
+        in between. Note that `num_actions` can be lower than `chunk_size`, e.g. when the first actions of a
+        chunk are already outdated by the time the chunk is received.
+        """
+        self._allocate(actions)
+        if self.capturable:
+            self._add_chunk_capturable(actions)
+            return
+        num_actions = actions.shape[1]
+        # The time steps of the chunk span the slots [head, chunk_size) and then [0, head) of the ring buffer.
+        # Time steps without prior average have a zero weighted sum and a next weight of w₀, so that they are
+        # updated like the others.
+        first = min(num_actions, self.chunk_size - self._head)
+        for slots, chunk_slice in [
+            (slice(self._head, self._head + first), slice(0, first)),
+            (slice(0, num_actions - first), slice(first, num_actions)),
+        ]:
+            if chunk_slice.start == chunk_slice.stop:
+                continue
+            next_weight = self._next_weight[slots]
+            self._weighted_sum[:, slots].addcmul_(actions[:, chunk_slice], next_weight[:, None])
+            self._weights_sum[slots].add_(next_weight)
+            next_weight.mul_(self.decay)
+        self._num_actions = max(self._num_actions, num_actions)
+
+    def pop(self) -> Tensor:
+        """Consume and return the ensembled (batch, action_dim) action of the current time step."""
+        if self.capturable:
+            return self._pop_capturable()
+        head = self._head
+        action = self._weighted_sum[:, head] / self._weights_sum[head]
+        self._weighted_sum[:, head].zero_()
+        self._weights_sum[head].zero_()
+        self._next_weight[head].fill_(1.0)
+        self._head = (head + 1) % self.chunk_size
+        self._num_actions = max(self._num_actions - 1, 0)
         return action
 
+    def _add_chunk_capturable(self, actions: Tensor):
+        num_actions = actions.shape[1]
+        slots = self._slots(num_actions)
+        next_weight = self._next_weight.index_select(0, slots)
+        self._weighted_sum.index_add_(1, slots, actions * next_weight[:, None])
+        self._weights_sum.index_add_(0, slots, next_weight)
+        self._next_weight.index_copy_(0, slots, next_weight * self.decay)
+        self._num_actions_t.clamp_(min=num_actions)
+
+    def _pop_capturable(self) -> Tensor:
+        head = self._head_t.view(1)
+        action = self._weighted_sum.index_select(1, head) / self._weights_sum.index_select(0, head)[:, None]
+        self._weighted_sum.index_fill_(1, head, 0.0)
+        self._weights_sum.index_fill_(0, head, 0.0)
+        self._next_weight.index_fill_(0, head, 1.0)
+        self._head_t.add_(1).remainder_(self.chunk_size)
+        self._num_actions_t.sub_(1).clamp_(min=0)
+        return action.squeeze(1)
+
 
 class ACT(nn.Module):
     """Action Chunking Transformer: The underlying neural network for ACTPolicy.
@@ -382,7 +516,8 @@ class ACT(nn.Module):
         {
             "observation.state" (optional): (B, state_dim) batch of robot states.
 
-            "observation.images": (B, n_cameras, C, H, W) batch of images.
+            "observation.images": (B, n_cameras, C, H, W) batch of images, or
+            "observation.images.backbone_features": (B, n_cameras, C', H', W') precomputed backbone features.
                 AND/OR
             "observation.environment_state": (B, env_dim) batch of environment states.
 
@@ -399,10 +534,11 @@ class ACT(nn.Module):
                 "action" in batch
             ), "actions must be provided when using the variational objective in training mode."
 
+        # the images may be replaced by the precomputed feature maps of the frozen backbone
+        features_key = backbone_features_key("observation.images")
+        images_key = features_key if features_key in batch else "observation.images"
         batch_size = (
-            batch["observation.images"]
-            if "observation.images" in batch
-            else batch["observation.environment_state"]
+            batch[images_key] if images_key in batch else batch["observation.environment_state"]
         ).shape[0]
 
         # Prepare the latent for input to the transformer encoder.
@@ -476,8 +612,11 @@ class ACT(nn.Module):
             all_cam_features = []
             all_cam_pos_embeds = []
 
-            for cam_index in range(batch["observation.images"].shape[-4]):
-                cam_features = self.backbone(batch["observation.images"][:, cam_index])["feature_map"]
+            for cam_index in range(batch[images_key].shape[-4]):
+                if images_key == features_key:
+                    cam_features = batch[features_key][:, cam_index]
+                else:
+                    cam_features = self.backbone(batch["observation.images"][:, cam_index])["feature_map"]
                 # TODO(rcadene, alexander-soare): remove call to `.to` to speedup forward ; precompute and use
                 # buffer
                 cam_pos_embed = self.encoder_cam_feat_pos_embed(cam_features).to(dtype=cam_features.dtype)
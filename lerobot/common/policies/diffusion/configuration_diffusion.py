@@ -92,6 +92,10 @@ class DiffusionConfig:
         clip_sample_range: The magnitude of the clipping range as described above.
         num_inference_steps: Number of reverse diffusion steps to use at inference time (steps are evenly
             spaced). If not provided, this defaults to be the same as `num_train_timesteps`.
+        inference_noise_scheduler_type: Name of the noise scheduler to use at inference time. Supported options:
+            ["DDPM", "DDIM", "DPMSolver"]. It shares the noise schedule of `noise_scheduler_type`, so a policy
+            trained with "DDPM" can be sampled in a few steps (see `num_inference_steps`) with "DDIM" or
+            "DPMSolver" (multistep DPM-Solver++). If not provided, this defaults to `noise_scheduler_type`.
         do_mask_loss_for_padding: Whether to mask the loss when there are copy-padded actions. See
             `LeRobotDataset` and `load_previous_and_future_frames` for mor information. Note, this defaults
             to False as the original Diffusion Policy implementation does the same.
@@ -150,6 +154,7 @@ class DiffusionConfig:
 
     # Inference
     num_inference_steps: int | None = None
+    inference_noise_scheduler_type: str | None = None
 
     # Loss computation
     do_mask_loss_for_padding: bool = False
@@ -198,6 +203,15 @@ class DiffusionConfig:
                 f"`noise_scheduler_type` must be one of {supported_noise_schedulers}. "
                 f"Got {self.noise_scheduler_type}."
             )
+        supported_inference_noise_schedulers = ["DDPM", "DDIM", "DPMSolver"]
+        if (
+            self.inference_noise_scheduler_type is not None
+            and self.inference_noise_scheduler_type not in supported_inference_noise_schedulers
+        ):
+            raise ValueError(
+                f"`inference_noise_scheduler_type` must be one of {supported_inference_noise_schedulers}. "
+                f"Got {self.inference_noise_scheduler_type}."
+            )
 
         # Check that the horizon size and U-Net downsampling is compatible.
         # U-Net downsamples by 2 with each stage.
@@ -31,9 +31,11 @@ import torch.nn.functional as F  # noqa: N812
 import torchvision
 from diffusers.schedulers.scheduling_ddim import DDIMScheduler
 from diffusers.schedulers.scheduling_ddpm import DDPMScheduler
+from diffusers.schedulers.scheduling_dpmsolver_multistep import DPMSolverMultistepScheduler
 from huggingface_hub import PyTorchModelHubMixin
 from torch import Tensor, nn
 
+from lerobot.common.datasets.backbone_features import backbone_features_key
 from lerobot.common.policies.diffusion.configuration_diffusion import DiffusionConfig
 from lerobot.common.policies.normalize import Normalize, Unnormalize
 from lerobot.common.policies.utils import (
@@ -100,7 +102,9 @@ class DiffusionPolicy(
             "action": deque(maxlen=self.config.n_action_steps),
         }
         if len(self.expected_image_keys) > 0:
-            self._queues["observation.images"] = deque(maxlen=self.config.n_obs_steps)
+            # the images are encoded once, when they are observed, and their features are reused for the next
+            # `n_obs_steps - 1` chunks
+            self._queues["observation.image_features"] = deque(maxlen=self.config.n_obs_steps)
         if self.use_env_state:
             self._queues["observation.environment_state"] = deque(maxlen=self.config.n_obs_steps)
 
@@ -126,16 +130,11 @@ class DiffusionPolicy(
         "horizon" may not the best name to describe what the variable actually means, because this period is
         actually measured from the first observation which (if `n_obs_steps` > 1) happened in the past.
         """
-        batch = self.normalize_inputs(batch)
-        if len(self.expected_image_keys) > 0:
-            batch = dict(batch)  # shallow copy so that adding a key doesn't modify the original
-            batch["observation.images"] = torch.stack([batch[k] for k in self.expected_image_keys], dim=-4)
-        # Note: It's important that this happens after stacking the images into a single key.
-        self._queues = populate_queues(self._queues, batch)
+        keys = self._populate_observation_queues(batch)
 
         if len(self._queues["action"]) == 0:
             # stack n latest observations from the queue
-            batch = {k: torch.stack(list(self._queues[k]), dim=1) for k in batch if k in self._queues}
+            batch = {k: torch.stack(list(self._queues[k]), dim=1) for k in keys if k in self._queues}
             actions = self.diffusion.generate_actions(batch)
 
             # TODO(rcadene): make above methods return output dictionary?
@@ -146,18 +145,86 @@ class DiffusionPolicy(
         action = self._queues["action"].popleft()
         return action
 
+    @torch.no_grad
+    def select_action_chunk(self, batch: dict[str, Tensor]) -> Tensor:
+        """Select all the actions generated from the current step onwards (see `select_action`).
+
+        The observations are cached as in `select_action`, but the action queue is left untouched, so that the
+        chunk can be executed by the caller, e.g. on the robot side of a remote inference server. As in training,
+        the cached observations must be the ones of consecutive control steps: a caller which only requests a
+        chunk every few steps should give the observations of the other steps to `observe`.
+
+        Returns a (batch_size, horizon - n_obs_steps + 1, action_dim) tensor, where the first action is the
+        one to execute at the current step.
+        """
+        keys = self._populate_observation_queues(batch)
+        # stack n latest observations from the queue
+        batch = {k: torch.stack(list(self._queues[k]), dim=1) for k in keys if k in self._queues}
+        actions = self.diffusion.generate_actions(
+            batch, n_action_steps=self.config.horizon - self.config.n_obs_steps + 1
+        )
+        return self.unnormalize_outputs({"action": actions})["action"]
+
+    @torch.no_grad
+    def observe(self, batch: dict[str, Tensor]):
+        """Caches the observations of a control step (see `select_action`), without generating actions."""
+        self._populate_observation_queues(batch)
+
+    def _populate_observation_queues(self, batch: dict[str, Tensor]) -> list[str]:
+        """Normalizes the observations and adds them to the queues. Returns the keys of the observations."""
+        batch = self.normalize_inputs(batch)
+        if len(self.expected_image_keys) > 0:
+            batch = dict(batch)  # shallow copy so that adding a key doesn't modify the original
+            images = torch.stack([batch[k] for k in self.expected_image_keys], dim=-4)
+            # Encode the images of this step only, with a time dimension of 1.
+            batch["observation.image_features"] = self.diffusion.encode_images(
+                {"observation.images": images.unsqueeze(1)}
+            ).squeeze(1)
+        # Note: It's important that this happens after encoding the images into a single key.
+        self._queues = populate_queues(self._queues, batch)
+        return list(batch)
+
+    @torch.no_grad
+    def encode_backbone_features(self, key: str, images: Tensor) -> Tensor:
+        """Returns the (B, C', H', W') backbone features of (B, C, H, W) images of the camera `key`, as used by
+        `forward` when the dataset provides them (see `lerobot/scripts/precompute_backbone_features.py`).
+
+        Note: The images are center cropped, as in eval mode, since the features are computed once.
+        """
+        images = self.normalize_inputs({key: images})[key]
+        if self.config.use_separate_rgb_encoder_per_camera:
+            encoder = self.diffusion.rgb_encoder[self.expected_image_keys.index(key)]
+        else:
+            encoder = self.diffusion.rgb_encoder
+        training = encoder.training
+        encoder.eval()
+        features = encoder.backbone_features(images)
+        encoder.train(training)
+        return features
+
     def forward(self, batch: dict[str, Tensor]) -> dict[str, Tensor]:
         """Run the batch through the model and compute the loss for training or validation."""
         batch = self.normalize_inputs(batch)
         if len(self.expected_image_keys) > 0:
             batch = dict(batch)  # shallow copy so that adding a key doesn't modify the original
-            batch["observation.images"] = torch.stack([batch[k] for k in self.expected_image_keys], dim=-4)
+            features_keys = [backbone_features_key(k) for k in self.expected_image_keys]
+            if all(k in batch for k in features_keys):
+                # precomputed features of the frozen backbone
+                batch[backbone_features_key("observation.images")] = torch.stack(
+                    [batch[k] for k in features_keys], dim=-4
+                )
+            else:
+                batch["observation.images"] = torch.stack(
+                    [batch[k] for k in self.expected_image_keys], dim=-4
+                )
         batch = self.normalize_targets(batch)
         loss = self.diffusion.compute_loss(batch)
         return {"loss": loss}
 
 
-def _make_noise_scheduler(name: str, **kwargs: dict) -> DDPMScheduler | DDIMScheduler:
+def _make_noise_scheduler(
+    name: str, **kwargs: dict
+) -> DDPMScheduler | DDIMScheduler | DPMSolverMultistepScheduler:
     """
     Factory for noise scheduler instances of the requested type. All kwargs are passed
     to the scheduler.
@@ -166,6 +233,10 @@ def _make_noise_scheduler(name: str, **kwargs: dict) -> DDPMScheduler | DDIMSche
         return DDPMScheduler(**kwargs)
     elif name == "DDIM":
         return DDIMScheduler(**kwargs)
+    elif name == "DPMSolver":
+        # DPM-Solver doesn't clip the intermediate samples.
+        kwargs = {k: v for k, v in kwargs.items() if k not in ["clip_sample", "clip_sample_range"]}
+        return DPMSolverMultistepScheduler(**kwargs)
     else:
         raise ValueError(f"Unsupported noise scheduler type {name}")
 
@@ -195,16 +266,24 @@ class DiffusionModel(nn.Module):
 
         self.unet = DiffusionConditionalUnet1d(config, global_cond_dim=global_cond_dim * config.n_obs_steps)
 
-        self.noise_scheduler = _make_noise_scheduler(
-            config.noise_scheduler_type,
-            num_train_timesteps=config.num_train_timesteps,
-            beta_start=config.beta_start,
-            beta_end=config.beta_end,
-            beta_schedule=config.beta_schedule,
-            clip_sample=config.clip_sample,
-            clip_sample_range=config.clip_sample_range,
-            prediction_type=config.prediction_type,
-        )
+        noise_scheduler_kwargs = {
+            "num_train_timesteps": config.num_train_timesteps,
+            "beta_start": config.beta_start,
+            "beta_end": config.beta_end,
+            "beta_schedule": config.beta_schedule,
+            "clip_sample": config.clip_sample,
+            "clip_sample_range": config.clip_sample_range,
+            "prediction_type": config.prediction_type,
+        }
+        self.noise_scheduler = _make_noise_scheduler(config.noise_scheduler_type, **noise_scheduler_kwargs)
+        # The scheduler used for sampling shares the noise schedule of the training one, but may take larger
+        # steps (e.g. a few steps of DDIM or DPM-Solver for a policy trained with DDPM).
+        if config.inference_noise_scheduler_type in [None, config.noise_scheduler_type]:
+            self.inference_noise_scheduler = self.noise_scheduler
+        else:
+            self.inference_noise_scheduler = _make_noise_scheduler(
+                config.inference_noise_scheduler_type, **noise_scheduler_kwargs
+            )
 
         if config.num_inference_steps is None:
             self.num_inference_steps = self.noise_scheduler.config.num_train_timesteps
@@ -226,50 +305,74 @@ class DiffusionModel(nn.Module):
             generator=generator,
         )
 
-        self.noise_scheduler.set_timesteps(self.num_inference_steps)
-
-        for t in self.noise_scheduler.timesteps:
+        noise_scheduler = self.inference_noise_scheduler
+        # Note: this also resets the state of multistep schedulers.
+        noise_scheduler.set_timesteps(self.num_inference_steps)
+
+        # The FiLM embeddings only depend on the timestep and the global conditioning, so they are computed
+        # for all the denoising steps at once, rather than by each residual block at every step.
+        # Note: the timesteps are iterated as python ints, so that the schedulers' control flow doesn't depend on
+        # tensors (which also makes the sampling loop traceable by `torch.export`).
+        timesteps = noise_scheduler.timesteps.tolist()
+        film_embeds = self.unet.compute_film_embeds(
+            torch.tensor(timesteps, dtype=torch.long, device=device), global_cond
+        )
+        for i, t in enumerate(timesteps):
             # Predict model output.
-            model_output = self.unet(
-                sample,
-                torch.full(sample.shape[:1], t, dtype=torch.long, device=sample.device),
-                global_cond=global_cond,
-            )
+            model_output = self.unet(sample, t, film_embeds=[embeds[i] for embeds in film_embeds])
             # Compute previous image: x_t -> x_t-1
-            sample = self.noise_scheduler.step(model_output, t, sample, generator=generator).prev_sample
+            sample = noise_scheduler.step(model_output, t, sample, generator=generator).prev_sample
 
         return sample
 
+    def encode_images(self, batch: dict[str, Tensor]) -> Tensor:
+        """Encode the images of `batch` into a (B, n_obs_steps, num_cameras * feature_dim) tensor.
+
+        The images are either given as "observation.images", or as their precomputed backbone features
+        (B, n_obs_steps, num_cameras, C', H', W') under `backbone_features_key("observation.images")`, in which
+        case only the head of the RGB encoder is run.
+        """
+        features_key = backbone_features_key("observation.images")
+        if features_key in batch:
+            inputs = batch[features_key]
+
+            def encode(encoder: DiffusionRgbEncoder, x: Tensor) -> Tensor:
+                return encoder.head(x)
+        else:
+            inputs = batch["observation.images"]
+
+            def encode(encoder: DiffusionRgbEncoder, x: Tensor) -> Tensor:
+                return encoder(x)
+
+        batch_size, n_obs_steps = inputs.shape[:2]
+        if self.config.use_separate_rgb_encoder_per_camera:
+            # Combine batch and sequence dims while rearranging to make the camera index dimension first.
+            inputs_per_camera = einops.rearrange(inputs, "b s n ... -> n (b s) ...")
+            img_features_list = torch.cat(
+                [encode(encoder, x) for encoder, x in zip(self.rgb_encoder, inputs_per_camera, strict=True)]
+            )
+            # Separate batch and sequence dims back out. The camera index dim gets absorbed into the
+            # feature dim (effectively concatenating the camera features).
+            return einops.rearrange(
+                img_features_list, "(n b s) ... -> b s (n ...)", b=batch_size, s=n_obs_steps
+            )
+        else:
+            # Combine batch, sequence, and "which camera" dims before passing to shared encoder.
+            img_features = encode(self.rgb_encoder, einops.rearrange(inputs, "b s n ... -> (b s n) ..."))
+            # Separate batch dim and sequence dim back out. The camera index dim gets absorbed into the
+            # feature dim (effectively concatenating the camera features).
+            return einops.rearrange(img_features, "(b s n) ... -> b s (n ...)", b=batch_size, s=n_obs_steps)
+
     def _prepare_global_conditioning(self, batch: dict[str, Tensor]) -> Tensor:
         """Encode image features and concatenate them all together along with the state vector."""
-        batch_size, n_obs_steps = batch["observation.state"].shape[:2]
         global_cond_feats = [batch["observation.state"]]
         # Extract image features.
         if self._use_images:
-            if self.config.use_separate_rgb_encoder_per_camera:
-                # Combine batch and sequence dims while rearranging to make the camera index dimension first.
-                images_per_camera = einops.rearrange(batch["observation.images"], "b s n ... -> n (b s) ...")
-                img_features_list = torch.cat(
-                    [
-                        encoder(images)
-                        for encoder, images in zip(self.rgb_encoder, images_per_camera, strict=True)
-                    ]
-                )
-                # Separate batch and sequence dims back out. The camera index dim gets absorbed into the
-                # feature dim (effectively concatenating the camera features).
-                img_features = einops.rearrange(
-                    img_features_list, "(n b s) ... -> b s (n ...)", b=batch_size, s=n_obs_steps
-                )
+            if "observation.image_features" in batch:
+                # the images were already encoded when they were observed (see `DiffusionPolicy`)
+                img_features = batch["observation.image_features"]
             else:
-                # Combine batch, sequence, and "which camera" dims before passing to shared encoder.
-                img_features = self.rgb_encoder(
-                    einops.rearrange(batch["observation.images"], "b s n ... -> (b s n) ...")
-                )
-                # Separate batch dim and sequence dim back out. The camera index dim gets absorbed into the
-                # feature dim (effectively concatenating the camera features).
-                img_features = einops.rearrange(
-                    img_features, "(b s n) ... -> b s (n ...)", b=batch_size, s=n_obs_steps
-                )
+                img_features = self.encode_images(batch)
             global_cond_feats.append(img_features)
 
         if self._use_env_state:
@@ -278,8 +381,11 @@ class DiffusionModel(nn.Module):
         # Concatenate features then flatten to (B, global_cond_dim).
         return torch.cat(global_cond_feats, dim=-1).flatten(start_dim=1)
 
-    def generate_actions(self, batch: dict[str, Tensor]) -> Tensor:
+    def generate_actions(self, batch: dict[str, Tensor], n_action_steps: int | None = None) -> Tensor:
         """
+        Returns `n_action_steps` (defaults to `config.n_action_steps`) actions starting from the current
+        observation.
+
         This function expects `batch` to have:
         {
             "observation.state": (B, n_obs_steps, state_dim)
@@ -299,8 +405,10 @@ class DiffusionModel(nn.Module):
         actions = self.conditional_sample(batch_size, global_cond=global_cond)
 
         # Extract `n_action_steps` steps worth of actions (from the current observation).
+        if n_action_steps is None:
+            n_action_steps = self.config.n_action_steps
         start = n_obs_steps - 1
-        end = start + self.config.n_action_steps
+        end = start + n_action_steps
         actions = actions[:, start:end]
 
         return actions
@@ -321,7 +429,11 @@ class DiffusionModel(nn.Module):
         """
         # Input validation.
         assert set(batch).issuperset({"observation.state", "action", "action_is_pad"})
-        assert "observation.images" in batch or "observation.environment_state" in batch
+        assert (
+            "observation.images" in batch
+            or backbone_features_key("observation.images") in batch
+            or "observation.environment_state" in batch
+        )
         n_obs_steps = batch["observation.state"].shape[1]
         horizon = batch["action"].shape[1]
         assert horizon == self.config.horizon
@@ -500,12 +612,12 @@ class DiffusionRgbEncoder(nn.Module):
         self.out = nn.Linear(config.spatial_softmax_num_keypoints * 2, self.feature_dim)
         self.relu = nn.ReLU()
 
-    def forward(self, x: Tensor) -> Tensor:
+    def backbone_features(self, x: Tensor) -> Tensor:
         """
         Args:
             x: (B, C, H, W) image tensor with pixel values in [0, 1].
         Returns:
-            (B, D) image feature.
+            (B, C', H', W') feature map of the backbone.
         """
         # Preprocess: maybe crop (if it was set up in the __init__).
         if self.do_crop:
@@ -515,11 +627,29 @@ class DiffusionRgbEncoder(nn.Module):
                 # Always use center crop for eval.
                 x = self.center_crop(x)
         # Extract backbone feature.
-        x = torch.flatten(self.pool(self.backbone(x)), start_dim=1)
+        return self.backbone(x)
+
+    def head(self, feature_map: Tensor) -> Tensor:
+        """
+        Args:
+            feature_map: (B, C', H', W') feature map of the backbone (see `backbone_features`).
+        Returns:
+            (B, D) image feature.
+        """
+        x = torch.flatten(self.pool(feature_map), start_dim=1)
         # Final linear layer with non-linearity.
         x = self.relu(self.out(x))
         return x
 
+    def forward(self, x: Tensor) -> Tensor:
+        """
+        Args:
+            x: (B, C, H, W) image tensor with pixel values in [0, 1].
+        Returns:
+            (B, D) image feature.
+        """
+        return self.head(self.backbone_features(x))
+
 
 def _replace_submodules(
     root_module: nn.Module, predicate: Callable[[nn.Module], bool], func: Callable[[nn.Module], nn.Module]
@@ -669,43 +799,78 @@ class DiffusionConditionalUnet1d(nn.Module):
             nn.Conv1d(config.down_dims[0], config.output_shapes["action"][0], 1),
         )
 
-    def forward(self, x: Tensor, timestep: Tensor | int, global_cond=None) -> Tensor:
+    def _conditional_blocks(self) -> list["DiffusionConditionalResidualBlock1d"]:
+        """The FiLM conditioned residual blocks, in the order in which they are applied."""
+        blocks = []
+        for resnet, resnet2, _ in self.down_modules:
+            blocks += [resnet, resnet2]
+        blocks += list(self.mid_modules)
+        for resnet, resnet2, _ in self.up_modules:
+            blocks += [resnet, resnet2]
+        return blocks
+
+    def compute_film_embeds(self, timesteps: Tensor, global_cond: Tensor | None = None) -> list[Tensor]:
+        """Computes the FiLM embeddings of each conditional residual block for several timesteps at once.
+
+        Args:
+            timesteps: (S,) tensor of timesteps.
+            global_cond: (B, global_cond_dim)
+        Returns:
+            A list with an (S, B, cond_channels) tensor per conditional residual block (B is 1 if there is no
+            global conditioning), such that indexing the timestep gives the `film_embeds` of `forward`.
+        """
+        timesteps_embed = self.diffusion_step_encoder(timesteps)
+        return [block.film_embed(timesteps_embed, global_cond) for block in self._conditional_blocks()]
+
+    def forward(
+        self,
+        x: Tensor,
+        timestep: Tensor | int,
+        global_cond: Tensor | None = None,
+        film_embeds: list[Tensor] | None = None,
+    ) -> Tensor:
         """
         Args:
             x: (B, T, input_dim) tensor for input to the Unet.
             timestep: (B,) tensor of (timestep_we_are_denoising_from - 1).
             global_cond: (B, global_cond_dim)
-            output: (B, T, input_dim)
+            film_embeds: Optional FiLM embeddings of the conditional residual blocks precomputed by
+                `compute_film_embeds` for this timestep, in which case `timestep` and `global_cond` are
+                ignored.
         Returns:
             (B, T, input_dim) diffusion model prediction.
         """
         # For 1D convolutions we'll need feature dimension first.
         x = einops.rearrange(x, "b t d -> b d t")
 
-        timesteps_embed = self.diffusion_step_encoder(timestep)
+        if film_embeds is None:
+            timesteps_embed = self.diffusion_step_encoder(timestep)
 
-        # If there is a global conditioning feature, concatenate it to the timestep embedding.
-        if global_cond is not None:
-            global_feature = torch.cat([timesteps_embed, global_cond], axis=-1)
-        else:
-            global_feature = timesteps_embed
+            # If there is a global conditioning feature, concatenate it to the timestep embedding.
+            if global_cond is not None:
+                global_feature = torch.cat([timesteps_embed, global_cond], axis=-1)
+            else:
+                global_feature = timesteps_embed
+
+            film_embeds = [block.cond_encoder(global_feature) for block in self._conditional_blocks()]
+        film_embeds = iter(film_embeds)
 
         # Run encoder, keeping track of skip features to pass to the decoder.
         encoder_skip_features: list[Tensor] = []
         for resnet, resnet2, downsample in self.down_modules:
-            x = resnet(x, global_feature)
-            x = resnet2(x, global_feature)
+            x = resnet(x, next(film_embeds))
+            x = resnet2(x, next(film_embeds))
             encoder_skip_features.append(x)
             x = downsample(x)
 
         for mid_module in self.mid_modules:
-            x = mid_module(x, global_feature)
+            x = mid_module(x, next(film_embeds))
 
         # Run decoder, using the skip features from the encoder.
         for resnet, resnet2, upsample in self.up_modules:
             x = torch.cat((x, encoder_skip_features.pop()), dim=1)
-            x = resnet(x, global_feature)
-            x = resnet2(x, global_feature)
+            x = resnet(x, next(film_embeds))
+            x = resnet2(x, next(film_embeds))
             x = upsample(x)
 
         x = self.final_conv(x)
@@ -746,18 +911,39 @@ class DiffusionConditionalResidualBlock1d(nn.Module):
             nn.Conv1d(in_channels, out_channels, 1) if in_channels != out_channels else nn.Identity()
         )
 
-    def forward(self, x: Tensor, cond: Tensor) -> Tensor:
+    def film_embed(self, timesteps_embed: Tensor, global_cond: Tensor | None = None) -> Tensor:
+        """Computes `cond_encoder` for all the pairs of timestep embedding and global conditioning.
+
+        The condition is the concatenation of both, so the linear layer of `cond_encoder` is split into a
+        timestep part and a global conditioning part (the Mish activation being elementwise), which are
+        computed once and broadcast.
+
+        Args:
+            timesteps_embed: (S, diffusion_step_embed_dim)
+            global_cond: (B, global_cond_dim)
+        Returns:
+            (S, B, cond_channels) tensor (B is 1 if there is no global conditioning).
+        """
+        linear = self.cond_encoder[1]
+        embed_dim = timesteps_embed.shape[-1]
+        embed = F.linear(F.mish(timesteps_embed), linear.weight[:, :embed_dim], linear.bias).unsqueeze(1)
+        if global_cond is not None:
+            embed = embed + F.linear(F.mish(global_cond), linear.weight[:, embed_dim:]).unsqueeze(0)
+        return embed
+
+    def forward(self, x: Tensor, cond_embed: Tensor) -> Tensor:
         """
         Args:
             x: (B, in_channels, T)
-            cond: (B, cond_dim)
+            cond_embed: (B, cond_channels) FiLM embedding of the condition, i.e. `cond_encoder(cond)` (see
+                `film_embed`).
         Returns:
             (B, out_channels, T)
         """
         out = self.conv1(x)
 
-        # Get condition embedding. Unsqueeze for broadcasting to `out`, resulting in (B, out_channels, 1).
-        cond_embed = self.cond_encoder(cond).unsqueeze(-1)
+        # Unsqueeze the condition embedding for broadcasting to `out`, resulting in (B, out_channels, 1).
+        cond_embed = cond_embed.unsqueeze(-1)
         if self.use_film_scale_modulation:
             # Treat the embedding as a list of scales and biases.
             scale = cond_embed[:, : self.out_channels]
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Export of ACT and Diffusion policies into self-contained inference artifacts.
+
+The inference of the policy (from the raw observations to the unnormalized chunk of actions) is captured in a
+single graph with `torch.export` (or ONNX), where:
+- the normalization of the inputs and the unnormalization of the actions are folded into one affine transform
+  per key, whose scale and offset are constants of the graph,
+- the batch norms of the vision backbone are folded into the preceding convolutions.
+
+The artifact can then be run with `lerobot.common.policies.exported.ExportedPolicy`, which only depends on
+torch (and onnxruntime for ONNX artifacts), e.g. on an edge device without the training stack.
+
+Example:
+```python
+policy = ACTPolicy.from_pretrained("lerobot/act_koch_real")
+export_policy(policy, "outputs/exported/act_koch_real.pt2", fps=30)
+```
+"""
+
+import copy
+import json
+import logging
+from pathlib import Path
+
+import torch
+from torch import Tensor, nn
+from torch.nn.utils.fusion import fuse_conv_bn_weights
+from torchvision.ops.misc import FrozenBatchNorm2d
+
+from lerobot.common.policies.act.modeling_act import ACTPolicy
+from lerobot.common.policies.diffusion.modeling_diffusion import DiffusionPolicy
+from lerobot.common.policies.exported import METADATA_FILE, METADATA_VERSION
+from lerobot.common.policies.normalize import Normalize, Unnormalize, compute_affine
+
+EXPORT_FORMATS = ["torch_export", "onnx"]
+
+
+def fuse_conv_bn(module: nn.Module) -> nn.Module:
+    """Folds the batch norms directly following a convolution into the convolution (in place).
+
+    This assumes that the children of each module are registered in the order in which they are applied, as
+    in torchvision's ResNets. It should thus only be applied to such vision backbones.
+    """
+    children = list(module.named_children())
+    for (conv_name, conv), (bn_name, bn) in zip(children[:-1], children[1:], strict=True):
+        if not isinstance(conv, nn.Conv2d) or not isinstance(bn, (nn.BatchNorm2d, FrozenBatchNorm2d)):
+            continue
+        if getattr(bn, "running_mean", None) is None:
+            # batch norms without running statistics depend on the batch
+            continue
+        fused = copy.deepcopy(conv)
+        fused.weight, fused.bias = fuse_conv_bn_weights(
+            conv.weight, conv.bias, bn.running_mean, bn.running_var, bn.eps, bn.weight, bn.bias
+        )
+        setattr(module, conv_name, fused)
+        setattr(module, bn_name, nn.Identity())
+    for child in module.children():
+        fuse_conv_bn(child)
+    return module
+
+
+def fold_normalization(normalize: Normalize | Unnormalize) -> dict[str, tuple[Tensor, Tensor]]:
+    """Returns the (scale, offset) of the affine transform `x * scale + offset` applied to each key."""
+    if normalize._missing_stat is not None:
+        raise ValueError(f"`{normalize._missing_stat}` is infinity, the policy has no dataset statistics.")
+    inverse = isinstance(normalize, Unnormalize)
+    affine = {}
+    for key, mode in normalize.modes.items():
+        buffer = getattr(normalize, "buffer_" + key.replace(".", "_"))
+        affine[key] = compute_affine(buffer, mode, inverse=inverse)
+    return affine
+
+
+class PolicyInferenceModule(nn.Module):
+    """Wraps the inference of an ACT or Diffusion policy into a module with positional tensor inputs.
+
+    The inputs are the observations of the keys in `input_keys` (sorted), as a (batch, *shape) tensor for ACT,
+    or a (batch, n_obs_steps, *shape) tensor for Diffusion, with images in float32 in [0, 1] and in channel
+    first format. The output is the (batch, num_actions, action_dim) unnormalized chunk of actions, starting
+    with the action of the current time step (see `select_action_chunk` of the policies).
+    """
+
+    def __init__(self, policy: ACTPolicy | DiffusionPolicy):
+        super().__init__()
+        if not isinstance(policy, (ACTPolicy, DiffusionPolicy)):
+            raise NotImplementedError(f"Exporting {type(policy).__name__} is not supported.")
+        self.name = policy.name
+        self.config = policy.config
+        self.input_keys = sorted(policy.config.input_shapes)
+        self.image_keys = policy.expected_image_keys
+        if isinstance(policy, ACTPolicy):
+            self.model = policy.model
+        else:
+            self.model = policy.diffusion
+
+        self.input_normalizations = self._register_affine(
+            "input", fold_normalization(policy.normalize_inputs)
+        )
+        self.output_normalizations = self._register_affine(
+            "output", fold_normalization(policy.unnormalize_outputs)
+        )
+
+    def _register_affine(self, prefix: str, affine: dict[str, tuple[Tensor, Tensor]]) -> dict[str, int]:
+        indices = {}
+        for i, (key, (scale, offset)) in enumerate(affine.items()):
+            self.register_buffer(f"{prefix}_scale_{i}", scale)
+            self.register_buffer(f"{prefix}_offset_{i}", offset)
+            indices[key] = i
+        return indices
+
+    def _affine(self, prefix: str, indices: dict[str, int], batch: dict[str, Tensor]) -> dict[str, Tensor]:
+        for key, i in indices.items():
+            if key in batch:
+                scale = getattr(self, f"{prefix}_scale_{i}")
+                offset = getattr(self, f"{prefix}_offset_{i}")
+                batch[key] = torch.addcmul(offset, batch[key], scale)
+        return batch
+
+    @property
+    def num_actions(self) -> int:
+        if self.name == "act":
+            return self.config.chunk_size
+        return self.config.horizon - self.config.n_obs_steps + 1
+
+    def forward(self, *inputs: Tensor) -> Tensor:
+        batch = dict(zip(self.input_keys, inputs, strict=True))
+        batch = self._affine("input", self.input_normalizations, batch)
+        if len(self.image_keys) > 0:
+            batch["observation.images"] = torch.stack([batch[k] for k in self.image_keys], dim=-4)
+
+        if self.name == "act":
+            actions = self.model(batch)[0]
+        else:
+            actions = self.model.generate_actions(batch, n_action_steps=self.num_actions)
+
+        return self._affine("output", self.output_normalizations, {"action": actions})["action"]
+
+
+def make_example_inputs(policy: ACTPolicy | DiffusionPolicy, batch_size: int = 1) -> tuple[Tensor, ...]:
+    """Random observations of the expected shapes, ordered like the inputs of `PolicyInferenceModule`."""
+    n_obs_steps = () if policy.name == "act" else (policy.config.n_obs_steps,)
+    return tuple(
+        torch.rand(batch_size, *n_obs_steps, *policy.config.input_shapes[key])
+        for key in sorted(policy.config.input_shapes)
+    )
+
+
+def export_policy(
+    policy: ACTPolicy | DiffusionPolicy,
+    output_path: str | Path,
+    fps: int,
+    export_format: str = "torch_export",
+    example_inputs: tuple[Tensor, ...] | None = None,
+) -> Path:
+    """Exports the inference of `policy` into a self-contained artifact, on cpu and for a batch size of 1.
+
+    Args:
+        policy: The ACT or Diffusion policy to export. It is not modified. ACT policies with temporal ensembling
+            (`temporal_ensemble_coeff`) are not supported, since `ExportedPolicy` does not ensemble the actions.
+        output_path: Path of the artifact. With the "torch_export" format, the metadata needed to run it (input
+            keys and shapes, number of actions, fps...) is saved inside the artifact. With the "onnx" format,
+            it is saved next to it, in a json file with the same name.
+        fps: The control frequency of the policy, saved in the metadata (it is used to control the robot).
+        export_format: "torch_export" for an `ExportedProgram` saved with `torch.export.save`, or "onnx".
+        example_inputs: The observations used to trace the policy (see `PolicyInferenceModule`). Random ones are
+            used by default.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"`export_format` must be one of {EXPORT_FORMATS}, but {export_format} was given.")
+    if fps is None or fps <= 0:
+        raise ValueError(f"`fps` must be a positive number, but {fps} was given.")
+    if policy.name == "act" and policy.config.temporal_ensemble_coeff is not None:
+        raise ValueError(
+            "ACT policies with `temporal_ensemble_coeff` cannot be exported, since the temporal ensembling of the "
+            "actions is not run by `ExportedPolicy`. Set it to None to export the policy without it."
+        )
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    policy = copy.deepcopy(policy).to("cpu").eval()
+    for param in policy.parameters():
+        param.requires_grad_(False)
+    module = PolicyInferenceModule(policy).eval()
+    if policy.name == "act" and hasattr(module.model, "backbone"):
+        fuse_conv_bn(module.model.backbone)
+    elif policy.name == "diffusion" and hasattr(module.model, "rgb_encoder"):
+        fuse_conv_bn(module.model.rgb_encoder)
+
+    if example_inputs is None:
+        example_inputs = make_example_inputs(policy)
+
+    metadata = {
+        "version": METADATA_VERSION,
+        "format": export_format,
+        "policy": policy.name,
+        "input_keys": module.input_keys,
+        "input_shapes": {key: list(policy.config.input_shapes[key]) for key in module.input_keys},
+        "n_obs_steps": policy.config.n_obs_steps,
+        "n_action_steps": policy.config.n_action_steps,
+        "num_actions": module.num_actions,
+        "action_dim": policy.config.output_shapes["action"][0],
+        "fps": fps,
+    }
+
+    with torch.no_grad():
+        if export_format == "torch_export":
+            program = torch.export.export(module, example_inputs, strict=False)
+            torch.export.save(program, output_path, extra_files={METADATA_FILE: json.dumps(metadata)})
+        else:
+            torch.onnx.export(
+                module,
+                example_inputs,
+                str(output_path),
+                input_names=module.input_keys,
+                output_names=["action"],
+                opset_version=17,
+            )
+            with open(output_path.with_suffix(".json"), "w") as f:
+                json.dump(metadata, f, indent=4)
+
+    logging.info(f"Exported {policy.name} policy to {output_path}")
+    return output_path
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Runtime for the policies exported with `lerobot.common.policies.export.export_policy`.
+
+This module only depends on torch (and onnxruntime for ONNX artifacts), so that exported policies can be run
+without the training stack (hydra, datasets, diffusers...).
+
+Example:
+```python
+policy = ExportedPolicy.load("outputs/exported/act_koch_real.pt2")
+policy.reset()
+action = policy.select_action(observation)  # like `ACTPolicy.select_action`
+```
+"""
+
+import json
+from collections import deque
+from pathlib import Path
+
+import torch
+from torch import Tensor
+
+METADATA_FILE = "metadata.json"
+METADATA_VERSION = 1
+
+
+class ExportedPolicy:
+    """Runs an exported policy, with the same `reset`, `select_action` and `select_action_chunk` interface as
+    the policies it was exported from.
+
+    Observations are given as a dictionary of (batch, *shape) tensors, with images in float32 in [0, 1] and in
+    channel first format. When the policy uses several observation steps (e.g. Diffusion), the history of
+    observations is kept here, as in `DiffusionPolicy`.
+    """
+
+    def __init__(self, module, metadata: dict, device: str | torch.device = "cpu"):
+        if metadata.get("version") != METADATA_VERSION:
+            raise ValueError(f"Unsupported exported policy version {metadata.get('version')}.")
+        self.module = module
+        self.metadata = metadata
+        self.device = torch.device(device)
+        self.name = metadata["policy"]
+        self.input_keys = metadata["input_keys"]
+        self.n_obs_steps = metadata["n_obs_steps"]
+        self.n_action_steps = metadata["n_action_steps"]
+        if metadata.get("fps") is None:
+            raise ValueError("The exported policy has no fps in its metadata, export it again with `fps`.")
+        self.fps = metadata["fps"]
+        self.reset()
+
+    @classmethod
+    def load(
+        cls, path: str | Path, device: str | torch.device = "cpu", compile: bool = False
+    ) -> "ExportedPolicy":
+        """Loads an artifact saved by `export_policy`, optionally compiling it with `torch.compile`.
+
+        ONNX artifacts are run by onnxruntime on cpu only, so `device` must then be "cpu".
+        """
+        path = Path(path)
+        if path.suffix == ".onnx":
+            if torch.device(device).type != "cpu":
+                raise ValueError(f"ONNX artifacts can only be run on cpu, but device {device} was given.")
+            with open(path.with_suffix(".json")) as f:
+                metadata = json.load(f)
+            return cls(_OnnxModule(path, metadata["input_keys"]), metadata, "cpu")
+
+        extra_files = {METADATA_FILE: ""}
+        program = torch.export.load(path, extra_files=extra_files)
+        metadata = json.loads(extra_files[METADATA_FILE])
+        module = program.module().to(device)
+        if compile:
+            module = torch.compile(module)
+        return cls(module, metadata, device)
+
+    def reset(self):
+        """This should be called whenever the environment is reset."""
+        self._observation_queues = {key: deque(maxlen=self.n_obs_steps) for key in self.input_keys}
+        self._action_queue = deque(maxlen=self.n_action_steps)
+
+    def _populate_observation_queues(self, batch: dict[str, Tensor]):
+        for key in self.input_keys:
+            queue = self._observation_queues[key]
+            observation = batch[key].to(self.device)
+            # initialize by copying the first observation until the queue is full
+            while len(queue) < queue.maxlen - 1:
+                queue.append(observation)
+            queue.append(observation)
+
+    def _run(self) -> Tensor:
+        if self.name == "act":
+            # ACT only uses the current observation, without time dimension
+            inputs = [self._observation_queues[key][-1] for key in self.input_keys]
+        else:
+            inputs = [torch.stack(list(self._observation_queues[key]), dim=1) for key in self.input_keys]
+        return self.module(*inputs)
+
+    @torch.no_grad
+    def observe(self, batch: dict[str, Tensor]):
+        """Caches the observations of a control step (see `select_action`), without predicting actions."""
+        self._populate_observation_queues(batch)
+
+    @torch.no_grad
+    def select_action_chunk(self, batch: dict[str, Tensor]) -> Tensor:
+        """Returns the (batch, num_actions, action_dim) chunk of actions predicted from the observations, where
+        the first action is the one to execute at the current step.
+
+        When the policy uses several observation steps, the observations of the previous control steps must
+        have been given with `observe` (or `select_action`) beforehand, otherwise the history is padded with
+        copies of `batch`.
+        """
+        self._populate_observation_queues(batch)
+        return self._run()
+
+    @torch.no_grad
+    def select_action(self, batch: dict[str, Tensor]) -> Tensor:
+        """Returns the (batch, action_dim) action to execute, computing a new chunk every `n_action_steps`."""
+        # the observation history is updated at every step, even when no chunk is computed
+        self._populate_observation_queues(batch)
+        if len(self._action_queue) == 0:
+            actions = self._run()[:, : self.n_action_steps]
+            # the queue effectively has shape (n_action_steps, batch_size, *), hence the transpose
+            self._action_queue.extend(actions.transpose(0, 1))
+        return self._action_queue.popleft()
+
+
+class _OnnxModule:
+    def __init__(self, path: Path, input_keys: list[str]):
+        import onnxruntime
+
+        self.session = onnxruntime.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+        self.input_keys = input_keys
+
+    def __call__(self, *inputs: Tensor) -> Tensor:
+        feed = {key: x.cpu().numpy() for key, x in zip(self.input_keys, inputs, strict=True)}
+        return torch.from_numpy(self.session.run(None, feed)[0])
@@ -16,6 +16,8 @@
 import torch
 from torch import Tensor, nn
 
+from lerobot.common.datasets.backbone_features import backbone_features_key
+
 
 def create_stats_buffers(
     shapes: dict[str, list[int]],
@@ -94,6 +96,46 @@ def _no_stats_error_str(name: str) -> str:
     )
 
 
+def compute_affine(buffer: nn.ParameterDict, mode: str, inverse: bool = False) -> tuple[Tensor, Tensor]:
+    """Returns the (scale, offset) such that normalizing (or unnormalizing if `inverse`) is `x * scale + offset`.
+
+    Args:
+        buffer: The statistics of a key, as created by `create_stats_buffers`.
+        mode: The normalization mode of the key ("mean_std" or "min_max").
+        inverse: Whether to return the affine transform of the unnormalization.
+    """
+    if mode == "mean_std":
+        mean, std = buffer["mean"].detach(), buffer["std"].detach()
+        if inverse:
+            return std.clone(), mean.clone()
+        scale = 1 / (std + 1e-8)
+        return scale, -mean * scale
+    elif mode == "min_max":
+        min, max = buffer["min"].detach(), buffer["max"].detach()
+        if inverse:
+            # (x + 1) / 2 * (max - min) + min
+            scale = (max - min) / 2
+            return scale, scale + min
+        # (x - min) / (max - min) * 2 - 1
+        scale = 2 / (max - min + 1e-8)
+        return scale, -min * scale - 1
+    else:
+        raise ValueError(mode)
+
+
+def _find_missing_stat(stats_buffers: dict[str, nn.ParameterDict]) -> str | None:
+    """Returns the name of the first statistic which is still infinity (i.e. was never provided), if any."""
+    for buffer in stats_buffers.values():
+        for name, stat in buffer.items():
+            if torch.isinf(stat).any():
+                return name
+    return None
+
+
+def _update_affine_hook(module: nn.Module, incompatible_keys):
+    module.update_affine()
+
+
 class Normalize(nn.Module):
     """Normalizes data (e.g. "observation.image") for more stable and faster convergence during training."""
 
@@ -128,31 +170,40 @@ class Normalize(nn.Module):
         stats_buffers = create_stats_buffers(shapes, modes, stats)
         for key, buffer in stats_buffers.items():
             setattr(self, "buffer_" + key.replace(".", "_"), buffer)
+        # The statistics are validated and folded into `x * scale + offset` once here and whenever they are
+        # loaded with `load_state_dict`, rather than at every forward (which would sync with the device).
+        for key in modes:
+            self.register_buffer("scale_" + key.replace(".", "_"), None, persistent=False)
+            self.register_buffer("offset_" + key.replace(".", "_"), None, persistent=False)
+        self.update_affine()
+        self.register_load_state_dict_post_hook(_update_affine_hook)
+
+    @torch.no_grad
+    def update_affine(self):
+        """Validates the statistics and recomputes the scale and offset of each key from them.
+
+        This is called automatically by `__init__` and `load_state_dict`, and should only be called manually
+        after modifying the statistics in place.
+        """
+        stats_buffers = {key: getattr(self, "buffer_" + key.replace(".", "_")) for key in self.modes}
+        self._missing_stat = _find_missing_stat(stats_buffers)
+        for key, mode in self.modes.items():
+            scale, offset = compute_affine(stats_buffers[key], mode, inverse=False)
+            setattr(self, "scale_" + key.replace(".", "_"), scale)
+            setattr(self, "offset_" + key.replace(".", "_"), offset)
 
     # TODO(rcadene): should we remove torch.no_grad?
     @torch.no_grad
     def forward(self, batch: dict[str, Tensor]) -> dict[str, Tensor]:
+        assert self._missing_stat is None, _no_stats_error_str(self._missing_stat)
         batch = dict(batch)  # shallow copy avoids mutating the input batch
-        for key, mode in self.modes.items():
-            buffer = getattr(self, "buffer_" + key.replace(".", "_"))
-
-            if mode == "mean_std":
-                mean = buffer["mean"]
-                std = buffer["std"]
-                assert not torch.isinf(mean).any(), _no_stats_error_str("mean")
-                assert not torch.isinf(std).any(), _no_stats_error_str("std")
-                batch[key] = (batch[key] - mean) / (std + 1e-8)
-            elif mode == "min_max":
-                min = buffer["min"]
-                max = buffer["max"]
-                assert not torch.isinf(min).any(), _no_stats_error_str("min")
-                assert not torch.isinf(max).any(), _no_stats_error_str("max")
-                # normalize to [0,1]
-                batch[key] = (batch[key] - min) / (max - min + 1e-8)
-                # normalize to [-1, 1]
-                batch[key] = batch[key] * 2 - 1
-            else:
-                raise ValueError(mode)
+        for key in self.modes:
+            if key not in batch and backbone_features_key(key) in batch:
+                # images replaced by their precomputed backbone features are already normalized
+                continue
+            scale = getattr(self, "scale_" + key.replace(".", "_"))
+            offset = getattr(self, "offset_" + key.replace(".", "_"))
+            batch[key] = torch.addcmul(offset, batch[key], scale)
         return batch
 
 
@@ -194,27 +245,38 @@ class Unnormalize(nn.Module):
         stats_buffers = create_stats_buffers(shapes, modes, stats)
         for key, buffer in stats_buffers.items():
             setattr(self, "buffer_" + key.replace(".", "_"), buffer)
+        # The statistics are validated and folded into `x * scale + offset` once here and whenever they are
+        # loaded with `load_state_dict`, rather than at every forward (which would sync with the device).
+        for key in modes:
+            self.register_buffer("scale_" + key.replace(".", "_"), None, persistent=False)
+            self.register_buffer("offset_" + key.replace(".", "_"), None, persistent=False)
+        self.update_affine()
+        self.register_load_state_dict_post_hook(_update_affine_hook)
+
+    @torch.no_grad
+    def update_affine(self):
+        """Validates the statistics and recomputes the scale and offset of each key from them.
+
+        This is called automatically by `__init__` and `load_state_dict`, and should only be called manually
+        after modifying the statistics in place.
+        """
+        stats_buffers = {key: getattr(self, "buffer_" + key.replace(".", "_")) for key in self.modes}
+        self._missing_stat = _find_missing_stat(stats_buffers)
+        for key, mode in self.modes.items():
+            scale, offset = compute_affine(stats_buffers[key], mode, inverse=True)
+            setattr(self, "scale_" + key.replace(".", "_"), scale)
+            setattr(self, "offset_" + key.replace(".", "_"), offset)
 
     # TODO(rcadene): should we remove torch.no_grad?
     @torch.no_grad
     def forward(self, batch: dict[str, Tensor]) -> dict[str, Tensor]:
+        assert self._missing_stat is None, _no_stats_error_str(self._missing_stat)
         batch = dict(batch)  # shallow copy avoids mutating the input batch
-        for key, mode in self.modes.items():
-            buffer = getattr(self, "buffer_" + key.replace(".", "_"))
-
-            if mode == "mean_std":
-                mean = buffer["mean"]
-                std = buffer["std"]
-                assert not torch.isinf(mean).any(), _no_stats_error_str("mean")
-                assert not torch.isinf(std).any(), _no_stats_error_str("std")
-                batch[key] = batch[key] * std + mean
-            elif mode == "min_max":
-                min = buffer["min"]
-                max = buffer["max"]
-                assert not torch.isinf(min).any(), _no_stats_error_str("min")
-                assert not torch.isinf(max).any(), _no_stats_error_str("max")
-                batch[key] = (batch[key] + 1) / 2
-                batch[key] = batch[key] * (max - min) + min
-            else:
-                raise ValueError(mode)
+        for key in self.modes:
+            if key not in batch and backbone_features_key(key) in batch:
+                # images replaced by their precomputed backbone features are already normalized
+                continue
+            scale = getattr(self, "scale_" + key.replace(".", "_"))
+            offset = getattr(self, "offset_" + key.replace(".", "_"))
+            batch[key] = torch.addcmul(offset, batch[key], scale)
         return batch
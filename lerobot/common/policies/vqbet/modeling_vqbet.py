@@ -611,14 +611,14 @@ class VQBeTHead(nn.Module):
 
         loss_dict = {
             "loss": loss,
-            "classification_loss": cbet_loss.detach().cpu().item(),
-            "offset_loss": offset_loss.detach().cpu().item(),
-            "equal_primary_code_rate": equal_primary_code_rate.detach().cpu().item(),
-            "equal_secondary_code_rate": equal_secondary_code_rate.detach().cpu().item(),
-            "vq_action_error": vq_action_error.detach().cpu().item(),
-            "offset_action_error": offset_action_error.detach().cpu().item(),
-            "action_error_max": action_error_max.detach().cpu().item(),
-            "action_mse_error": action_mse_error.detach().cpu().item(),
+            "classification_loss": cbet_loss.detach(),
+            "offset_loss": offset_loss.detach(),
+            "equal_primary_code_rate": equal_primary_code_rate.detach(),
+            "equal_secondary_code_rate": equal_secondary_code_rate.detach(),
+            "vq_action_error": vq_action_error.detach(),
+            "offset_action_error": offset_action_error.detach(),
+            "action_error_max": action_error_max.detach(),
+            "action_mse_error": action_mse_error.detach(),
         }
         return loss_dict
 
@@ -16,9 +16,10 @@ import tqdm
 from termcolor import colored
 
 from lerobot.common.datasets.populate_dataset import add_frame, safe_stop_image_writer
+from lerobot.common.policies.exported import ExportedPolicy
 from lerobot.common.policies.factory import make_policy
 from lerobot.common.robot_devices.robots.utils import Robot
-from lerobot.common.robot_devices.utils import busy_wait
+from lerobot.common.robot_devices.utils import ControlLoopScheduler
 from lerobot.common.utils.utils import get_safe_torch_device, init_hydra_config, set_global_seed
 from lerobot.scripts.eval import get_pretrained_policy_path
 
@@ -160,6 +161,11 @@ def init_keyboard_listener():
 
 def init_policy(pretrained_policy_name_or_path, policy_overrides):
     """Instantiate the policy and load fps, device and use_amp from config yaml"""
+    if str(pretrained_policy_name_or_path).endswith((".pt2", ".onnx")):
+        # policy exported with `lerobot/scripts/export_policy.py`, run on cpu and without config yaml
+        policy = ExportedPolicy.load(pretrained_policy_name_or_path)
+        return policy, policy.fps, torch.device("cpu"), False
+
     pretrained_policy_path = get_pretrained_policy_path(pretrained_policy_name_or_path)
     hydra_cfg = init_hydra_config(pretrained_policy_path / "config.yaml", policy_overrides)
     policy = make_policy(hydra_cfg=hydra_cfg, pretrained_policy_name_or_path=pretrained_policy_path)
@@ -233,6 +239,7 @@ def control_loop(
     device=None,
     use_amp=None,
     fps=None,
+    overrun_policy="skip",
 ):
     # TODO(rcadene): Add option to record logs
     if not robot.is_connected:
@@ -252,6 +259,12 @@ def control_loop(
 
     timestamp = 0
     start_episode_t = time.perf_counter()
+    # iterations are scheduled at absolute times `start_episode_t + i / fps`, so that overruns do not drift
+    # the loop. With the default "skip" policy, the deadlines missed during a stall are skipped, instead of
+    # recording a burst of back to back frames which would be stamped `1 / fps` apart in the dataset.
+    scheduler = ControlLoopScheduler(fps, overrun_policy) if fps is not None else None
+    if scheduler is not None:
+        scheduler.reset(start_episode_t)
     while timestamp < control_time_s:
         start_loop_t = time.perf_counter()
 
@@ -276,9 +289,8 @@ def control_loop(
                 cv2.imshow(key, cv2.cvtColor(observation[key].numpy(), cv2.COLOR_RGB2BGR))
             cv2.waitKey(1)
 
-        if fps is not None:
-            dt_s = time.perf_counter() - start_loop_t
-            busy_wait(1 / fps - dt_s)
+        if scheduler is not None:
+            scheduler.wait()
 
         dt_s = time.perf_counter() - start_loop_t
         log_control_info(robot, dt_s, fps=fps)
@@ -288,6 +300,10 @@ def control_loop(
             events["exit_early"] = False
             break
 
+    if dataset is not None and scheduler is not None:
+        # saved alongside the episode by `save_current_episode`
+        dataset["current_episode_timing"] = scheduler.stats()
+
 
 def reset_environment(robot, events, reset_time_s):
     # TODO(rcadene): refactor warmup_record and reset_environment
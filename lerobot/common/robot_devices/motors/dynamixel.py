@@ -108,6 +108,18 @@ X_SERIES_BAUDRATE_TABLE = {
 
 CALIBRATION_REQUIRED = ["Goal_Position", "Present_Position"]
 CONVERT_UINT32_TO_INT32_REQUIRED = ["Goal_Position", "Present_Position"]
+# Other fields holding signed values in two's complement, e.g. the velocity and current when moving backward
+TWOS_COMPLEMENT_REQUIRED = [
+    "Homing_Offset",
+    "Goal_PWM",
+    "Goal_Current",
+    "Goal_Velocity",
+    "Present_PWM",
+    "Present_Current",
+    "Present_Velocity",
+    "Velocity_Trajectory",
+    "Position_Trajectory",
+]
 
 MODEL_CONTROL_TABLE = {
     "x_series": X_SERIES_CONTROL_TABLE,
@@ -186,6 +198,19 @@ def convert_to_bytes(value, bytes, mock=False):
     return data
 
 
+def convert_fields_to_bytes(values, fields, mock=False):
+    """Concatenates the bytes of the `values` of contiguous `fields` of the control table, which are given as
+    (address, size_byte) tuples, to write them with a single `GroupSyncWrite` parameter."""
+    if mock:
+        # the mocked motors store the value of each field at its address
+        return {addr: value for value, (addr, _) in zip(values, fields, strict=True)}
+
+    data = []
+    for value, (_, bytes) in zip(values, fields, strict=True):
+        data += convert_to_bytes(value, bytes)
+    return data
+
+
 def get_group_sync_key(data_name, motor_names):
     group_key = f"{data_name}_" + "_".join(motor_names)
     return group_key
@@ -314,6 +339,8 @@ class DynamixelMotorsBus:
         self.port_handler = None
         self.packet_handler = None
         self.calibration = None
+        self.calib_arrays = None
+        self.calib_groups = {}
         self.is_connected = False
         self.group_readers = {}
         self.group_writers = {}
@@ -360,6 +387,9 @@ class DynamixelMotorsBus:
         if not self.port_handler.openPort():
             raise OSError(f"Failed to open port '{self.port}'.")
 
+        # the group readers and writers are bound to the previous port handler
+        self.group_readers = {}
+        self.group_writers = {}
         self.is_connected = True
 
     def are_motors_configured(self):
@@ -414,6 +444,63 @@ class DynamixelMotorsBus:
 
     def set_calibration(self, calibration: dict[str, list]):
         self.calibration = calibration
+        self.compile_calibration()
+
+    def compile_calibration(self):
+        """Compiles the calibration into per-motor arrays, in the order of `self.calibration["motor_names"]`,
+        so that `apply_calibration` and `revert_calibration` are array expressions over all the motors.
+
+        Both calibration modes are affine transforms `calibrated_value = value * scale + offset`:
+        - DEGREE: `(drive_sign * value + homing_offset) / (resolution // 2) * HALF_TURN_DEGREE`
+        - LINEAR: `(value - start_pos) / (end_pos - start_pos) * 100`
+        """
+        num_motors = len(self.calibration["motor_names"])
+        arrays = {
+            key: np.zeros(num_motors, dtype=np.float64)
+            for key in ["sign", "resolution", "scale", "offset", "lower_bound", "upper_bound"]
+        }
+        arrays["is_degree"] = np.zeros(num_motors, dtype=bool)
+        for key in ["homing_offset", "start_pos", "end_pos"]:
+            arrays[key] = np.array(self.calibration[key], dtype=np.float64)
+
+        for calib_idx, name in enumerate(self.calibration["motor_names"]):
+            calib_mode = self.calibration["calib_mode"][calib_idx]
+            _, model = self.motors[name]
+            arrays["resolution"][calib_idx] = self.model_resolution[model]
+
+            if CalibrationMode[calib_mode] == CalibrationMode.DEGREE:
+                # Update direction of rotation of the motor to match between leader and follower.
+                # In fact, the motor of the leader for a given joint can be assembled in an
+                # opposite direction in term of rotation than the motor of the follower on the same joint.
+                sign = -1 if self.calibration["drive_mode"][calib_idx] else 1
+                homing_offset = self.calibration["homing_offset"][calib_idx]
+                half_resolution = self.model_resolution[model] // 2
+                arrays["is_degree"][calib_idx] = True
+                arrays["sign"][calib_idx] = sign
+                arrays["scale"][calib_idx] = sign / half_resolution * HALF_TURN_DEGREE
+                arrays["offset"][calib_idx] = homing_offset / half_resolution * HALF_TURN_DEGREE
+                arrays["lower_bound"][calib_idx] = LOWER_BOUND_DEGREE
+                arrays["upper_bound"][calib_idx] = UPPER_BOUND_DEGREE
+
+            elif CalibrationMode[calib_mode] == CalibrationMode.LINEAR:
+                start_pos = self.calibration["start_pos"][calib_idx]
+                end_pos = self.calibration["end_pos"][calib_idx]
+                arrays["scale"][calib_idx] = 100 / (end_pos - start_pos)
+                arrays["offset"][calib_idx] = -start_pos / (end_pos - start_pos) * 100
+                arrays["lower_bound"][calib_idx] = LOWER_BOUND_LINEAR
+                arrays["upper_bound"][calib_idx] = UPPER_BOUND_LINEAR
+
+        self.calib_arrays = arrays
+        # arrays of each group of motors, indexed by the tuple of their names
+        self.calib_groups = {}
+
+    def get_calibration_arrays(self, motor_names: list[str]) -> dict[str, np.ndarray]:
+        """Returns the compiled calibration arrays of `motor_names`, in this order."""
+        group_key = tuple(motor_names)
+        if group_key not in self.calib_groups:
+            indices = np.array([self.calibration["motor_names"].index(name) for name in motor_names])
+            self.calib_groups[group_key] = {key: array[indices] for key, array in self.calib_arrays.items()}
+        return self.calib_groups[group_key]
 
     def apply_calibration_autocorrect(self, values: np.ndarray | list, motor_names: list[str] | None):
         """This function applies the calibration, automatically detects out of range errors for motors values and attempts to correct.
@@ -445,61 +532,34 @@ class DynamixelMotorsBus:
         if motor_names is None:
             motor_names = self.motor_names
 
-        # Convert from unsigned int32 original range [0, 2**32] to signed float32 range
-        values = values.astype(np.float32)
-
-        for i, name in enumerate(motor_names):
-            calib_idx = self.calibration["motor_names"].index(name)
-            calib_mode = self.calibration["calib_mode"][calib_idx]
-
-            if CalibrationMode[calib_mode] == CalibrationMode.DEGREE:
-                drive_mode = self.calibration["drive_mode"][calib_idx]
-                homing_offset = self.calibration["homing_offset"][calib_idx]
-                _, model = self.motors[name]
-                resolution = self.model_resolution[model]
-
-                # Update direction of rotation of the motor to match between leader and follower.
-                # In fact, the motor of the leader for a given joint can be assembled in an
-                # opposite direction in term of rotation than the motor of the follower on the same joint.
-                if drive_mode:
-                    values[i] *= -1
-
-                # Convert from range [-2**31, 2**31] to
-                # nominal range [-resolution//2, resolution//2] (e.g. [-2048, 2048])
-                values[i] += homing_offset
-
-                # Convert from range [-resolution//2, resolution//2] to
-                # universal float32 centered degree range [-180, 180]
-                # (e.g. 2048 / (4096 // 2) * 180 = 180)
-                values[i] = values[i] / (resolution // 2) * HALF_TURN_DEGREE
-
-                if (values[i] < LOWER_BOUND_DEGREE) or (values[i] > UPPER_BOUND_DEGREE):
-                    raise JointOutOfRangeError(
-                        f"Wrong motor position range detected for {name}. "
-                        f"Expected to be in nominal range of [-{HALF_TURN_DEGREE}, {HALF_TURN_DEGREE}] degrees (a full rotation), "
-                        f"with a maximum range of [{LOWER_BOUND_DEGREE}, {UPPER_BOUND_DEGREE}] degrees to account for joints that can rotate a bit more, "
-                        f"but present value is {values[i]} degree. "
-                        "This might be due to a cable connection issue creating an artificial 360 degrees jump in motor values. "
-                        "You need to recalibrate by running: `python lerobot/scripts/control_robot.py calibrate`"
-                    )
-
-            elif CalibrationMode[calib_mode] == CalibrationMode.LINEAR:
-                start_pos = self.calibration["start_pos"][calib_idx]
-                end_pos = self.calibration["end_pos"][calib_idx]
-
-                # Rescale the present position to a nominal range [0, 100] %,
-                # useful for joints with linear motions like Aloha gripper
-                values[i] = (values[i] - start_pos) / (end_pos - start_pos) * 100
-
-                if (values[i] < LOWER_BOUND_LINEAR) or (values[i] > UPPER_BOUND_LINEAR):
-                    raise JointOutOfRangeError(
-                        f"Wrong motor position range detected for {name}. "
-                        f"Expected to be in nominal range of [0, 100] % (a full linear translation), "
-                        f"with a maximum range of [{LOWER_BOUND_LINEAR}, {UPPER_BOUND_LINEAR}] % to account for some imprecision during calibration, "
-                        f"but present value is {values[i]} %. "
-                        "This might be due to a cable connection issue creating an artificial jump in motor values. "
-                        "You need to recalibrate by running: `python lerobot/scripts/control_robot.py calibrate`"
-                    )
+        calib = self.get_calibration_arrays(motor_names)
+
+        # Convert from unsigned int32 original range [0, 2**32] to the universal float32 centered degree range
+        # [-180, 180] or to the nominal linear range [0, 100] % (see `compile_calibration`)
+        values = (np.asarray(values, dtype=np.float64) * calib["scale"] + calib["offset"]).astype(np.float32)
+
+        out_of_range = (values < calib["lower_bound"]) | (values > calib["upper_bound"])
+        if out_of_range.any():
+            i = np.flatnonzero(out_of_range)[0]
+            name = motor_names[i]
+            if calib["is_degree"][i]:
+                raise JointOutOfRangeError(
+                    f"Wrong motor position range detected for {name}. "
+                    f"Expected to be in nominal range of [-{HALF_TURN_DEGREE}, {HALF_TURN_DEGREE}] degrees (a full rotation), "
+                    f"with a maximum range of [{LOWER_BOUND_DEGREE}, {UPPER_BOUND_DEGREE}] degrees to account for joints that can rotate a bit more, "
+                    f"but present value is {values[i]} degree. "
+                    "This might be due to a cable connection issue creating an artificial 360 degrees jump in motor values. "
+                    "You need to recalibrate by running: `python lerobot/scripts/control_robot.py calibrate`"
+                )
+            else:
+                raise JointOutOfRangeError(
+                    f"Wrong motor position range detected for {name}. "
+                    f"Expected to be in nominal range of [0, 100] % (a full linear translation), "
+                    f"with a maximum range of [{LOWER_BOUND_LINEAR}, {UPPER_BOUND_LINEAR}] % to account for some imprecision during calibration, "
+                    f"but present value is {values[i]} %. "
+                    "This might be due to a cable connection issue creating an artificial jump in motor values. "
+                    "You need to recalibrate by running: `python lerobot/scripts/control_robot.py calibrate`"
+                )
 
         return values
 
@@ -525,115 +585,81 @@ class DynamixelMotorsBus:
         if motor_names is None:
             motor_names = self.motor_names
 
-        # Convert from unsigned int32 original range [0, 2**32] to signed float32 range
-        values = values.astype(np.float32)
+        calib = self.get_calibration_arrays(motor_names)
 
-        for i, name in enumerate(motor_names):
+        # Convert from unsigned int32 original range [0, 2**32] to signed float32 range
+        values = np.asarray(values).astype(np.float32)
+
+        # Convert from initial range to range [-180, 180] degrees or [0, 100] %
+        calib_vals = values * calib["scale"] + calib["offset"]
+        in_range = (calib_vals > calib["lower_bound"]) & (calib_vals < calib["upper_bound"])
+        if in_range.all():
+            return
+
+        resolution = calib["resolution"]
+        # Solve this inequality to find the factor to shift the range into [-180, 180] degrees
+        # values[i] = (values[i] + homing_offset + resolution * factor) / (resolution // 2) * HALF_TURN_DEGREE
+        # - HALF_TURN_DEGREE <= (values[i] + homing_offset + resolution * factor) / (resolution // 2) * HALF_TURN_DEGREE <= HALF_TURN_DEGREE
+        # (- (resolution // 2) - values[i] - homing_offset) / resolution <= factor <= ((resolution // 2) - values[i] - homing_offset) / resolution
+        signed_values = values * calib["sign"]
+        degree_low_factor = (-(resolution // 2) - signed_values - calib["homing_offset"]) / resolution
+        degree_upp_factor = ((resolution // 2) - signed_values - calib["homing_offset"]) / resolution
+
+        # Solve this inequality to find the factor to shift the range into [0, 100] %
+        # values[i] = (values[i] - start_pos + resolution * factor) / (end_pos + resolution * factor - start_pos - resolution * factor) * 100
+        # values[i] = (values[i] - start_pos + resolution * factor) / (end_pos - start_pos) * 100
+        # 0 <= (values[i] - start_pos + resolution * factor) / (end_pos - start_pos) * 100 <= 100
+        # (start_pos - values[i]) / resolution <= factor <= (end_pos - values[i]) / resolution
+        linear_low_factor = (calib["start_pos"] - values) / resolution
+        linear_upp_factor = (calib["end_pos"] - values) / resolution
+
+        low_factors = np.where(calib["is_degree"], degree_low_factor, linear_low_factor)
+        upp_factors = np.where(calib["is_degree"], degree_upp_factor, linear_upp_factor)
+
+        for i in np.flatnonzero(~in_range):
+            name = motor_names[i]
             calib_idx = self.calibration["motor_names"].index(name)
-            calib_mode = self.calibration["calib_mode"][calib_idx]
+            low_factor, upp_factor, calib_val = low_factors[i], upp_factors[i], calib_vals[i]
 
-            if CalibrationMode[calib_mode] == CalibrationMode.DEGREE:
-                drive_mode = self.calibration["drive_mode"][calib_idx]
-                homing_offset = self.calibration["homing_offset"][calib_idx]
-                _, model = self.motors[name]
-                resolution = self.model_resolution[model]
+            # Get first integer between the two bounds
+            if low_factor < upp_factor:
+                factor = math.ceil(low_factor)
 
-                # Update direction of rotation of the motor to match between leader and follower.
-                # In fact, the motor of the leader for a given joint can be assembled in an
-                # opposite direction in term of rotation than the motor of the follower on the same joint.
-                if drive_mode:
-                    values[i] *= -1
+                if factor > upp_factor:
+                    raise ValueError(f"No integer found between bounds [{low_factor=}, {upp_factor=}]")
+            else:
+                factor = math.ceil(upp_factor)
 
-                # Convert from initial range to range [-180, 180] degrees
-                calib_val = (values[i] + homing_offset) / (resolution // 2) * HALF_TURN_DEGREE
-                in_range = (calib_val > LOWER_BOUND_DEGREE) and (calib_val < UPPER_BOUND_DEGREE)
+                if factor > low_factor:
+                    raise ValueError(f"No integer found between bounds [{low_factor=}, {upp_factor=}]")
 
-                # Solve this inequality to find the factor to shift the range into [-180, 180] degrees
-                # values[i] = (values[i] + homing_offset + resolution * factor) / (resolution // 2) * HALF_TURN_DEGREE
-                # - HALF_TURN_DEGREE <= (values[i] + homing_offset + resolution * factor) / (resolution // 2) * HALF_TURN_DEGREE <= HALF_TURN_DEGREE
-                # (- (resolution // 2) - values[i] - homing_offset) / resolution <= factor <= ((resolution // 2) - values[i] - homing_offset) / resolution
-                low_factor = (-(resolution // 2) - values[i] - homing_offset) / resolution
-                upp_factor = ((resolution // 2) - values[i] - homing_offset) / resolution
+            if calib["is_degree"][i]:
+                out_of_range_str = f"{LOWER_BOUND_DEGREE} < {calib_val} < {UPPER_BOUND_DEGREE} degrees"
+                in_range_str = f"{LOWER_BOUND_DEGREE} < {calib_val} < {UPPER_BOUND_DEGREE} degrees"
+            else:
+                out_of_range_str = f"{LOWER_BOUND_LINEAR} < {calib_val} < {UPPER_BOUND_LINEAR} %"
+                in_range_str = f"{LOWER_BOUND_LINEAR} < {calib_val} < {UPPER_BOUND_LINEAR} %"
 
-            elif CalibrationMode[calib_mode] == CalibrationMode.LINEAR:
-                start_pos = self.calibration["start_pos"][calib_idx]
-                end_pos = self.calibration["end_pos"][calib_idx]
+            logging.warning(
+                f"Auto-correct calibration of motor '{name}' by shifting value by {abs(factor)} full turns, "
+                f"from '{out_of_range_str}' to '{in_range_str}'."
+            )
 
-                # Convert from initial range to range [0, 100] in %
-                calib_val = (values[i] - start_pos) / (end_pos - start_pos) * 100
-                in_range = (calib_val > LOWER_BOUND_LINEAR) and (calib_val < UPPER_BOUND_LINEAR)
-
-                # Solve this inequality to find the factor to shift the range into [0, 100] %
-                # values[i] = (values[i] - start_pos + resolution * factor) / (end_pos + resolution * factor - start_pos - resolution * factor) * 100
-                # values[i] = (values[i] - start_pos + resolution * factor) / (end_pos - start_pos) * 100
-                # 0 <= (values[i] - start_pos + resolution * factor) / (end_pos - start_pos) * 100 <= 100
-                # (start_pos - values[i]) / resolution <= factor <= (end_pos - values[i]) / resolution
-                low_factor = (start_pos - values[i]) / resolution
-                upp_factor = (end_pos - values[i]) / resolution
-
-            if not in_range:
-                # Get first integer between the two bounds
-                if low_factor < upp_factor:
-                    factor = math.ceil(low_factor)
-
-                    if factor > upp_factor:
-                        raise ValueError(f"No integer found between bounds [{low_factor=}, {upp_factor=}]")
-                else:
-                    factor = math.ceil(upp_factor)
-
-                    if factor > low_factor:
-                        raise ValueError(f"No integer found between bounds [{low_factor=}, {upp_factor=}]")
-
-                if CalibrationMode[calib_mode] == CalibrationMode.DEGREE:
-                    out_of_range_str = f"{LOWER_BOUND_DEGREE} < {calib_val} < {UPPER_BOUND_DEGREE} degrees"
-                    in_range_str = f"{LOWER_BOUND_DEGREE} < {calib_val} < {UPPER_BOUND_DEGREE} degrees"
-                elif CalibrationMode[calib_mode] == CalibrationMode.LINEAR:
-                    out_of_range_str = f"{LOWER_BOUND_LINEAR} < {calib_val} < {UPPER_BOUND_LINEAR} %"
-                    in_range_str = f"{LOWER_BOUND_LINEAR} < {calib_val} < {UPPER_BOUND_LINEAR} %"
-
-                logging.warning(
-                    f"Auto-correct calibration of motor '{name}' by shifting value by {abs(factor)} full turns, "
-                    f"from '{out_of_range_str}' to '{in_range_str}'."
-                )
+            # A full turn corresponds to 360 degrees but also to 4096 steps for a motor resolution of 4096.
+            self.calibration["homing_offset"][calib_idx] += int(resolution[i]) * factor
 
-                # A full turn corresponds to 360 degrees but also to 4096 steps for a motor resolution of 4096.
-                self.calibration["homing_offset"][calib_idx] += resolution * factor
+        self.compile_calibration()
 
     def revert_calibration(self, values: np.ndarray | list, motor_names: list[str] | None):
         """Inverse of `apply_calibration`."""
         if motor_names is None:
             motor_names = self.motor_names
 
-        for i, name in enumerate(motor_names):
-            calib_idx = self.calibration["motor_names"].index(name)
-            calib_mode = self.calibration["calib_mode"][calib_idx]
+        calib = self.get_calibration_arrays(motor_names)
 
-            if CalibrationMode[calib_mode] == CalibrationMode.DEGREE:
-                drive_mode = self.calibration["drive_mode"][calib_idx]
-                homing_offset = self.calibration["homing_offset"][calib_idx]
-                _, model = self.motors[name]
-                resolution = self.model_resolution[model]
-
-                # Convert from nominal 0-centered degree range [-180, 180] to
-                # 0-centered resolution range (e.g. [-2048, 2048] for resolution=4096)
-                values[i] = values[i] / HALF_TURN_DEGREE * (resolution // 2)
-
-                # Substract the homing offsets to come back to actual motor range of values
-                # which can be arbitrary.
-                values[i] -= homing_offset
-
-                # Remove drive mode, which is the rotation direction of the motor, to come back to
-                # actual motor rotation direction which can be arbitrary.
-                if drive_mode:
-                    values[i] *= -1
-
-            elif CalibrationMode[calib_mode] == CalibrationMode.LINEAR:
-                start_pos = self.calibration["start_pos"][calib_idx]
-                end_pos = self.calibration["end_pos"][calib_idx]
-
-                # Convert from nominal lnear range of [0, 100] % to
-                # actual motor range of values which can be arbitrary.
-                values[i] = values[i] / 100 * (end_pos - start_pos) + start_pos
+        # Convert from nominal 0-centered degree range [-180, 180] or nominal linear range [0, 100] % to
+        # actual motor range of values which can be arbitrary (see `compile_calibration`)
+        values = (np.asarray(values, dtype=np.float64) - calib["offset"]) / calib["scale"]
 
         values = np.round(values).astype(np.int32)
         return values
@@ -676,6 +702,21 @@ class DynamixelMotorsBus:
         else:
             return values[0]
 
+    def decode_read_values(self, data_name: str, values: np.ndarray, motor_names: list[str]) -> np.ndarray:
+        """Converts the raw `values` of `data_name` read from the motors (e.g. applies the calibration)."""
+        # Convert to signed int to use range [-2048, 2048] for our motor positions.
+        if data_name in CONVERT_UINT32_TO_INT32_REQUIRED:
+            values = values.astype(np.int32)
+        elif data_name in TWOS_COMPLEMENT_REQUIRED:
+            model = self.motors[motor_names[0]][1]
+            _, bytes = self.model_ctrl_table[model][data_name]
+            values = values.astype(f"int{8 * bytes}").astype(np.int32)
+
+        if data_name in CALIBRATION_REQUIRED and self.calibration is not None:
+            values = self.apply_calibration_autocorrect(values, motor_names)
+
+        return values
+
     def read(self, data_name, motor_names: str | list[str] | None = None):
         if not self.is_connected:
             raise RobotDeviceNotConnectedError(
@@ -706,7 +747,7 @@ class DynamixelMotorsBus:
         addr, bytes = self.model_ctrl_table[model][data_name]
         group_key = get_group_sync_key(data_name, motor_names)
 
-        if data_name not in self.group_readers:
+        if group_key not in self.group_readers:
             # create new group reader
             self.group_readers[group_key] = dxl.GroupSyncRead(
                 self.port_handler, self.packet_handler, addr, bytes
@@ -730,14 +771,7 @@ class DynamixelMotorsBus:
             value = self.group_readers[group_key].getData(idx, addr, bytes)
             values.append(value)
 
-        values = np.array(values)
-
-        # Convert to signed int to use range [-2048, 2048] for our motor positions.
-        if data_name in CONVERT_UINT32_TO_INT32_REQUIRED:
-            values = values.astype(np.int32)
-
-        if data_name in CALIBRATION_REQUIRED and self.calibration is not None:
-            values = self.apply_calibration_autocorrect(values, motor_names)
+        values = self.decode_read_values(data_name, np.array(values), motor_names)
 
         # log the number of seconds it took to read the data from the motors
         delta_ts_name = get_log_name("delta_timestamp_s", "read", data_name, motor_names)
@@ -778,6 +812,21 @@ class DynamixelMotorsBus:
                 f"{self.packet_handler.getTxRxResult(comm)}"
             )
 
+    def encode_write_values(
+        self, data_name: str, values: int | float | np.ndarray, motor_names: list[str]
+    ) -> list[int]:
+        """Converts the `values` of `data_name` to the raw values written to the motors (e.g. reverts the
+        calibration)."""
+        if isinstance(values, (int, float, np.integer)):
+            values = [int(values)] * len(motor_names)
+
+        values = np.array(values)
+
+        if data_name in CALIBRATION_REQUIRED and self.calibration is not None:
+            values = self.revert_calibration(values, motor_names)
+
+        return values.tolist()
+
     def write(self, data_name, values: int | float | np.ndarray, motor_names: str | list[str] | None = None):
         if not self.is_connected:
             raise RobotDeviceNotConnectedError(
@@ -797,10 +846,7 @@ class DynamixelMotorsBus:
         if isinstance(motor_names, str):
             motor_names = [motor_names]
 
-        if isinstance(values, (int, float, np.integer)):
-            values = [int(values)] * len(motor_names)
-
-        values = np.array(values)
+        values = self.encode_write_values(data_name, values, motor_names)
 
         motor_ids = []
         models = []
@@ -809,16 +855,11 @@ class DynamixelMotorsBus:
             motor_ids.append(motor_idx)
             models.append(model)
 
-        if data_name in CALIBRATION_REQUIRED and self.calibration is not None:
-            values = self.revert_calibration(values, motor_names)
-
-        values = values.tolist()
-
         assert_same_address(self.model_ctrl_table, models, data_name)
         addr, bytes = self.model_ctrl_table[model][data_name]
         group_key = get_group_sync_key(data_name, motor_names)
 
-        init_group = data_name not in self.group_readers
+        init_group = group_key not in self.group_writers
         if init_group:
             self.group_writers[group_key] = dxl.GroupSyncWrite(
                 self.port_handler, self.packet_handler, addr, bytes
@@ -847,6 +888,170 @@ class DynamixelMotorsBus:
         ts_utc_name = get_log_name("timestamp_utc", "write", data_name, motor_names)
         self.logs[ts_utc_name] = capture_timestamp_utc()
 
+    def read_fields(self, data_names: list[str], motor_names: str | list[str] | None = None) -> np.ndarray:
+        """Reads several fields of the control table (e.g. `["Present_Velocity", "Present_Position"]`) in a
+        single bus transaction, instead of one transaction per field with `read`.
+
+        All the addresses from the first to the last field are read with one sync read, so the fields should be
+        close to each other in the control table. Returns a structured array with one record per motor, whose
+        fields are decoded like with `read` (e.g. `values["Present_Position"]` is calibrated).
+        """
+        if not self.is_connected:
+            raise RobotDeviceNotConnectedError(
+                f"DynamixelMotorsBus({self.port}) is not connected. You need to run `motors_bus.connect()`."
+            )
+
+        start_time = time.perf_counter()
+
+        if self.mock:
+            import tests.mock_dynamixel_sdk as dxl
+        else:
+            import dynamixel_sdk as dxl
+
+        if motor_names is None:
+            motor_names = self.motor_names
+
+        if isinstance(motor_names, str):
+            motor_names = [motor_names]
+
+        motor_ids = []
+        models = []
+        for name in motor_names:
+            motor_idx, model = self.motors[name]
+            motor_ids.append(motor_idx)
+            models.append(model)
+
+        fields = {}
+        for data_name in data_names:
+            assert_same_address(self.model_ctrl_table, models, data_name)
+            fields[data_name] = self.model_ctrl_table[model][data_name]
+        start_addr = min(addr for addr, _ in fields.values())
+        end_addr = max(addr + bytes for addr, bytes in fields.values())
+        group_key = get_group_sync_key("_".join(data_names), motor_names)
+
+        if group_key not in self.group_readers:
+            # create new group reader of the whole span of addresses
+            self.group_readers[group_key] = dxl.GroupSyncRead(
+                self.port_handler, self.packet_handler, start_addr, end_addr - start_addr
+            )
+            for idx in motor_ids:
+                self.group_readers[group_key].addParam(idx)
+
+        for _ in range(NUM_READ_RETRY):
+            comm = self.group_readers[group_key].txRxPacket()
+            if comm == dxl.COMM_SUCCESS:
+                break
+
+        if comm != dxl.COMM_SUCCESS:
+            raise ConnectionError(
+                f"Read failed due to communication error on port {self.port} for group_key {group_key}: "
+                f"{self.packet_handler.getTxRxResult(comm)}"
+            )
+
+        columns = {}
+        for data_name, (addr, bytes) in fields.items():
+            values = [self.group_readers[group_key].getData(idx, addr, bytes) for idx in motor_ids]
+            columns[data_name] = self.decode_read_values(data_name, np.array(values), motor_names)
+
+        values = np.empty(len(motor_ids), dtype=[(name, column.dtype) for name, column in columns.items()])
+        for data_name, column in columns.items():
+            values[data_name] = column
+
+        # log the number of seconds it took to read the data from the motors, and the utc time at which the
+        # data was received, like for each field read with `read`
+        delta_ts = time.perf_counter() - start_time
+        ts_utc = capture_timestamp_utc()
+        for data_name in data_names:
+            self.logs[get_log_name("delta_timestamp_s", "read", data_name, motor_names)] = delta_ts
+            self.logs[get_log_name("timestamp_utc", "read", data_name, motor_names)] = ts_utc
+
+        return values
+
+    def write_fields(
+        self,
+        values: dict[str, int | float | np.ndarray],
+        motor_names: str | list[str] | None = None,
+    ):
+        """Writes several contiguous fields of the control table (e.g. `{"Profile_Velocity": 100,
+        "Goal_Position": positions}`) in a single bus transaction, instead of one transaction per field with
+        `write`. The values of each field are given like with `write`.
+        """
+        if not self.is_connected:
+            raise RobotDeviceNotConnectedError(
+                f"DynamixelMotorsBus({self.port}) is not connected. You need to run `motors_bus.connect()`."
+            )
+
+        start_time = time.perf_counter()
+
+        if self.mock:
+            import tests.mock_dynamixel_sdk as dxl
+        else:
+            import dynamixel_sdk as dxl
+
+        if motor_names is None:
+            motor_names = self.motor_names
+
+        if isinstance(motor_names, str):
+            motor_names = [motor_names]
+
+        motor_ids = []
+        models = []
+        for name in motor_names:
+            motor_idx, model = self.motors[name]
+            motor_ids.append(motor_idx)
+            models.append(model)
+
+        fields = {}
+        for data_name in values:
+            assert_same_address(self.model_ctrl_table, models, data_name)
+            fields[data_name] = self.model_ctrl_table[model][data_name]
+        # sort the fields by address, which must follow each other since the data is written in one block
+        data_names = sorted(fields, key=lambda data_name: fields[data_name][0])
+        for data_name, next_data_name in zip(data_names[:-1], data_names[1:], strict=True):
+            addr, bytes = fields[data_name]
+            if addr + bytes != fields[next_data_name][0]:
+                raise ValueError(
+                    f"The fields '{data_name}' and '{next_data_name}' are not contiguous in the control table, "
+                    "so they can't be written in a single transaction."
+                )
+        start_addr = fields[data_names[0]][0]
+        end_addr = sum(fields[data_names[-1]])
+        group_key = get_group_sync_key("_".join(data_names), motor_names)
+
+        columns = [
+            self.encode_write_values(data_name, values[data_name], motor_names) for data_name in data_names
+        ]
+
+        init_group = group_key not in self.group_writers
+        if init_group:
+            self.group_writers[group_key] = dxl.GroupSyncWrite(
+                self.port_handler, self.packet_handler, start_addr, end_addr - start_addr
+            )
+
+        for i, idx in enumerate(motor_ids):
+            data = convert_fields_to_bytes(
+                [column[i] for column in columns], [fields[data_name] for data_name in data_names], self.mock
+            )
+            if init_group:
+                self.group_writers[group_key].addParam(idx, data)
+            else:
+                self.group_writers[group_key].changeParam(idx, data)
+
+        comm = self.group_writers[group_key].txPacket()
+        if comm != dxl.COMM_SUCCESS:
+            raise ConnectionError(
+                f"Write failed due to communication error on port {self.port} for group_key {group_key}: "
+                f"{self.packet_handler.getTxRxResult(comm)}"
+            )
+
+        # log the number of seconds it took to write the data to the motors, and the utc time when the write
+        # has been completed, like for each field written with `write`
+        delta_ts = time.perf_counter() - start_time
+        ts_utc = capture_timestamp_utc()
+        for data_name in data_names:
+            self.logs[get_log_name("delta_timestamp_s", "write", data_name, motor_names)] = delta_ts
+            self.logs[get_log_name("timestamp_utc", "write", data_name, motor_names)] = ts_utc
+
     def disconnect(self):
         if not self.is_connected:
             raise RobotDeviceNotConnectedError(
@@ -8,6 +8,7 @@ import json
 import logging
 import time
 import warnings
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field, replace
 from pathlib import Path
 from typing import Sequence
@@ -19,6 +20,7 @@ from lerobot.common.robot_devices.cameras.utils import Camera
 from lerobot.common.robot_devices.motors.utils import MotorsBus
 from lerobot.common.robot_devices.robots.utils import get_arm_id
 from lerobot.common.robot_devices.utils import RobotDeviceAlreadyConnectedError, RobotDeviceNotConnectedError
+from lerobot.common.utils.utils import capture_timestamp_utc
 
 
 def ensure_safe_goal_position(
@@ -67,6 +69,12 @@ class ManipulatorRobotConfig:
     # gripper is not put in torque mode.
     gripper_open_degree: float | None = None
 
+    # During teleoperation, read the position of the leader arms for the next step while the goal position of
+    # the current step is written to the follower arms. This hides the latency of the leader reads, at the
+    # cost of using leader positions read at the previous step (i.e. up to one control period older). It is
+    # never used when recording data, where the action must be read at the same step as the observation.
+    prefetch_leader_pos: bool = False
+
     def __setattr__(self, prop: str, val):
         if prop == "max_relative_target" and val is not None and isinstance(val, Sequence):
             for name in self.follower_arms:
@@ -225,6 +233,11 @@ class ManipulatorRobot:
         self.cameras = self.config.cameras
         self.is_connected = False
         self.logs = {}
+        # One I/O thread per motors bus, so that the buses are read and written concurrently, while the
+        # operations on the same bus remain sequential.
+        self._bus_executors: dict[str, ThreadPoolExecutor] = {}
+        # Reads of the leader positions of the next teleoperation step (see `prefetch_leader_pos`)
+        self._leader_pos_futures: dict[str, Future] = {}
 
     @property
     def has_camera(self):
@@ -312,6 +325,9 @@ class ManipulatorRobot:
         for name in self.cameras:
             self.cameras[name].connect()
 
+        for arm_id in self.available_arms:
+            self._bus_executors[arm_id] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=arm_id)
+
         self.is_connected = True
 
     def activate_calibration(self):
@@ -465,54 +481,107 @@ class ManipulatorRobot:
             self.follower_arms[name].write("Maximum_Acceleration", 254)
             self.follower_arms[name].write("Acceleration", 254)
 
+    def _submit(self, name: str, arm_type: str, fn, *args) -> Future:
+        """Runs `fn(*args)` in the I/O thread of the bus of the arm."""
+        return self._bus_executors[get_arm_id(name, arm_type)].submit(fn, *args)
+
+    def _read_pos(self, arm: MotorsBus, log_name: str) -> torch.Tensor:
+        before_read_t = time.perf_counter()
+        pos = torch.from_numpy(arm.read("Present_Position"))
+        self.logs[f"{log_name}_dt_s"] = time.perf_counter() - before_read_t
+        self.logs[f"{log_name}_timestamp_utc"] = capture_timestamp_utc()
+        return pos
+
+    def _submit_leader_reads(self) -> dict[str, Future]:
+        return {
+            name: self._submit(
+                name, "leader", self._read_pos, self.leader_arms[name], f"read_leader_{name}_pos"
+            )
+            for name in self.leader_arms
+        }
+
+    def _submit_follower_reads(self) -> dict[str, Future]:
+        return {
+            name: self._submit(
+                name, "follower", self._read_pos, self.follower_arms[name], f"read_follower_{name}_pos"
+            )
+            for name in self.follower_arms
+        }
+
+    def _write_goal_pos(self, name: str, goal_pos: torch.Tensor) -> torch.Tensor:
+        before_fwrite_t = time.perf_counter()
+
+        # Cap goal position when too far away from present position.
+        # Slower fps expected due to reading from the follower.
+        if self.config.max_relative_target is not None:
+            present_pos = self.follower_arms[name].read("Present_Position")
+            present_pos = torch.from_numpy(present_pos)
+            goal_pos = ensure_safe_goal_position(goal_pos, present_pos, self.config.max_relative_target)
+
+        self.follower_arms[name].write("Goal_Position", goal_pos.numpy().astype(np.int32))
+        self.logs[f"write_follower_{name}_goal_pos_dt_s"] = time.perf_counter() - before_fwrite_t
+        return goal_pos
+
+    def _read_cameras(self) -> dict[str, torch.Tensor]:
+        # Cameras are read in their own thread (see `async_read`), so this only fetches their latest frame
+        images = {}
+        for name in self.cameras:
+            before_camread_t = time.perf_counter()
+            images[name] = self.cameras[name].async_read()
+            images[name] = torch.from_numpy(images[name])
+            self.logs[f"read_camera_{name}_dt_s"] = self.cameras[name].logs["delta_timestamp_s"]
+            self.logs[f"read_camera_{name}_timestamp_utc"] = self.cameras[name].logs["timestamp_utc"]
+            self.logs[f"async_read_camera_{name}_dt_s"] = time.perf_counter() - before_camread_t
+        return images
+
     def teleop_step(
         self, record_data=False
     ) -> None | tuple[dict[str, torch.Tensor], dict[str, torch.Tensor]]:
+        """Moves the followers to the position of the leaders.
+
+        Each motors bus is handled by its own I/O thread, so that the arms are read and written concurrently.
+        The time at which the data of each arm and camera was captured is logged in `self.logs` (e.g.
+        `read_follower_main_pos_timestamp_utc`).
+        """
         if not self.is_connected:
             raise RobotDeviceNotConnectedError(
                 "ManipulatorRobot is not connected. You need to run `robot.connect()`."
             )
 
-        # Prepare to assign the position of the leader to the follower
-        leader_pos = {}
-        for name in self.leader_arms:
-            before_lread_t = time.perf_counter()
-            leader_pos[name] = self.leader_arms[name].read("Present_Position")
-            leader_pos[name] = torch.from_numpy(leader_pos[name])
-            self.logs[f"read_leader_{name}_pos_dt_s"] = time.perf_counter() - before_lread_t
+        # Prepare to assign the position of the leader to the follower, unless it was read during the
+        # previous step. When recording, the recorded action must be read at the same step as the observation.
+        leader_pos_futures = self._leader_pos_futures
+        self._leader_pos_futures = {}
+        if record_data or not leader_pos_futures:
+            leader_pos_futures = self._submit_leader_reads()
+        leader_pos = {name: future.result() for name, future in leader_pos_futures.items()}
 
         # Send goal position to the follower
-        follower_goal_pos = {}
-        for name in self.follower_arms:
-            before_fwrite_t = time.perf_counter()
-            goal_pos = leader_pos[name]
+        follower_goal_pos_futures = {
+            name: self._submit(name, "follower", self._write_goal_pos, name, leader_pos[name])
+            for name in self.follower_arms
+        }
 
-            # Cap goal position when too far away from present position.
-            # Slower fps expected due to reading from the follower.
-            if self.config.max_relative_target is not None:
-                present_pos = self.follower_arms[name].read("Present_Position")
-                present_pos = torch.from_numpy(present_pos)
-                goal_pos = ensure_safe_goal_position(goal_pos, present_pos, self.config.max_relative_target)
-
-            # Used when record_data=True
-            follower_goal_pos[name] = goal_pos
-
-            goal_pos = goal_pos.numpy().astype(np.int32)
-            self.follower_arms[name].write("Goal_Position", goal_pos)
-            self.logs[f"write_follower_{name}_goal_pos_dt_s"] = time.perf_counter() - before_fwrite_t
+        # Read the leader position for the next step while the followers are written
+        if self.config.prefetch_leader_pos and not record_data:
+            self._leader_pos_futures = self._submit_leader_reads()
 
         # Early exit when recording data is not requested
         if not record_data:
+            for future in follower_goal_pos_futures.values():
+                future.result()
             return
 
         # TODO(rcadene): Add velocity and other info
-        # Read follower position
-        follower_pos = {}
-        for name in self.follower_arms:
-            before_fread_t = time.perf_counter()
-            follower_pos[name] = self.follower_arms[name].read("Present_Position")
-            follower_pos[name] = torch.from_numpy(follower_pos[name])
-            self.logs[f"read_follower_{name}_pos_dt_s"] = time.perf_counter() - before_fread_t
+        # Read follower position (after the write, since they share the I/O thread of their bus)
+        follower_pos_futures = self._submit_follower_reads()
+
+        # Capture images from cameras while the followers are read
+        images = self._read_cameras()
+
+        # Used when record_data=True
+        follower_goal_pos = {name: future.result() for name, future in follower_goal_pos_futures.items()}
+        follower_pos = {name: future.result() for name, future in follower_pos_futures.items()}
 
         # Create state by concatenating follower current position
         state = []
@@ -528,15 +597,6 @@ class ManipulatorRobot:
                 action.append(follower_goal_pos[name])
         action = torch.cat(action)
 
-        # Capture images from cameras
-        images = {}
-        for name in self.cameras:
-            before_camread_t = time.perf_counter()
-            images[name] = self.cameras[name].async_read()
-            images[name] = torch.from_numpy(images[name])
-            self.logs[f"read_camera_{name}_dt_s"] = self.cameras[name].logs["delta_timestamp_s"]
-            self.logs[f"async_read_camera_{name}_dt_s"] = time.perf_counter() - before_camread_t
-
         # Populate output dictionnaries
         obs_dict, action_dict = {}, {}
         obs_dict["observation.state"] = state
@@ -553,13 +613,13 @@ class ManipulatorRobot:
                 "ManipulatorRobot is not connected. You need to run `robot.connect()`."
             )
 
-        # Read follower position
-        follower_pos = {}
-        for name in self.follower_arms:
-            before_fread_t = time.perf_counter()
-            follower_pos[name] = self.follower_arms[name].read("Present_Position")
-            follower_pos[name] = torch.from_numpy(follower_pos[name])
-            self.logs[f"read_follower_{name}_pos_dt_s"] = time.perf_counter() - before_fread_t
+        # Read follower position, concurrently for all the arms
+        follower_pos_futures = self._submit_follower_reads()
+
+        # Capture images from cameras while the followers are read
+        images = self._read_cameras()
+
+        follower_pos = {name: future.result() for name, future in follower_pos_futures.items()}
 
         # Create state by concatenating follower current position
         state = []
@@ -568,15 +628,6 @@ class ManipulatorRobot:
                 state.append(follower_pos[name])
         state = torch.cat(state)
 
-        # Capture images from cameras
-        images = {}
-        for name in self.cameras:
-            before_camread_t = time.perf_counter()
-            images[name] = self.cameras[name].async_read()
-            images[name] = torch.from_numpy(images[name])
-            self.logs[f"read_camera_{name}_dt_s"] = self.cameras[name].logs["delta_timestamp_s"]
-            self.logs[f"async_read_camera_{name}_dt_s"] = time.perf_counter() - before_camread_t
-
         # Populate output dictionnaries and format to pytorch
         obs_dict = {}
         obs_dict["observation.state"] = state
@@ -601,27 +652,18 @@ class ManipulatorRobot:
 
         from_idx = 0
         to_idx = 0
-        action_sent = []
+        goal_pos_futures = []
         for name in self.follower_arms:
             # Get goal position of each follower arm by splitting the action vector
             to_idx += len(self.follower_arms[name].motor_names)
             goal_pos = action[from_idx:to_idx]
             from_idx = to_idx
 
-            # Cap goal position when too far away from present position.
-            # Slower fps expected due to reading from the follower.
-            if self.config.max_relative_target is not None:
-                present_pos = self.follower_arms[name].read("Present_Position")
-                present_pos = torch.from_numpy(present_pos)
-                goal_pos = ensure_safe_goal_position(goal_pos, present_pos, self.config.max_relative_target)
-
-            # Save tensor to concat and return
-            action_sent.append(goal_pos)
-
-            # Send goal position to each follower
-            goal_pos = goal_pos.numpy().astype(np.int32)
-            self.follower_arms[name].write("Goal_Position", goal_pos)
+            # Send goal position to each follower, concurrently
+            goal_pos_futures.append(self._submit(name, "follower", self._write_goal_pos, name, goal_pos))
 
+        # Save tensor to concat and return
+        action_sent = [future.result() for future in goal_pos_futures]
         return torch.cat(action_sent)
 
     def print_logs(self):
@@ -634,6 +676,12 @@ class ManipulatorRobot:
                 "ManipulatorRobot is not connected. You need to run `robot.connect()` before disconnecting."
             )
 
+        # Wait for the pending reads and writes before closing the ports
+        for executor in self._bus_executors.values():
+            executor.shutdown(wait=True)
+        self._bus_executors = {}
+        self._leader_pos_futures = {}
+
         for name in self.follower_arms:
             self.follower_arms[name].disconnect()
 
@@ -16,6 +16,96 @@ def busy_wait(seconds):
             time.sleep(seconds)
 
 
+def sleep_until(deadline, spin_s=0.002):
+    """Waits until `time.perf_counter()` reaches `deadline`.
+
+    Most of the wait is spent in `time.sleep`, and only the last `spin_s` seconds are spent busy waiting, to
+    compensate for the inaccuracy of `time.sleep` (e.g. on Mac) without keeping a core busy.
+    """
+    remaining = deadline - time.perf_counter()
+    if remaining > spin_s:
+        time.sleep(remaining - spin_s)
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ControlLoopScheduler:
+    """Paces a control loop at `fps`, using absolute deadlines so that the timing errors do not accumulate.
+
+    The i-th iteration is scheduled at `start + i / fps`, where `start` is the time of the first call to `wait`
+    (or of `reset`). When an iteration overruns its period, the next deadlines are already passed, and either:
+    - `overrun_policy="catch_up"`: the late iterations run back to back until the loop is back on schedule,
+      which keeps the number of iterations per second equal to `fps` on average,
+    - `overrun_policy="skip"`: the missed deadlines are skipped, and the loop waits for the next deadline to
+      come, which keeps every iteration aligned on the `1 / fps` grid.
+
+    Example:
+    ```python
+    scheduler = ControlLoopScheduler(fps=30)
+    scheduler.reset()
+    while True:
+        step()
+        scheduler.wait()
+    stats = scheduler.stats()
+    ```
+    """
+
+    def __init__(self, fps, overrun_policy="skip", spin_s=0.002):
+        if overrun_policy not in ["catch_up", "skip"]:
+            raise ValueError(
+                f"`overrun_policy` must be 'catch_up' or 'skip', but {overrun_policy} was given."
+            )
+        self.period_s = 1 / fps
+        self.overrun_policy = overrun_policy
+        self.spin_s = spin_s
+        self.reset()
+
+    def reset(self, start=None):
+        """Restarts the schedule at `start` (defaults to now) and resets the timing statistics."""
+        self.start = time.perf_counter() if start is None else start
+        self.tick = 0
+        self.num_ticks = 0
+        self.num_overruns = 0
+        self.num_skipped_ticks = 0
+        self.jitter_sum_s = 0.0
+        self.jitter_max_s = 0.0
+
+    @property
+    def next_deadline(self):
+        return self.start + (self.tick + 1) * self.period_s
+
+    def wait(self):
+        """Waits until the deadline of the next iteration, and returns how late it was woken up (in seconds)."""
+        deadline = self.next_deadline
+        now = time.perf_counter()
+        if now >= deadline:
+            # the iteration took longer than its period
+            self.num_overruns += 1
+            if self.overrun_policy == "skip":
+                num_missed = int((now - deadline) // self.period_s) + 1
+                self.tick += num_missed
+                self.num_skipped_ticks += num_missed
+                deadline = self.next_deadline
+
+        sleep_until(deadline, self.spin_s)
+        jitter_s = time.perf_counter() - deadline
+        self.tick += 1
+        self.num_ticks += 1
+        self.jitter_sum_s += jitter_s
+        self.jitter_max_s = max(self.jitter_max_s, jitter_s)
+        return jitter_s
+
+    def stats(self):
+        """Returns the timing statistics since the last reset, as a json serializable dictionary."""
+        return {
+            "num_ticks": self.num_ticks,
+            "num_overruns": self.num_overruns,
+            "num_skipped_ticks": self.num_skipped_ticks,
+            "jitter_mean_s": self.jitter_sum_s / self.num_ticks if self.num_ticks > 0 else 0.0,
+            "jitter_max_s": self.jitter_max_s,
+        }
+
+
 def safe_disconnect(func):
     # TODO(aliberts): Allow to pass custom exceptions
     # (e.g. ThreadServiceExit, KeyboardInterrupt, SystemExit, UnpluggedError, DynamixelCommError)
@@ -17,6 +17,8 @@ import threading
 import time
 from contextlib import ContextDecorator
 
+import torch
+
 
 class TimeBenchmark(ContextDecorator):
     """
@@ -90,3 +92,47 @@ class TimeBenchmark(ContextDecorator):
     @property
     def result_ms(self):
         return self.result * 1e3
+
+
+class StageTimer:
+    """
+    Measures the durations of the consecutive stages of a computation on a device, without synchronizing with it.
+
+    On CUDA, an event is recorded on the current stream at the end of each stage, and the elapsed times are only
+    read (which waits for the last event) when calling `durations`, e.g. every few steps when logging. On other
+    devices, the wall-clock time is measured instead.
+
+    Example:
+
+        >>> timer = StageTimer(device)
+        >>> loss = policy.forward(batch)["loss"]
+        >>> timer.mark("forward_s")
+        >>> loss.backward()
+        >>> timer.mark("backward_s")
+        >>> timer.durations()
+        {"forward_s": 0.012, "backward_s": 0.025}
+    """
+
+    def __init__(self, device: torch.device):
+        self.use_cuda_events = device.type == "cuda"
+        self.marks = [(None, self._now())]
+
+    def _now(self):
+        if self.use_cuda_events:
+            event = torch.cuda.Event(enable_timing=True)
+            event.record()
+            return event
+        return time.perf_counter()
+
+    def mark(self, stage: str):
+        """Marks the end of `stage`, which started at the previous mark (or at the creation of the timer)."""
+        self.marks.append((stage, self._now()))
+
+    def durations(self) -> dict[str, float]:
+        """Returns the duration in seconds of each stage."""
+        if self.use_cuda_events:
+            self.marks[-1][1].synchronize()
+        durations = {}
+        for (_, start), (stage, end) in zip(self.marks[:-1], self.marks[1:], strict=True):
+            durations[stage] = start.elapsed_time(end) / 1e3 if self.use_cuda_events else end - start
+        return durations
@@ -126,7 +126,7 @@ from lerobot.common.robot_devices.control_utils import (
 )
 from lerobot.common.robot_devices.robots.factory import make_robot
 from lerobot.common.robot_devices.robots.utils import Robot
-from lerobot.common.robot_devices.utils import busy_wait, safe_disconnect
+from lerobot.common.robot_devices.utils import ControlLoopScheduler, safe_disconnect
 from lerobot.common.utils.utils import init_hydra_config, init_logging, log_say, none_or_int
 
 ########################################################################################
@@ -211,6 +211,7 @@ def record(
     tags=None,
     num_image_writer_processes=0,
     num_image_writer_threads_per_camera=4,
+    stream_video=True,
     force_override=False,
     display_cameras=True,
     play_sounds=True,
@@ -245,6 +246,7 @@ def record(
         write_images=robot.has_camera,
         num_image_writer_processes=num_image_writer_processes,
         num_image_writer_threads=num_image_writer_threads_per_camera * robot.num_cameras,
+        stream_video=stream_video,
     )
 
     if not robot.is_connected:
@@ -332,14 +334,14 @@ def replay(
         robot.connect()
 
     log_say("Replaying episode", play_sounds, blocking=True)
+    scheduler = ControlLoopScheduler(fps, overrun_policy="catch_up")
     for idx in range(from_idx, to_idx):
         start_episode_t = time.perf_counter()
 
         action = items[idx]["action"]
         robot.send_action(action)
 
-        dt_s = time.perf_counter() - start_episode_t
-        busy_wait(1 / fps - dt_s)
+        scheduler.wait()
 
         dt_s = time.perf_counter() - start_episode_t
         log_control_info(robot, dt_s, fps=fps)
@@ -457,6 +459,15 @@ if __name__ == "__main__":
             "Not enough threads might cause low camera fps."
         ),
     )
+    parser_record.add_argument(
+        "--stream-video",
+        type=int,
+        default=1,
+        help=(
+            "By default, frames are encoded into videos while recording, by piping them to one ffmpeg process "
+            "per camera. When set to 0, frames are saved as png images and encoded at the end of the recording."
+        ),
+    )
     parser_record.add_argument(
         "--force-override",
         type=int,
@@ -47,7 +47,6 @@ import logging
 import threading
 import time
 from contextlib import nullcontext
-from copy import deepcopy
 from datetime import datetime as dt
 from pathlib import Path
 from typing import Callable
@@ -79,6 +78,18 @@ from lerobot.common.utils.utils import (
 )
 
 
+def _write_rollout_step(buffers: dict[str, Tensor], key: str, step: int, value: Tensor, num_steps: int):
+    """Writes the (batch, *) `value` of a rollout step in place in the (batch, num_steps, *) buffer of `key`.
+
+    The buffer is allocated at the first step, and doubled if the rollout lasts for more than `num_steps`.
+    """
+    if key not in buffers:
+        buffers[key] = torch.empty((value.shape[0], num_steps, *value.shape[1:]), dtype=value.dtype)
+    elif step == buffers[key].shape[1]:
+        buffers[key] = torch.cat([buffers[key], torch.empty_like(buffers[key])], dim=1)
+    buffers[key][:, step] = value
+
+
 def rollout(
     env: gym.vector.VectorEnv,
     policy: Policy,
@@ -127,15 +138,14 @@ def rollout(
     if render_callback is not None:
         render_callback(env)
 
-    all_observations = []
-    all_actions = []
-    all_rewards = []
-    all_successes = []
-    all_dones = []
+    # (batch, sequence, *) buffers of the rollout data, written in place at each step.
+    rollout_data = {}
+    observations = {}
 
     step = 0
-    # Keep track of which environments are done.
+    # Keep track of which environments are done, and of which ones have succeeded so far.
     done = np.array([False] * env.num_envs)
+    ever_success = np.array([False] * env.num_envs)
     max_steps = env.call("_max_episode_steps")[0]
     progbar = trange(
         max_steps,
@@ -147,7 +157,8 @@ def rollout(
         # Numpy array to tensor and changing dictionary keys to LeRobot policy format.
         observation = preprocess_observation(observation)
         if return_observations:
-            all_observations.append(deepcopy(observation))
+            for key in observation:
+                _write_rollout_step(observations, key, step, observation[key], max_steps + 1)
 
         observation = {key: observation[key].to(device, non_blocking=True) for key in observation}
 
@@ -169,39 +180,32 @@ def rollout(
             successes = [info["is_success"] if info is not None else False for info in info["final_info"]]
         else:
             successes = [False] * env.num_envs
+        successes = np.array(successes, dtype=bool)
 
         # Keep track of which environments are done so far.
         done = terminated | truncated | done
 
-        all_actions.append(torch.from_numpy(action))
-        all_rewards.append(torch.from_numpy(reward))
-        all_dones.append(torch.from_numpy(done))
-        all_successes.append(torch.tensor(successes))
+        _write_rollout_step(rollout_data, "action", step, torch.from_numpy(action), max_steps)
+        _write_rollout_step(rollout_data, "reward", step, torch.from_numpy(reward), max_steps)
+        _write_rollout_step(rollout_data, "success", step, torch.from_numpy(successes), max_steps)
+        _write_rollout_step(rollout_data, "done", step, torch.from_numpy(done), max_steps)
 
         step += 1
-        running_success_rate = (
-            einops.reduce(torch.stack(all_successes, dim=1), "b n -> b", "any").numpy().mean()
-        )
-        progbar.set_postfix({"running_success_rate": f"{running_success_rate.item() * 100:.1f}%"})
+        ever_success |= successes
+        progbar.set_postfix({"running_success_rate": f"{ever_success.mean().item() * 100:.1f}%"})
         progbar.update()
 
     # Track the final observation.
     if return_observations:
         observation = preprocess_observation(observation)
-        all_observations.append(deepcopy(observation))
-
-    # Stack the sequence along the first dimension so that we have (batch, sequence, *) tensors.
-    ret = {
-        "action": torch.stack(all_actions, dim=1),
-        "reward": torch.stack(all_rewards, dim=1),
-        "success": torch.stack(all_successes, dim=1),
-        "done": torch.stack(all_dones, dim=1),
-    }
+        for key in observation:
+            _write_rollout_step(observations, key, step, observation[key], max_steps + 1)
+
+    # Only keep the steps which were run, so that we have (batch, sequence, *) tensors. These are copied so
+    # that the returned data doesn't keep the whole (possibly doubled) buffers alive.
+    ret = {key: buffer[:, :step].clone() for key, buffer in rollout_data.items()}
     if return_observations:
-        stacked_observations = {}
-        for key in all_observations[0]:
-            stacked_observations[key] = torch.stack([obs[key] for obs in all_observations], dim=1)
-        ret["observation"] = stacked_observations
+        ret["observation"] = {key: buffer[:, : step + 1].clone() for key, buffer in observations.items()}
 
     return ret
 
@@ -214,6 +218,7 @@ def eval_policy(
     videos_dir: Path | None = None,
     return_episode_data: bool = False,
     start_seed: int | None = None,
+    episode_data_callback: Callable[[dict], None] | None = None,
 ) -> dict:
     """
     Args:
@@ -226,9 +231,14 @@ def eval_policy(
             the "episodes" key of the returned dictionary.
         start_seed: The first seed to use for the first individual rollout. For all subsequent rollouts the
             seed is incremented by 1. If not provided, the environments are not manually seeded.
+        episode_data_callback: Optional function called with the episode data of each batch of rollouts as soon
+            as it is compiled (e.g. `OnlineBuffer.add_data`), instead of holding the data of all the batches.
+            The indices of the data of each batch start from 0. Can't be used with `return_episode_data`.
     Returns:
         Dictionary with metrics and data regarding the rollouts.
     """
+    if return_episode_data and episode_data_callback is not None:
+        raise ValueError("`return_episode_data` and `episode_data_callback` can't be used together.")
     if max_episodes_rendered > 0 and not videos_dir:
         raise ValueError("If max_episodes_rendered > 0, videos_dir must be provided.")
 
@@ -284,7 +294,7 @@ def eval_policy(
             env,
             policy,
             seeds=list(seeds) if seeds else None,
-            return_observations=return_episode_data,
+            return_observations=return_episode_data or episode_data_callback is not None,
             render_callback=render_frame if max_episodes_rendered > 0 else None,
         )
 
@@ -326,6 +336,16 @@ def eval_policy(
                 assert episode_data["index"][-1] + 1 == this_episode_data["index"][0]
                 # Concatenate the episode data.
                 episode_data = {k: torch.cat([episode_data[k], this_episode_data[k]]) for k in episode_data}
+        elif episode_data_callback is not None:
+            episode_data_callback(
+                _compile_episode_data(
+                    rollout_data,
+                    done_indices,
+                    start_episode_index=0,
+                    start_data_index=0,
+                    fps=env.unwrapped.metadata["render_fps"],
+                )
+            )
 
         # Maybe render video for visualization.
         if max_episodes_rendered > 0 and len(ep_frames) > 0:
@@ -406,38 +426,32 @@ def _compile_episode_data(
 
     Similar logic is implemented when datasets are pushed to hub (see: `push_to_hub`).
     """
-    ep_dicts = []
-    total_frames = 0
-    for ep_ix in range(rollout_data["action"].shape[0]):
-        # + 2 to include the first done frame and the last observation frame.
-        num_frames = done_indices[ep_ix].item() + 2
-        total_frames += num_frames
-
-        # Here we do `num_frames - 1` as we don't want to include the last observation frame just yet.
-        ep_dict = {
-            "action": rollout_data["action"][ep_ix, : num_frames - 1],
-            "episode_index": torch.tensor([start_episode_index + ep_ix] * (num_frames - 1)),
-            "frame_index": torch.arange(0, num_frames - 1, 1),
-            "timestamp": torch.arange(0, num_frames - 1, 1) / fps,
-            "next.done": rollout_data["done"][ep_ix, : num_frames - 1],
-            "next.success": rollout_data["success"][ep_ix, : num_frames - 1],
-            "next.reward": rollout_data["reward"][ep_ix, : num_frames - 1].type(torch.float32),
-        }
-
-        # For the last observation frame, all other keys will just be copy padded.
-        for k in ep_dict:
-            ep_dict[k] = torch.cat([ep_dict[k], ep_dict[k][-1:]])
-
-        for key in rollout_data["observation"]:
-            ep_dict[key] = rollout_data["observation"][key][ep_ix, :num_frames]
-
-        ep_dicts.append(ep_dict)
-
-    data_dict = {}
-    for key in ep_dicts[0]:
-        data_dict[key] = torch.cat([x[key] for x in ep_dicts])
-
-    data_dict["index"] = torch.arange(start_data_index, start_data_index + total_frames, 1)
+    batch_size, n_steps = rollout_data["action"].shape[:2]
+    # + 2 to include the first done frame and the last observation frame.
+    num_frames = done_indices + 2
+    # (batch, n_steps + 1) mask of the frames of each episode, which selects them in the episodes order.
+    mask = torch.arange(n_steps + 1) < num_frames[:, None]
+    # The last observation frame doesn't have an action, so all the other keys are copy padded from the
+    # previous frame, by reading the frame at `num_frames - 2` instead.
+    frame_indices = torch.minimum(torch.arange(n_steps + 1), (num_frames - 2)[:, None])
+    batch_indices = torch.arange(batch_size)[:, None]
+
+    def select_frames(x: Tensor) -> Tensor:
+        return x[batch_indices, frame_indices][mask]
+
+    data_dict = {
+        "action": select_frames(rollout_data["action"]),
+        "episode_index": torch.repeat_interleave(torch.arange(batch_size) + start_episode_index, num_frames),
+        "frame_index": frame_indices[mask],
+        "timestamp": frame_indices[mask] / fps,
+        "next.done": select_frames(rollout_data["done"]),
+        "next.success": select_frames(rollout_data["success"]),
+        "next.reward": select_frames(rollout_data["reward"]).type(torch.float32),
+    }
+    for key in rollout_data["observation"]:
+        data_dict[key] = rollout_data["observation"][key][mask]
+
+    data_dict["index"] = torch.arange(start_data_index, start_data_index + len(data_dict["action"]), 1)
 
     return data_dict
 
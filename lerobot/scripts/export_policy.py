@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Export an ACT or Diffusion policy into a self-contained inference artifact.
+
+The artifact contains the whole inference of the policy, from the raw observations to the unnormalized
+actions, and the metadata needed to run it (see `lerobot.common.policies.export`). It only needs torch to be
+run, e.g. on the robot computer.
+
+Usage examples:
+
+Export a model from the hub into an `ExportedProgram`:
+```
+python lerobot/scripts/export_policy.py \
+    -p lerobot/act_koch_real \
+    --output outputs/exported/act_koch_real.pt2
+```
+
+Export a checkpoint of the training script into ONNX (the metadata is saved next to it, in
+`outputs/exported/act_koch_real.json`):
+```
+python lerobot/scripts/export_policy.py \
+    -p outputs/train/act_koch_real/checkpoints/last/pretrained_model \
+    --output outputs/exported/act_koch_real.onnx \
+    --format onnx
+```
+
+The exported policy can then be used instead of the pretrained one to control a robot:
+```
+python lerobot/scripts/control_robot.py record \
+    ... \
+    -p outputs/exported/act_koch_real.pt2
+```
+"""
+
+import argparse
+import logging
+
+import torch
+
+from lerobot.common.policies.export import EXPORT_FORMATS, export_policy, make_example_inputs
+from lerobot.common.policies.exported import ExportedPolicy
+from lerobot.common.policies.factory import make_policy
+from lerobot.common.utils.utils import init_hydra_config, init_logging
+from lerobot.scripts.eval import get_pretrained_policy_path
+
+
+def check_exported_policy(policy, output_path, atol: float = 1e-4):
+    """Compares the chunk of actions of the exported policy to the one of the original policy."""
+    if policy.name != "act":
+        # the actions of diffusion policies are sampled from random noise
+        logging.info("Skipping the comparison with the original policy, which is not deterministic.")
+        return
+
+    exported = ExportedPolicy.load(output_path)
+    inputs = make_example_inputs(policy)
+    batch = dict(zip(sorted(policy.config.input_shapes), inputs, strict=True))
+    with torch.no_grad():
+        expected = policy.select_action_chunk(batch)
+    actual = exported.select_action_chunk(batch)
+    max_error = (expected - actual).abs().max().item()
+    if max_error > atol:
+        raise ValueError(f"The exported policy differs from the original one (max error {max_error:.2e}).")
+    logging.info(f"The exported policy matches the original one (max error {max_error:.2e}).")
+
+
+def main(
+    pretrained_policy_name_or_path: str,
+    output: str,
+    export_format: str = "torch_export",
+    revision: str | None = None,
+    config_overrides: list[str] | None = None,
+    check: bool = True,
+):
+    pretrained_policy_path = get_pretrained_policy_path(pretrained_policy_name_or_path, revision=revision)
+    hydra_cfg = init_hydra_config(str(pretrained_policy_path / "config.yaml"), config_overrides)
+    policy = make_policy(hydra_cfg=hydra_cfg, pretrained_policy_name_or_path=str(pretrained_policy_path))
+    policy.to("cpu").eval()
+
+    output_path = export_policy(policy, output, export_format=export_format, fps=hydra_cfg.env.fps)
+    if check:
+        check_exported_policy(policy, output_path)
+
+
+if __name__ == "__main__":
+    init_logging()
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "-p",
+        "--pretrained-policy-name-or-path",
+        required=True,
+        help=(
+            "Either the repo ID of a model hosted on the Hub or a path to a directory containing weights "
+            "saved using `Policy.save_pretrained`."
+        ),
+    )
+    parser.add_argument("--revision", help="Optionally provide the Hugging Face Hub revision ID.")
+    parser.add_argument(
+        "--output",
+        required=True,
+        help="Path of the exported policy, e.g. `outputs/exported/act_koch_real.pt2` (or `.onnx`).",
+    )
+    parser.add_argument(
+        "--format",
+        dest="export_format",
+        choices=EXPORT_FORMATS,
+        default="torch_export",
+        help="Format of the exported policy.",
+    )
+    parser.add_argument(
+        "--check",
+        type=int,
+        default=1,
+        help="Compare the actions of the exported policy to the ones of the original policy (ACT only).",
+    )
+    parser.add_argument(
+        "overrides",
+        nargs="*",
+        help="Any key=value arguments to override config values (use dots for.nested=overrides)",
+    )
+    args = parser.parse_args()
+
+    main(
+        pretrained_policy_name_or_path=args.pretrained_policy_name_or_path,
+        output=args.output,
+        export_format=args.export_format,
+        revision=args.revision,
+        config_overrides=args.overrides,
+        check=bool(args.check),
+    )
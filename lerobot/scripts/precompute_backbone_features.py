@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Precompute the features of the frozen vision backbone of a policy for all the frames of a dataset.
+
+The policy and the dataset are configured like in `lerobot/scripts/train.py`, and the backbone must be
+pretrained (`policy.pretrained_backbone_weights`), so that it is the same when training. The policy can then be
+trained on the features instead of the frames, which skips the video decoding and the backbone.
+
+Usage example:
+
+```
+python lerobot/scripts/precompute_backbone_features.py \
+    --output-dir outputs/backbone_features/pusht_resnet18 \
+    policy=diffusion \
+    env=pusht \
+    policy.pretrained_backbone_weights=ResNet18_Weights.IMAGENET1K_V1 \
+    policy.use_group_norm=false
+
+python lerobot/scripts/train.py \
+    policy=diffusion \
+    env=pusht \
+    policy.pretrained_backbone_weights=ResNet18_Weights.IMAGENET1K_V1 \
+    policy.use_group_norm=false \
+    training.backbone_features_dir=outputs/backbone_features/pusht_resnet18
+```
+
+ACT uses a pretrained ResNet18 backbone by default, whose features can be computed in the same way:
+```
+python lerobot/scripts/precompute_backbone_features.py \
+    --output-dir outputs/backbone_features/aloha_sim_insertion_human_resnet18 \
+    policy=act \
+    env=aloha \
+    dataset_repo_id=lerobot/aloha_sim_insertion_human
+
+python lerobot/scripts/train.py \
+    policy=act \
+    env=aloha \
+    dataset_repo_id=lerobot/aloha_sim_insertion_human \
+    training.backbone_features_dir=outputs/backbone_features/aloha_sim_insertion_human_resnet18
+```
+The backbone of ACT is then frozen (`training.lr_backbone` is ignored).
+
+Note: The features are computed without image augmentations (and with the center crop for Diffusion).
+"""
+
+import argparse
+import logging
+from pathlib import Path
+
+from lerobot.common.datasets.backbone_features import compute_backbone_features
+from lerobot.common.datasets.factory import make_dataset
+from lerobot.common.policies.factory import make_policy
+from lerobot.common.utils.utils import get_safe_torch_device, init_hydra_config, init_logging
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent.parent / "configs" / "default.yaml"
+
+
+def main(
+    output_dir: str,
+    batch_size: int = 64,
+    num_workers: int = 4,
+    dtype: str = "float16",
+    config_overrides: list[str] | None = None,
+):
+    cfg = init_hydra_config(str(DEFAULT_CONFIG_PATH), config_overrides)
+    if cfg.training.get("backbone_features_dir") is not None:
+        raise ValueError("The backbone features can't be computed from a dataset which already uses them.")
+    if cfg.policy.get("pretrained_backbone_weights") is None:
+        raise ValueError(
+            "The backbone should be pretrained (`policy.pretrained_backbone_weights`), otherwise its weights "
+            "are not the same when training."
+        )
+
+    device = get_safe_torch_device(cfg.device, log=True)
+    dataset = make_dataset(cfg)
+    policy = make_policy(hydra_cfg=cfg, dataset_stats=dataset.stats)
+    if not hasattr(policy, "encode_backbone_features"):
+        raise NotImplementedError(f"Backbone features are not supported by the {policy.name} policy.")
+    policy.eval().to(device)
+
+    compute_backbone_features(
+        dataset,
+        policy.encode_backbone_features,
+        output_dir,
+        batch_size=batch_size,
+        num_workers=num_workers,
+        dtype=dtype,
+        device=device,
+    )
+    logging.info(f"Backbone features saved in {output_dir}")
+
+
+if __name__ == "__main__":
+    init_logging()
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--output-dir", required=True, help="Directory where the features are saved.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Batch size of the backbone.")
+    parser.add_argument("--num-workers", type=int, default=4, help="Number of workers of the dataloader.")
+    parser.add_argument(
+        "--dtype",
+        default="float16",
+        choices=["float16", "float32"],
+        help="Dtype in which the features are saved.",
+    )
+    parser.add_argument(
+        "overrides",
+        nargs="*",
+        help="Any key=value arguments to override config values (use dots for.nested=overrides)",
+    )
+    args = parser.parse_args()
+    main(
+        output_dir=args.output_dir,
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        dtype=args.dtype,
+        config_overrides=args.overrides,
+    )
@@ -35,12 +35,13 @@ from lerobot.common.datasets.factory import make_dataset, resolve_delta_timestam
 from lerobot.common.datasets.lerobot_dataset import MultiLeRobotDataset
 from lerobot.common.datasets.online_buffer import OnlineBuffer, compute_sampler_weights
 from lerobot.common.datasets.sampler import EpisodeAwareSampler
-from lerobot.common.datasets.utils import cycle
+from lerobot.common.datasets.utils import DevicePrefetcher, cycle
 from lerobot.common.envs.factory import make_env
 from lerobot.common.logger import Logger, log_output_dir
 from lerobot.common.policies.factory import make_policy
 from lerobot.common.policies.policy_protocol import PolicyWithUpdate
 from lerobot.common.policies.utils import get_device_from_parameters
+from lerobot.common.utils.benchmark import StageTimer
 from lerobot.common.utils.utils import (
     format_big_number,
     get_safe_torch_device,
@@ -53,6 +54,9 @@ from lerobot.scripts.eval import eval_policy
 
 def make_optimizer_and_scheduler(cfg, policy):
     if cfg.policy.name == "act":
+        if cfg.training.get("backbone_features_dir") is not None:
+            # the backbone is bypassed by its precomputed features, so it must stay frozen
+            policy.model.backbone.requires_grad_(False)
         optimizer_params_dicts = [
             {
                 "params": [
@@ -114,15 +118,21 @@ def update_policy(
     use_amp: bool = False,
     lock=None,
 ):
-    """Returns a dictionary of items for logging."""
-    start_time = time.perf_counter()
+    """Returns a dictionary of items for logging.
+
+    To not wait for the device at every step, the losses are left on the device and the durations of the stages
+    of the update are measured with a `StageTimer`. They are pulled with `pull_train_info` when logging.
+    """
     device = get_device_from_parameters(policy)
+    timer = StageTimer(device)
     policy.train()
     with torch.autocast(device_type=device.type) if use_amp else nullcontext():
         output_dict = policy.forward(batch)
         # TODO(rcadene): policy.unnormalize_outputs(out_dict)
         loss = output_dict["loss"]
+    timer.mark("forward_s")
     grad_scaler.scale(loss).backward()
+    timer.mark("backward_s")
 
     # Unscale the graident of the optimzer's assigned params in-place **prior to gradient clipping**.
     grad_scaler.unscale_(optimizer)
@@ -148,12 +158,13 @@ def update_policy(
     if isinstance(policy, PolicyWithUpdate):
         # To possibly update an internal buffer (for instance an Exponential Moving Average like in TDMPC).
         policy.update()
+    timer.mark("optim_s")
 
     info = {
-        "loss": loss.item(),
-        "grad_norm": float(grad_norm),
+        "loss": loss.detach(),
+        "grad_norm": grad_norm,
         "lr": optimizer.param_groups[0]["lr"],
-        "update_s": time.perf_counter() - start_time,
+        "timer": timer,
         **{k: v for k, v in output_dict.items() if k != "loss"},
     }
     info.update({k: v for k, v in output_dict.items() if k not in info})
@@ -161,12 +172,28 @@ def update_policy(
     return info
 
 
+def pull_train_info(info: dict, prefetcher: DevicePrefetcher) -> dict:
+    """Converts the items returned by `update_policy` which are still on the device to numbers, and adds the
+    durations of the stages of the training step. This waits for the device, so it is only done when logging."""
+    info = dict(info)
+    stage_durations = info.pop("timer").durations()
+    info.update(stage_durations)
+    info["update_s"] = sum(stage_durations.values())
+    info["dataloading_s"] = prefetcher.dataloading_s
+    info["h2d_s"] = prefetcher.h2d_s
+    for key, value in info.items():
+        if isinstance(value, torch.Tensor):
+            info[key] = value.item()
+    return info
+
+
 def log_train_info(logger: Logger, info, step, cfg, dataset, is_online):
     loss = info["loss"]
     grad_norm = info["grad_norm"]
     lr = info["lr"]
     update_s = info["update_s"]
     dataloading_s = info["dataloading_s"]
+    h2d_s = info["h2d_s"]
 
     # A sample is an (observation,action) pair, where observation and action
     # can be on multiple timestamps. In a batch, we have `batch_size`` number of samples.
@@ -187,7 +214,12 @@ def log_train_info(logger: Logger, info, step, cfg, dataset, is_online):
         f"lr:{lr:0.1e}",
         # in seconds
         f"updt_s:{update_s:.3f}",
+        # breakdown of the update into forward, backward and optimizer step
+        f"fwd_s:{info['forward_s']:.3f}",
+        f"bwd_s:{info['backward_s']:.3f}",
+        f"opt_s:{info['optim_s']:.3f}",
         f"data_s:{dataloading_s:.3f}",  # if not ~0, you are bottlenecked by cpu or io
+        f"h2d_s:{h2d_s:.3f}",  # copy of the batch to the device, which overlaps with the update on cuda
     ]
     logging.info(" ".join(log_items))
 
@@ -412,7 +444,7 @@ def train(cfg: DictConfig, out_dir: str | None = None, job_name: str | None = No
         pin_memory=device.type != "cpu",
         drop_last=False,
     )
-    dl_iter = cycle(dataloader)
+    dl_iter = DevicePrefetcher(cycle(dataloader), device)
 
     policy.train()
     offline_step = 0
@@ -420,12 +452,7 @@ def train(cfg: DictConfig, out_dir: str | None = None, job_name: str | None = No
         if offline_step == 0:
             logging.info("Start offline training on a fixed dataset")
 
-        start_time = time.perf_counter()
         batch = next(dl_iter)
-        dataloading_s = time.perf_counter() - start_time
-
-        for key in batch:
-            batch[key] = batch[key].to(device, non_blocking=True)
 
         train_info = update_policy(
             policy,
@@ -437,9 +464,8 @@ def train(cfg: DictConfig, out_dir: str | None = None, job_name: str | None = No
             use_amp=cfg.use_amp,
         )
 
-        train_info["dataloading_s"] = dataloading_s
-
         if step % cfg.training.log_freq == 0:
+            train_info = pull_train_info(train_info, dl_iter)
             log_train_info(logger, train_info, step, cfg, offline_dataset, is_online=False)
 
         # Note: evaluate_and_checkpoint_if_needed happens **after** the `step`th training update has completed,
@@ -512,7 +538,9 @@ def train(cfg: DictConfig, out_dir: str | None = None, job_name: str | None = No
         pin_memory=device.type != "cpu",
         drop_last=True,
     )
-    dl_iter = cycle(dataloader)
+    # The batches are not loaded ahead, since the buffer and the sampler are updated by the online rollouts in
+    # between steps, and so that no extra batch is loaded while holding the lock below.
+    dl_iter = DevicePrefetcher(cycle(dataloader), device, prefetch=False)
 
     # Lock and thread pool executor for asynchronous online rollouts. When asynchronous mode is disabled,
     # these are still used but effectively do nothing.
@@ -541,41 +569,49 @@ def train(cfg: DictConfig, out_dir: str | None = None, job_name: str | None = No
             with lock:
                 online_rollout_policy.load_state_dict(policy.state_dict())
             online_rollout_policy.eval()
+            update_online_buffer_s = 0
+
+            def add_episode_data(episode_data: dict):
+                # the episodes of each batch of rollouts are added to the buffer as soon as they are done, and
+                # the sampler is updated in the same critical section, so that it never samples indices that
+                # don't match the buffer
+                nonlocal update_online_buffer_s
+                with lock:
+                    start_update_buffer_time = time.perf_counter()
+                    online_dataset.add_data(episode_data)
+
+                    # Update the concatenated dataset length used during sampling.
+                    concat_dataset.cumulative_sizes = concat_dataset.cumsum(concat_dataset.datasets)
+
+                    # Update the sampling weights.
+                    sampler.weights = compute_sampler_weights(
+                        offline_dataset,
+                        offline_drop_n_last_frames=cfg.training.get("drop_n_last_frames", 0),
+                        online_dataset=online_dataset,
+                        # +1 because online rollouts return an extra frame for the "final observation". Note: we
+                        # don't have this final observation in the offline datasets, but we might add them in
+                        # future.
+                        online_drop_n_last_frames=cfg.training.get("drop_n_last_frames", 0) + 1,
+                        online_sampling_ratio=cfg.training.online_sampling_ratio,
+                    )
+                    sampler.num_samples = len(concat_dataset)
+
+                    update_online_buffer_s += time.perf_counter() - start_update_buffer_time
+
             start_rollout_time = time.perf_counter()
             with torch.no_grad():
-                eval_info = eval_policy(
+                eval_policy(
                     online_env,
                     online_rollout_policy,
                     n_episodes=cfg.training.online_rollout_n_episodes,
                     max_episodes_rendered=min(10, cfg.training.online_rollout_n_episodes),
                     videos_dir=logger.log_dir / "online_rollout_videos",
-                    return_episode_data=True,
                     start_seed=(
                         rollout_start_seed := (rollout_start_seed + cfg.training.batch_size) % 1000000
                     ),
+                    episode_data_callback=add_episode_data,
                 )
-            online_rollout_s = time.perf_counter() - start_rollout_time
-
-            with lock:
-                start_update_buffer_time = time.perf_counter()
-                online_dataset.add_data(eval_info["episodes"])
-
-                # Update the concatenated dataset length used during sampling.
-                concat_dataset.cumulative_sizes = concat_dataset.cumsum(concat_dataset.datasets)
-
-                # Update the sampling weights.
-                sampler.weights = compute_sampler_weights(
-                    offline_dataset,
-                    offline_drop_n_last_frames=cfg.training.get("drop_n_last_frames", 0),
-                    online_dataset=online_dataset,
-                    # +1 because online rollouts return an extra frame for the "final observation". Note: we don't have
-                    # this final observation in the offline datasets, but we might add them in future.
-                    online_drop_n_last_frames=cfg.training.get("drop_n_last_frames", 0) + 1,
-                    online_sampling_ratio=cfg.training.online_sampling_ratio,
-                )
-                sampler.num_samples = len(concat_dataset)
-
-                update_online_buffer_s = time.perf_counter() - start_update_buffer_time
+            online_rollout_s = time.perf_counter() - start_rollout_time - update_online_buffer_s
 
             return online_rollout_s, update_online_buffer_s
 
@@ -597,12 +633,7 @@ def train(cfg: DictConfig, out_dir: str | None = None, job_name: str | None = No
         policy.train()
         for _ in range(cfg.training.online_steps_between_rollouts):
             with lock:
-                start_time = time.perf_counter()
                 batch = next(dl_iter)
-                dataloading_s = time.perf_counter() - start_time
-
-            for key in batch:
-                batch[key] = batch[key].to(cfg.device, non_blocking=True)
 
             train_info = update_policy(
                 policy,
@@ -615,7 +646,6 @@ def train(cfg: DictConfig, out_dir: str | None = None, job_name: str | None = No
                 lock=lock,
             )
 
-            train_info["dataloading_s"] = dataloading_s
             train_info["online_rollout_s"] = online_rollout_s
             train_info["update_online_buffer_s"] = update_online_buffer_s
             train_info["await_update_online_buffer_s"] = await_update_online_buffer_s
@@ -623,6 +653,7 @@ def train(cfg: DictConfig, out_dir: str | None = None, job_name: str | None = No
                 train_info["online_buffer_size"] = len(online_dataset)
 
             if step % cfg.training.log_freq == 0:
+                train_info = pull_train_info(train_info, dl_iter)
                 log_train_info(logger, train_info, step, cfg, online_dataset, is_online=True)
 
             # Note: evaluate_and_checkpoint_if_needed happens **after** the `step`th training update has completed,
@@ -55,26 +55,35 @@ python lerobot/scripts/visualize_dataset_html.py \
 import argparse
 import logging
 import shutil
+import tempfile
 from pathlib import Path
 
+import numpy as np
+import pyarrow as pa
 import tqdm
-from flask import Flask, redirect, render_template, url_for
+from flask import Flask, abort, redirect, render_template, send_from_directory, url_for
 
 from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
 from lerobot.common.utils.utils import init_logging
 
 
-def run_server(
+def make_app(
     dataset: LeRobotDataset,
     episodes: list[int],
-    host: str,
-    port: str,
     static_folder: Path,
     template_folder: Path,
-):
+) -> Flask:
     app = Flask(__name__, static_folder=static_folder.resolve(), template_folder=template_folder.resolve())
     app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 0  # specifying not to cache
 
+    # the csv files left by a previous run may have been written from another revision of the dataset
+    for ep_csv_path in static_folder.glob("episode_*.csv"):
+        ep_csv_path.unlink()
+
+    def check_episode(dataset_namespace: str, dataset_name: str, episode_id: int):
+        if f"{dataset_namespace}/{dataset_name}" != dataset.repo_id or episode_id not in episodes:
+            abort(404)
+
     @app.route("/")
     def index():
         # home page redirects to the first episode page
@@ -91,6 +100,7 @@ def run_server(
 
     @app.route("/<string:dataset_namespace>/<string:dataset_name>/episode_<int:episode_id>")
     def show_episode(dataset_namespace, dataset_name, episode_id):
+        check_episode(dataset_namespace, dataset_name, episode_id)
         dataset_info = {
             "repo_id": dataset.repo_id,
             "num_samples": dataset.num_samples,
@@ -106,7 +116,12 @@ def run_server(
         if language_instruction:
             videos_info[0]["language_instruction"] = language_instruction
 
-        ep_csv_url = url_for("static", filename=get_ep_csv_fname(episode_id))
+        ep_csv_url = url_for(
+            "show_episode_data",
+            dataset_namespace=dataset_namespace,
+            dataset_name=dataset_name,
+            episode_id=episode_id,
+        )
         return render_template(
             "visualize_dataset_template.html",
             episode_id=episode_id,
@@ -117,6 +132,27 @@ def run_server(
             has_policy=False,
         )
 
+    @app.route("/<string:dataset_namespace>/<string:dataset_name>/episode_<int:episode_id>.csv")
+    def show_episode_data(dataset_namespace, dataset_name, episode_id):
+        check_episode(dataset_namespace, dataset_name, episode_id)
+        # the csv file of an episode is written the first time it is requested, and then reused
+        ep_csv_fname = get_ep_csv_fname(episode_id)
+        if not (static_folder / ep_csv_fname).exists():
+            write_episode_data_csv(static_folder, ep_csv_fname, episode_id, dataset)
+        return send_from_directory(static_folder.resolve(), ep_csv_fname, mimetype="text/csv")
+
+    return app
+
+
+def run_server(
+    dataset: LeRobotDataset,
+    episodes: list[int],
+    host: str,
+    port: str,
+    static_folder: Path,
+    template_folder: Path,
+):
+    app = make_app(dataset, episodes, static_folder, template_folder)
     app.run(host=host, port=port)
 
 
@@ -125,46 +161,46 @@ def get_ep_csv_fname(episode_id: int):
     return ep_csv_fname
 
 
+def get_column_array(table: pa.Table, column: str) -> np.ndarray:
+    """Returns a column of scalars or of fixed size sequences as a (num_rows,) or (num_rows, dim) array."""
+    array = table.column(column).combine_chunks()
+    if pa.types.is_list(array.type) or pa.types.is_fixed_size_list(array.type):
+        return array.flatten().to_numpy(zero_copy_only=False).reshape(len(array), -1)
+    return array.to_numpy(zero_copy_only=False)
+
+
 def write_episode_data_csv(output_dir, file_name, episode_index, dataset):
     """Write a csv file containg timeseries data of an episode (e.g. state and action).
     This file will be loaded by Dygraph javascript to plot data in real time."""
-    from_idx = dataset.episode_data_index["from"][episode_index]
-    to_idx = dataset.episode_data_index["to"][episode_index]
-
-    has_state = "observation.state" in dataset.hf_dataset.features
-    has_action = "action" in dataset.hf_dataset.features
-
-    # init header of csv with state and action names
-    header = ["timestamp"]
-    if has_state:
-        dim_state = len(dataset.hf_dataset["observation.state"][0])
-        header += [f"state_{i}" for i in range(dim_state)]
-    if has_action:
-        dim_action = len(dataset.hf_dataset["action"][0])
-        header += [f"action_{i}" for i in range(dim_action)]
+    from_idx = dataset.episode_data_index["from"][episode_index].item()
+    to_idx = dataset.episode_data_index["to"][episode_index].item()
 
     columns = ["timestamp"]
-    if has_state:
+    if "observation.state" in dataset.hf_dataset.features:
         columns += ["observation.state"]
-    if has_action:
+    if "action" in dataset.hf_dataset.features:
         columns += ["action"]
 
-    rows = []
-    data = dataset.hf_dataset.select_columns(columns)
-    for i in range(from_idx, to_idx):
-        row = [data[i]["timestamp"].item()]
-        if has_state:
-            row += data[i]["observation.state"].tolist()
-        if has_action:
-            row += data[i]["action"].tolist()
-        rows.append(row)
+    # slice the arrow columns of the episode at once, instead of reading its frames one by one
+    table = dataset.hf_dataset.select_columns(columns).with_format("arrow")[from_idx:to_idx]
+    arrays = {column: get_column_array(table, column) for column in columns}
+
+    # init header of csv with state and action names
+    header = ["timestamp"]
+    if "observation.state" in arrays:
+        header += [f"state_{i}" for i in range(arrays["observation.state"].shape[1])]
+    if "action" in arrays:
+        header += [f"action_{i}" for i in range(arrays["action"].shape[1])]
+
+    rows = np.column_stack([arrays[column] for column in columns])
 
     output_dir.mkdir(parents=True, exist_ok=True)
-    with open(output_dir / file_name, "w") as f:
+    # write to a temporary file with a unique name first, so that a concurrent request never reads a partial
+    # file nor writes to the same temporary file
+    with tempfile.NamedTemporaryFile("w", dir=output_dir, suffix=".tmp", delete=False) as f:
         f.write(",".join(header) + "\n")
-        for row in rows:
-            row_str = [str(col) for col in row]
-            f.write(",".join(row_str) + "\n")
+        np.savetxt(f, rows, delimiter=",", fmt="%.9g")
+    Path(f.name).replace(output_dir / file_name)
 
 
 def get_episode_video_paths(dataset: LeRobotDataset, ep_index: int) -> list[str]:
@@ -232,15 +268,15 @@ def visualize_dataset_html(
     if episodes is None:
         episodes = list(range(dataset.num_episodes))
 
-    logging.info("Writing CSV files")
-    for episode_index in tqdm.tqdm(episodes):
-        # write states and actions in a csv (it can be slow for big datasets)
-        ep_csv_fname = get_ep_csv_fname(episode_index)
-        # TODO(rcadene): speedup script by loading directly from dataset, pyarrow, parquet, safetensors?
-        write_episode_data_csv(static_dir, ep_csv_fname, episode_index, dataset)
-
     if serve:
+        # the csv files of the episodes are written when they are first requested
         run_server(dataset, episodes, host, port, static_dir, template_dir)
+    else:
+        logging.info("Writing CSV files")
+        for episode_index in tqdm.tqdm(episodes):
+            # write states and actions in a csv
+            ep_csv_fname = get_ep_csv_fname(episode_index)
+            write_episode_data_csv(static_dir, ep_csv_fname, episode_index, dataset)
 
 
 def main():
@@ -91,4 +91,8 @@ class GroupSyncWrite:
         return COMM_SUCCESS
 
     def changeParam(self, index, data):  # noqa: N802
-        self.packet_handler.data[index][self.address] = data
+        if isinstance(data, dict):
+            # several fields written at once (see `convert_fields_to_bytes`)
+            self.packet_handler.data[index].update(data)
+        else:
+            self.packet_handler.data[index][self.address] = data
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import sys
+from pathlib import Path
+
+import numpy as np
+import torch
+
+# the almond scripts import each other as top level modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "almond"))
+
+from almond_client import ActionChunkExecutor  # noqa: E402
+from almond_protocol import MessageDecoder, observation_steps  # noqa: E402
+
+fps = 10
+period_s = 1 / fps
+
+
+def make_chunk(values: list[float], start: float) -> tuple[torch.Tensor, torch.Tensor]:
+    actions = torch.tensor(values, dtype=torch.float32)[:, None]
+    timestamps = start + torch.arange(len(values), dtype=torch.float64) * period_s
+    return actions, timestamps
+
+
+def test_execute_chunk():
+    executor = ActionChunkExecutor(fps, refill_margin_s=0.2)
+    assert executor.next_action() is None
+    assert executor.needs_refill()
+
+    executor.request_sent(0)
+    # no other request is sent while waiting for the reply
+    assert not executor.needs_refill()
+    executor.add_chunk(0, *make_chunk([0, 1, 2, 3, 4], start=100.0), now=100.0)
+    assert executor.num_remaining == 5
+    assert not executor.needs_refill()
+
+    executed = [executor.next_action().item() for _ in range(3)]
+    assert executed == [0, 1, 2]
+    # 2 actions left, i.e. 0.2s
+    assert executor.needs_refill()
+    executed = [executor.next_action().item() for _ in range(2)]
+    assert executed == [3, 4]
+    assert executor.next_action() is None
+
+
+def test_drop_outdated_actions():
+    """The actions of a new chunk which were scheduled before the next control step are dropped."""
+    executor = ActionChunkExecutor(fps)
+    executor.request_sent(0)
+    executor.add_chunk(0, *make_chunk([0, 1, 2, 3, 4], start=100.0), now=100.0)
+    executor.request_sent(1)
+    executor.next_action()
+    executor.next_action()
+
+    # the chunk replied to an observation taken at 100.1s is received after two control steps
+    executor.add_chunk(1, *make_chunk([10, 11, 12, 13, 14], start=100.1), now=100.2)
+    assert executor.pending_seq is None
+    assert [executor.next_action().item() for _ in range(4)] == [11, 12, 13, 14]
+    assert executor.next_action() is None
+
+    # when the previous chunk ran out, the next control step is when the chunk is received
+    executor.add_chunk(2, *make_chunk([20, 21, 22], start=200.0), now=200.1)
+    assert [executor.next_action().item() for _ in range(2)] == [21, 22]
+
+
+def test_temporal_ensemble():
+    executor = ActionChunkExecutor(fps, temporal_ensemble_coeff=0.0, chunk_size=5)
+    executor.add_chunk(0, *make_chunk([0, 0, 0, 0, 0], start=100.0), now=100.0)
+    assert executor.next_action().item() == 0
+    executor.add_chunk(1, *make_chunk([1, 1, 1, 1, 1], start=100.0), now=100.1)
+    # the first action of the new chunk is outdated, the others are averaged with uniform weights
+    assert executor.num_remaining == 4
+    assert [executor.next_action().item() for _ in range(4)] == [0.5, 0.5, 0.5, 0.5]
+    assert executor.next_action() is None
+
+
+def test_request_history():
+    """The requests carry the observations of the last `n_obs_steps` control steps, oldest first."""
+    executor = ActionChunkExecutor(fps, n_obs_steps=2)
+    pictures = [{"top": np.full((4, 6, 3), i, dtype=np.uint8)} for i in range(3)]
+    states = [np.full(2, i, dtype=np.float32) for i in range(3)]
+
+    executor.observe(states[0], pictures[0])
+    seq, meta, arrays, images = MessageDecoder().decode(executor.make_request(0, timestamp=100.0))
+    assert seq == 0
+    assert executor.pending_seq == 0
+    assert meta["reply"] == "chunk"
+    assert meta["timestamp"] == 100.0
+    assert meta["step"] == 0
+    assert meta["episode_start"]
+    # at the first step, there is no history yet
+    steps = observation_steps(meta, arrays, images)
+    assert len(steps) == 1
+    np.testing.assert_array_equal(steps[0][0].numpy(), states[0])
+
+    for state, step_pictures in zip(states[1:], pictures[1:], strict=True):
+        executor.observe(state, step_pictures)
+    seq, meta, arrays, images = MessageDecoder().decode(executor.make_request(1, timestamp=100.2))
+    assert meta["step"] == 2
+    assert "episode_start" not in meta
+    steps = observation_steps(meta, arrays, images)
+    assert len(steps) == 2
+    for (state, step_images), expected_state, expected_pictures in zip(
+        steps, states[1:], pictures[1:], strict=True
+    ):
+        np.testing.assert_array_equal(state.numpy(), expected_state)
+        assert set(step_images) == {"top"}
+        np.testing.assert_array_equal(step_images["top"].permute(1, 2, 0).numpy(), expected_pictures["top"])
+
+    executor.reset()
+    assert len(executor.observations) == 0
+    assert executor.num_steps == 0
+    assert executor.episode_start
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+import torch
+
+pytest.importorskip("websockets")
+
+# the almond scripts import each other as top level modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "almond"))
+
+from almond_inference import LatencyHistograms, ObservedSteps, run_chunk_inference, serve  # noqa: E402
+from almond_protocol import ProtocolError  # noqa: E402
+
+
+class FakeConnection:
+    """Stands for the websocket connection to the rPi: yields the messages put in `incoming` until None."""
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.sent = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise StopAsyncIteration
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+    async def send(self, reply):
+        self.sent.append(reply)
+
+
+def test_latency_histograms():
+    histograms = LatencyHistograms()
+    histograms.record("decode", 0.0005)
+    histograms.record("decode", 0.003)
+    histograms.record("decode", 0.003)
+    histograms.record("model", 5.0)
+    histograms.num_dropped = 4
+    histograms.num_malformed = 1
+
+    decode_counts = histograms.counts["decode"]
+    assert decode_counts[LatencyHistograms.BUCKETS_MS.index(1)] == 1
+    assert decode_counts[LatencyHistograms.BUCKETS_MS.index(5)] == 2
+    assert sum(decode_counts) == 3
+    assert histograms.counts["model"][-1] == 1
+    assert histograms.totals_ms["decode"] == pytest.approx(6.5)
+
+    summary = histograms.summary().splitlines()
+    assert summary[0] == "dropped stale observations: 4, malformed observations: 1"
+    # stages without samples are skipped
+    assert len(summary) == 3
+    assert summary[1].split() == ["decode:", "mean", "2.2ms", "|", "<=1ms:1", "<=5ms:2"]
+    assert summary[2].split() == ["model:", "mean", "5000.0ms", "|", ">1000ms:1"]
+
+
+def test_serve_drops_stale_observations():
+    """While an observation is being processed, only the newest of the ones received next is kept."""
+
+    async def run():
+        connection = FakeConnection()
+        histograms = LatencyHistograms()
+        started = threading.Event()
+        release = threading.Event()
+
+        def handle(data):
+            started.set()
+            assert release.wait(timeout=5)
+            return f"reply {data}"
+
+        server = asyncio.create_task(serve(connection, handle, histograms))
+        await connection.incoming.put("0")
+        assert await asyncio.to_thread(started.wait, 5)
+
+        for message in ["1", "2", "3"]:
+            await connection.incoming.put(message)
+        # let the server receive them while the first observation is still being processed
+        while not connection.incoming.empty():
+            await asyncio.sleep(0)
+        release.set()
+
+        await connection.incoming.put(None)
+        await asyncio.wait_for(server, timeout=5)
+        return connection, histograms
+
+    connection, histograms = asyncio.run(run())
+    assert connection.sent == ["reply 0", "reply 3"]
+    assert histograms.num_dropped == 2
+    assert sum(histograms.counts["queue"]) == 2
+    assert sum(histograms.counts["send"]) == 2
+
+
+def test_serve_skips_malformed_observations():
+    """A malformed observation is counted and skipped, and the session goes on with the next ones."""
+
+    def handle(data):
+        if data == "garbage":
+            raise ProtocolError("Message is too short.")
+        return f"reply {data}"
+
+    async def run():
+        connection = FakeConnection()
+        histograms = LatencyHistograms()
+        server = asyncio.create_task(serve(connection, handle, histograms))
+        for num_processed, message in enumerate(["0", "garbage", "1"], start=1):
+            await connection.incoming.put(message)
+            # wait for the server to process each message, so that none of them is dropped as stale
+            while histograms.num_malformed + len(connection.sent) < num_processed:
+                await asyncio.sleep(0.001)
+        await connection.incoming.put(None)
+        await asyncio.wait_for(server, timeout=5)
+        return connection, histograms
+
+    connection, histograms = asyncio.run(run())
+    assert connection.sent == ["reply 0", "reply 1"]
+    assert histograms.num_malformed == 1
+
+
+def test_serve_raises_receive_errors():
+    async def run():
+        connection = FakeConnection()
+        server = asyncio.create_task(serve(connection, lambda data: data, LatencyHistograms()))
+        await connection.incoming.put("0")
+        await connection.incoming.put(ConnectionError("connection lost"))
+        await asyncio.wait_for(server, timeout=5)
+
+    with pytest.raises(ConnectionError, match="connection lost"):
+        asyncio.run(run())
+
+
+class RecordingPolicy:
+    """Stands for a policy with an observation history: records the resets and the observed steps."""
+
+    def __init__(self):
+        self.calls = []
+
+    def reset(self):
+        self.calls.append("reset")
+
+    def observe(self, observation):
+        self.calls.append(observation["step"])
+
+    def select_action_chunk(self, observation):
+        self.calls.append(observation["step"])
+        return torch.zeros(1, 4, 2)
+
+
+def test_run_chunk_inference_history():
+    """The policy keeps its history between requests, and only observes the steps it has not seen yet."""
+    policy = RecordingPolicy()
+    observed = ObservedSteps()
+
+    def request(step: int, num_steps: int = 2, episode_start: bool = False):
+        observations = [{"step": i} for i in range(step - num_steps + 1, step + 1)]
+        policy.calls.clear()
+        actions = run_chunk_inference(
+            policy, observations, {"step": step, "episode_start": episode_start}, observed
+        )
+        assert actions.shape == (4, 2)
+        return policy.calls
+
+    assert request(1, episode_start=True) == ["reset", 0, 1]
+    # the steps of the previous request are not observed again
+    assert request(2) == [2]
+    assert request(5, num_steps=4) == [3, 4, 5]
+    # steps are missing since the previous request: the whole history is observed again
+    assert request(8) == ["reset", 7, 8]
+    # a new episode
+    assert request(1, episode_start=True) == ["reset", 0, 1]
+    # without step numbers, the history is always replaced
+    policy.calls.clear()
+    run_chunk_inference(policy, [{"step": 0}, {"step": 1}], {}, observed)
+    assert policy.calls == ["reset", 0, 1]
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+
+# the almond scripts import each other as top level modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "almond"))
+
+from almond_protocol import (  # noqa: E402
+    MAGIC,
+    PREFIX,
+    MessageDecoder,
+    ProtocolError,
+    encode_action,
+    encode_action_chunk,
+    encode_message,
+    encode_observation,
+)
+
+
+@pytest.mark.parametrize(
+    "dtype", [np.float32, np.float64, np.float16, np.int64, np.int32, np.int16, np.uint8, np.bool_]
+)
+@pytest.mark.parametrize("shape", [(), (6,), (3, 4)])
+def test_round_trip(dtype, shape):
+    rng = np.random.default_rng(0)
+    array = (rng.standard_normal(shape) * 100).astype(dtype)
+    other = np.arange(5, dtype=np.float32)
+    message = encode_message(7, {"array": array, "other": other}, meta={"key": "value"})
+
+    seq, meta, arrays, images = MessageDecoder().decode(message)
+    assert seq == 7
+    assert meta == {"key": "value"}
+    assert images == {}
+    assert set(arrays) == {"array", "other"}
+    assert arrays["array"].shape == shape
+    assert arrays["array"].dtype == torch.from_numpy(array).dtype
+    np.testing.assert_array_equal(arrays["array"].numpy(), array)
+    np.testing.assert_array_equal(arrays["other"].numpy(), other)
+
+
+def test_round_trip_non_contiguous():
+    array = np.arange(24, dtype=np.float32).reshape(4, 6)[:, ::2]
+    _, _, arrays, _ = MessageDecoder().decode(encode_message(0, {"array": array}))
+    np.testing.assert_array_equal(arrays["array"].numpy(), array)
+
+
+def test_observation_round_trip():
+    state = np.linspace(-1, 1, 6)
+    pictures = {
+        "top": np.random.default_rng(0).integers(0, 256, (48, 64, 3), dtype=np.uint8),
+        "wrist": np.zeros((24, 32, 3), dtype=np.uint8),
+    }
+    message = encode_observation(3, state, pictures, timestamp=12.5, reply="chunk")
+
+    seq, meta, arrays, images = MessageDecoder().decode(message)
+    assert seq == 3
+    assert meta == {"reply": "chunk", "timestamp": 12.5}
+    assert arrays["state"].dtype == torch.float32
+    np.testing.assert_allclose(arrays["state"].numpy(), state.astype(np.float32))
+    for name, picture in pictures.items():
+        # pictures are decoded in channel first format
+        assert images[name].shape == (3, *picture.shape[:2])
+        np.testing.assert_array_equal(images[name].permute(1, 2, 0).numpy(), picture)
+
+
+def test_observation_round_trip_jpeg():
+    pytest.importorskip("cv2")
+    picture = np.full((48, 64, 3), 128, dtype=np.uint8)
+    message = encode_observation(0, np.zeros(6), {"top": picture}, jpeg_quality=90)
+    _, _, _, images = MessageDecoder().decode(message)
+    assert images["top"].shape == (3, 48, 64)
+    assert images["top"].dtype == torch.uint8
+    assert (images["top"].int() - 128).abs().max() <= 2
+
+
+def test_action_round_trip():
+    seq, _, arrays, _ = MessageDecoder().decode(encode_action(5, [0.5, -1.5]))
+    assert seq == 5
+    np.testing.assert_array_equal(arrays["action"].numpy(), np.array([0.5, -1.5], dtype=np.float32))
+
+    actions = np.arange(12, dtype=np.float64).reshape(4, 3)
+    timestamps = 1e9 + np.arange(4) / 30
+    seq, meta, arrays, _ = MessageDecoder().decode(encode_action_chunk(6, actions, timestamps))
+    assert seq == 6
+    assert meta == {"reply": "chunk"}
+    assert arrays["actions"].dtype == torch.float32
+    np.testing.assert_array_equal(arrays["actions"].numpy(), actions.astype(np.float32))
+    # execution times keep their float64 precision
+    np.testing.assert_array_equal(arrays["timestamps"].numpy(), timestamps)
+
+
+def _observation_message() -> bytes:
+    return encode_observation(1, np.zeros(6), {"top": np.zeros((8, 8, 3), dtype=np.uint8)})
+
+
+@pytest.mark.parametrize("length", [0, PREFIX.size - 1, PREFIX.size + 5, -1])
+def test_truncated_message(length):
+    message = _observation_message()
+    with pytest.raises(ProtocolError):
+        MessageDecoder().decode(message[:length])
+
+
+def test_wrong_magic():
+    message = _observation_message()
+    with pytest.raises(ProtocolError, match="magic"):
+        MessageDecoder().decode(b"XXXX" + message[len(MAGIC) :])
+
+
+def test_garbled_header():
+    message = bytearray(_observation_message())
+    message[PREFIX.size] = 0xFF
+    with pytest.raises(ProtocolError, match="JSON"):
+        MessageDecoder().decode(bytes(message))
+
+
+def _edit_header(message: bytes, edit) -> bytes:
+    _, header_len = PREFIX.unpack_from(message)
+    header = json.loads(message[PREFIX.size : PREFIX.size + header_len])
+    edit(header)
+    header = json.dumps(header).encode()
+    return PREFIX.pack(MAGIC, len(header)) + header + message[PREFIX.size + header_len :]
+
+
+def test_unknown_encoding():
+    message = _edit_header(
+        _observation_message(), lambda header: header["images"]["top"].update(encoding="png")
+    )
+    with pytest.raises(ProtocolError, match="encoding"):
+        MessageDecoder().decode(message)
+
+
+@pytest.mark.parametrize(
+    "edit",
+    [
+        lambda header: header.pop("seq"),
+        lambda header: header.pop("arrays"),
+        lambda header: header.pop("images"),
+        lambda header: header.update(arrays=[]),
+        lambda header: header["arrays"]["state"].pop("offset"),
+        lambda header: header["arrays"]["state"].pop("nbytes"),
+        lambda header: header["arrays"]["state"].pop("shape"),
+        lambda header: header["arrays"]["state"].pop("dtype"),
+        lambda header: header["arrays"]["state"].update(dtype="garbage"),
+        lambda header: header["arrays"]["state"].update(shape=[7]),
+        lambda header: header["arrays"]["state"].update(offset=-1),
+        lambda header: header["images"]["top"].pop("encoding"),
+        lambda header: header["images"]["top"].update(shape=[8, 24]),
+    ],
+)
+def test_invalid_header(edit):
+    """Headers missing keys, or with invalid entries, are rejected instead of raising a KeyError or TypeError."""
+    message = _edit_header(_observation_message(), edit)
+    with pytest.raises(ProtocolError):
+        MessageDecoder().decode(message)
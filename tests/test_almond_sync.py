@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import filecmp
+import os
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+# the almond scripts import each other as top level modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "almond"))
+
+import almond_sync  # noqa: E402
+from almond_sync import CACHE_NAME, CHUNK_SIZE, LocalRemote, sync  # noqa: E402
+
+
+class RecordingRemote(LocalRemote):
+    """`LocalRemote` which records the chunks it writes, and optionally fails after writing `fail_after` chunks,
+    like a dropped connection."""
+
+    def __init__(self, written: list, fail_after: int | None = None):
+        self.written = written
+        self.fail_after = fail_after
+        self.num_bytes = 0
+
+    def write_chunk(self, path: str, offset: int, data: bytes):
+        if self.fail_after is not None and len(self.written) >= self.fail_after:
+            raise ConnectionResetError("connection dropped")
+        super().write_chunk(path, offset, data)
+        self.written.append((os.path.basename(path), offset // CHUNK_SIZE))
+        self.num_bytes += len(data)
+
+
+def write_file(path: Path, size: int, seed: int):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(random.Random(seed).randbytes(size))
+
+
+def assert_same_files(local: Path, remote: Path):
+    local_files = sorted(
+        p.relative_to(local) for p in local.rglob("*") if p.is_file() and p.name != CACHE_NAME
+    )
+    remote_files = sorted(
+        p.relative_to(remote) for p in remote.rglob("*") if p.is_file() and p.name != CACHE_NAME
+    )
+    assert local_files == remote_files
+    for path in local_files:
+        assert filecmp.cmp(local / path, remote / path, shallow=False), path
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    local, remote = tmp_path / "local", tmp_path / "remote"
+    write_file(local / "videos" / "episode_0.mp4", 2 * CHUNK_SIZE + CHUNK_SIZE // 2, seed=0)
+    write_file(local / "data" / "train.arrow", CHUNK_SIZE + 10, seed=1)
+    write_file(local / "meta" / "info.json", 100, seed=2)
+    return local, remote
+
+
+def test_sync_and_resync(dirs):
+    local, remote = dirs
+    total_size = sum(p.stat().st_size for p in local.rglob("*") if p.is_file())
+
+    written = []
+    assert sync(str(local), str(remote), lambda: RecordingRemote(written)) == total_size
+    assert_same_files(local, remote)
+    assert len(written) == 3 + 2 + 1
+
+    # nothing changed: no chunk is sent
+    written.clear()
+    assert sync(str(local), str(remote), lambda: RecordingRemote(written)) == 0
+    assert written == []
+
+
+def test_sync_changed_chunk(dirs):
+    local, remote = dirs
+    sync(str(local), str(remote), LocalRemote)
+
+    # change a few bytes in the middle of the second chunk of the video
+    video = local / "videos" / "episode_0.mp4"
+    with open(video, "r+b") as f:
+        f.seek(CHUNK_SIZE + 1000)
+        f.write(b"changed")
+    stat = video.stat()
+    os.utime(video, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    written = []
+    assert sync(str(local), str(remote), lambda: RecordingRemote(written)) == CHUNK_SIZE
+    assert written == [("episode_0.mp4", 1)]
+    assert_same_files(local, remote)
+
+    # appending to a file only sends its last chunk
+    with open(video, "ab") as f:
+        f.write(b"appended")
+    written.clear()
+    assert sync(str(local), str(remote), lambda: RecordingRemote(written)) == CHUNK_SIZE // 2 + len(
+        b"appended"
+    )
+    assert written == [("episode_0.mp4", 2)]
+    assert_same_files(local, remote)
+
+
+def test_sync_resume(dirs, monkeypatch):
+    """After a dropped connection, the sync resumes without sending the chunks already written again."""
+    monkeypatch.setattr(almond_sync.time, "sleep", lambda seconds: None)
+    local, remote = dirs
+    written = []
+    total_size = sum(p.stat().st_size for p in local.rglob("*") if p.is_file())
+    first, second = RecordingRemote(written, fail_after=2), RecordingRemote(written)
+    remotes = iter([first, second])
+
+    num_bytes = sync(str(local), str(remote), lambda: next(remotes), num_channels=1)
+    assert_same_files(local, remote)
+    # every chunk was written once, and only the ones of the second connection are counted
+    assert len(written) == len(set(written)) == 6
+    assert num_bytes == second.num_bytes
+    assert first.num_bytes + second.num_bytes == total_size
+
+
+def test_sync_identical_files(dirs):
+    """A file identical to another one (on the server, or sent in the same sync) is copied on the server."""
+    local, remote = dirs
+    write_file(local / "videos" / "episode_1.mp4", CHUNK_SIZE + 5, seed=3)
+    write_file(local / "videos" / "episode_2.mp4", CHUNK_SIZE + 5, seed=3)
+    written = []
+    sync(str(local), str(remote), lambda: RecordingRemote(written))
+    assert_same_files(local, remote)
+    assert {name for name, _ in written} == {"episode_0.mp4", "episode_1.mp4", "train.arrow", "info.json"}
+
+    write_file(local / "videos" / "episode_3.mp4", CHUNK_SIZE + 5, seed=3)
+    assert sync(str(local), str(remote), LocalRemote) == 0
+    assert_same_files(local, remote)
+
+
+def test_sync_delete(dirs):
+    local, remote = dirs
+    sync(str(local), str(remote), LocalRemote)
+
+    (local / "meta" / "info.json").unlink()
+    (local / "videos" / "episode_0.mp4").rename(local / "videos" / "episode_9.mp4")
+
+    # by default, the files removed locally are kept on the server
+    sync(str(local), str(remote), LocalRemote)
+    assert (remote / "meta" / "info.json").exists()
+    assert (remote / "videos" / "episode_0.mp4").exists()
+
+    # the renamed file is copied on the server rather than sent again
+    assert sync(str(local), str(remote), LocalRemote, delete=True) == 0
+    assert_same_files(local, remote)
+
+    with pytest.raises(ValueError):
+        sync(str(local), str(remote), LocalRemote, paths=["data/train.arrow"], delete=True)
@@ -15,11 +15,14 @@
 # limitations under the License.
 import json
 import logging
-from copy import deepcopy
+import pickle
+from copy import copy, deepcopy
 from itertools import chain
 from pathlib import Path
 
+import datasets
 import einops
+import numpy as np
 import pytest
 import torch
 from datasets import Dataset
@@ -27,7 +30,13 @@ from huggingface_hub import HfApi
 from safetensors.torch import load_file
 
 import lerobot
+from lerobot.common.datasets.backbone_features import (
+    BackboneFeatures,
+    backbone_features_key,
+    compute_backbone_features,
+)
 from lerobot.common.datasets.compute_stats import (
+    RunningStats,
     aggregate_stats,
     compute_stats,
     get_stats_einops_patterns,
@@ -35,12 +44,20 @@ from lerobot.common.datasets.compute_stats import (
 from lerobot.common.datasets.factory import make_dataset
 from lerobot.common.datasets.lerobot_dataset import LeRobotDataset, MultiLeRobotDataset
 from lerobot.common.datasets.utils import (
+    DevicePrefetcher,
+    EpisodeTimestampsIndex,
     create_branch,
     flatten_dict,
     hf_transform_to_torch,
     load_previous_and_future_frames,
     unflatten_dict,
 )
+from lerobot.common.datasets.video_utils import (
+    StreamingVideoEncoder,
+    VideoDecoderPool,
+    decode_video_frames_torchvision,
+    encode_video_frames,
+)
 from lerobot.common.utils.utils import init_hydra_config, seeded_context
 from tests.utils import DEFAULT_CONFIG_PATH, DEVICE
 
@@ -274,6 +291,210 @@ def test_load_previous_and_future_frames_outside_tolerance_outside_episode_range
     ), "Padding does not match expected values"
 
 
+def test_episode_timestamps_index():
+    hf_dataset = Dataset.from_dict(
+        {
+            "timestamp": [0.1, 0.2, 0.3, 0.4, 0.5, 0.0, 0.1, 0.2],
+            "index": [0, 1, 2, 3, 4, 5, 6, 7],
+            "episode_index": [0, 0, 0, 0, 0, 1, 1, 1],
+        }
+    )
+    hf_dataset.set_transform(hf_transform_to_torch)
+    episode_data_index = {
+        "from": torch.tensor([0, 5]),
+        "to": torch.tensor([5, 8]),
+    }
+    timestamps_index = EpisodeTimestampsIndex(hf_dataset, episode_data_index)
+    data_ids, is_pad = timestamps_index.query(
+        episode_indices=np.array([0, 1, 1]),
+        current_ts=np.array([0.3, 0.0, 0.2]),
+        delta_ts=np.array([-0.2, 0, 0.2]),
+        tolerance_s=0.04,
+    )
+    assert np.array_equal(data_ids, np.array([[0, 2, 4], [5, 5, 7], [5, 7, 7]]))
+    assert np.array_equal(
+        is_pad, np.array([[False, False, False], [True, False, False], [False, False, True]])
+    )
+
+    # only indexing the queried episode gives the same frames
+    episode_index = EpisodeTimestampsIndex(hf_dataset, episode_data_index, episode_indices=[1])
+    assert len(episode_index) == 3
+    data_ids, is_pad = episode_index.query(
+        episode_indices=np.array([1, 1]),
+        current_ts=np.array([0.0, 0.2]),
+        delta_ts=np.array([-0.2, 0, 0.2]),
+        tolerance_s=0.04,
+    )
+    assert np.array_equal(data_ids, np.array([[5, 5, 7], [5, 7, 7]]))
+    assert np.array_equal(is_pad, np.array([[True, False, False], [False, False, True]]))
+
+
+def test_timestamps_index_follows_hf_dataset():
+    """The timestamps index of a dataset is built on first use, and again when `hf_dataset` is reassigned."""
+    episode_data_index = {"from": torch.tensor([0]), "to": torch.tensor([3])}
+    hf_dataset = Dataset.from_dict(
+        {"timestamp": [0.0, 0.1, 0.2], "index": [0, 1, 2], "episode_index": [0, 0, 0]}
+    )
+    hf_dataset.set_transform(hf_transform_to_torch)
+    dataset = LeRobotDataset.from_preloaded(
+        delta_timestamps={"index": [-0.1, 0]},
+        hf_dataset=hf_dataset,
+        episode_data_index=episode_data_index,
+        info={"fps": 10},
+    )
+    assert dataset.timestamps_index is dataset.timestamps_index
+    assert torch.equal(dataset[2]["index"], torch.tensor([1, 2]))
+
+    # the frames are shifted by 0.1s
+    hf_dataset = Dataset.from_dict(
+        {"timestamp": [0.1, 0.2, 0.3], "index": [0, 1, 2], "episode_index": [0, 0, 0]}
+    )
+    hf_dataset.set_transform(hf_transform_to_torch)
+    dataset.hf_dataset = hf_dataset
+    np.testing.assert_allclose(dataset.timestamps_index.timestamps, [0.1, 0.2, 0.3])
+    # the previous frame of the first one is now before the start of the episode
+    assert torch.equal(dataset[0]["index_is_pad"], torch.tensor([True, False]))
+
+
+def test_getitems_matches_getitem():
+    hf_dataset = Dataset.from_dict(
+        {
+            "timestamp": [0.0, 0.1, 0.2, 0.3, 0.4, 0.0, 0.1, 0.2],
+            "index": [0, 1, 2, 3, 4, 5, 6, 7],
+            "episode_index": [0, 0, 0, 0, 0, 1, 1, 1],
+            "action": [[float(i), -float(i)] for i in range(8)],
+        }
+    )
+    hf_dataset.set_transform(hf_transform_to_torch)
+    episode_data_index = {
+        "from": torch.tensor([0, 5]),
+        "to": torch.tensor([5, 8]),
+    }
+    dataset = LeRobotDataset.from_preloaded(
+        delta_timestamps={"index": [-0.1, 0], "action": [0, 0.1, 0.2]},
+        hf_dataset=hf_dataset,
+        episode_data_index=episode_data_index,
+        info={"fps": 10},
+    )
+    indices = [7, 0, 4, 5, 2]
+    items = dataset.__getitems__(indices)
+    assert len(items) == len(indices)
+    for idx, item in zip(indices, items, strict=True):
+        expected_item = dataset[idx]
+        assert item.keys() == expected_item.keys()
+        for key in item:
+            assert torch.equal(item[key], expected_item[key]), f"{key} of item {idx}"
+
+
+def test_backbone_features(tmp_path):
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    images = [Image.fromarray(rng.integers(0, 256, (4, 4, 3), dtype=np.uint8)) for _ in range(8)]
+    hf_dataset = Dataset.from_dict(
+        {
+            "observation.image": images,
+            "timestamp": [0.0, 0.1, 0.2, 0.3, 0.4, 0.0, 0.1, 0.2],
+            "index": [0, 1, 2, 3, 4, 5, 6, 7],
+            "episode_index": [0, 0, 0, 0, 0, 1, 1, 1],
+        },
+        features=datasets.Features(
+            {
+                "observation.image": datasets.Image(),
+                "timestamp": datasets.Value("float32"),
+                "index": datasets.Value("int64"),
+                "episode_index": datasets.Value("int64"),
+            }
+        ),
+    )
+    hf_dataset.set_transform(hf_transform_to_torch)
+    dataset = LeRobotDataset.from_preloaded(
+        delta_timestamps={"observation.image": [-0.1, 0]},
+        hf_dataset=hf_dataset,
+        episode_data_index={"from": torch.tensor([0, 5]), "to": torch.tensor([5, 8])},
+        info={"fps": 10},
+    )
+
+    def encode(key, images):
+        return images.mean(dim=(2, 3))
+
+    compute_backbone_features(dataset, encode, tmp_path / "features", batch_size=3)
+    dataset_with_features = copy(dataset)
+    dataset_with_features.backbone_features = BackboneFeatures(tmp_path / "features")
+
+    features_key = backbone_features_key("observation.image")
+    for idx in range(len(dataset)):
+        expected_item = dataset[idx]
+        item = dataset_with_features[idx]
+        assert "observation.image" not in item
+        assert torch.equal(item["observation.image_is_pad"], expected_item["observation.image_is_pad"])
+        # the features are saved in float16
+        assert torch.allclose(item[features_key], encode(None, expected_item["observation.image"]), atol=1e-3)
+
+
+def test_video_decoder_pool(tmp_path):
+    from PIL import Image
+
+    fps = 10
+    imgs_dir = tmp_path / "images"
+    imgs_dir.mkdir()
+    for i in range(30):
+        img = np.zeros((32, 32, 3), dtype=np.uint8)
+        img[..., 0] = i * 8
+        Image.fromarray(img).save(imgs_dir / f"frame_{i:06d}.png")
+    video_path = tmp_path / "episode_000000.mp4"
+    encode_video_frames(imgs_dir, video_path, fps, vcodec="libx264", g=5, crf=0)
+
+    tol = 1 / fps - 1e-4
+    pool = VideoDecoderPool(max_open_decoders=1)
+    # consecutive windows, a jump backward and a jump forward
+    queries = [[i / fps - 0.1, i / fps] for i in range(1, 30)] + [[0.5], [2.5], [0.0, 0.1]]
+    for timestamps in queries:
+        expected = decode_video_frames_torchvision(video_path, timestamps, tol)
+        frames = pool.decode(video_path, timestamps, tol)
+        assert torch.equal(frames, expected)
+    assert len(pool) == 1
+
+    # the open decoder is not shared with a copy of the pool (e.g. sent to a DataLoader worker)
+    assert len(pickle.loads(pickle.dumps(pool))) == 0
+
+    pool.close()
+    assert len(pool) == 0
+    assert pool.cached_bytes == 0
+
+
+def test_streaming_video_encoder(tmp_path):
+    from PIL import Image
+
+    fps = 10
+    frames = torch.randint(0, 256, (20, 32, 48, 3), dtype=torch.uint8)
+
+    imgs_dir = tmp_path / "images"
+    imgs_dir.mkdir()
+    for i, frame in enumerate(frames):
+        Image.fromarray(frame.numpy()).save(imgs_dir / f"frame_{i:06d}.png")
+    expected_path = tmp_path / "expected.mp4"
+    encode_video_frames(imgs_dir, expected_path, fps, vcodec="libx264", crf=0)
+
+    video_path = tmp_path / "streamed.mp4"
+    encoder = StreamingVideoEncoder(video_path, fps, vcodec="libx264", crf=0, max_queue_size=4)
+    for frame in frames:
+        encoder.write(frame)
+    encoder.close()
+
+    timestamps = [i / fps for i in range(len(frames))]
+    tol = 1 / fps - 1e-4
+    expected = decode_video_frames_torchvision(expected_path, timestamps, tol)
+    assert torch.equal(decode_video_frames_torchvision(video_path, timestamps, tol), expected)
+
+    # aborting deletes the incomplete video
+    aborted_path = tmp_path / "aborted.mp4"
+    encoder = StreamingVideoEncoder(aborted_path, fps, vcodec="libx264")
+    encoder.write(frames[0])
+    encoder.abort()
+    assert not aborted_path.exists()
+
+
 def test_flatten_unflatten_dict():
     d = {
         "obs": {
@@ -396,6 +617,63 @@ def test_aggregate_stats():
         assert torch.allclose(stats[data_key]["std"], torch.std(data, correction=0))
 
 
+def test_running_stats_merge():
+    """Checks that merging the stats of separate shards of images matches the stats of all the images."""
+    with seeded_context(0):
+        data = torch.rand(50, 3, 8, 8, dtype=torch.float32)
+
+    shards = [data[:7], data[7:30], data[30:]]
+    ls_running_stats = []
+    for shard in shards:
+        running_stats = RunningStats("b c h w -> c 1 1")
+        for batch in shard.split(4):
+            running_stats.update(batch)
+        ls_running_stats.append(running_stats)
+
+    merged = RunningStats("b c h w -> c 1 1")
+    for running_stats in ls_running_stats:
+        merged.merge(running_stats)
+    stats = merged.to_stats()
+
+    for agg_fn in ["mean", "min", "max"]:
+        assert torch.allclose(stats[agg_fn], einops.reduce(data, "b c h w -> c 1 1", agg_fn))
+    expected_std = torch.std(einops.rearrange(data, "b c h w -> c (b h w)"), dim=1, correction=0)
+    assert torch.allclose(stats["std"], expected_std[:, None, None])
+
+
+def test_device_prefetcher():
+    batches = [{"index": torch.arange(i, i + 4), "task": ["a"] * 4} for i in range(0, 12, 4)]
+    prefetcher = DevicePrefetcher(iter(batches), torch.device(DEVICE))
+    for expected in batches:
+        batch = next(prefetcher)
+        assert batch["index"].device.type == torch.device(DEVICE).type
+        assert torch.equal(batch["index"].cpu(), expected["index"])
+        assert batch["task"] == expected["task"]
+        assert prefetcher.dataloading_s >= 0
+        assert prefetcher.h2d_s >= 0
+    with pytest.raises(StopIteration):
+        next(prefetcher)
+
+
+def test_device_prefetcher_without_prefetch():
+    """Without `prefetch`, a batch is only pulled from the iterator when it is requested."""
+    num_pulled = 0
+
+    def batches():
+        nonlocal num_pulled
+        for i in range(3):
+            num_pulled += 1
+            yield {"index": torch.full((4,), i)}
+
+    prefetcher = DevicePrefetcher(batches(), torch.device(DEVICE), prefetch=False)
+    for i in range(3):
+        batch = next(prefetcher)
+        assert num_pulled == i + 1
+        assert torch.equal(batch["index"].cpu(), torch.full((4,), i))
+    with pytest.raises(StopIteration):
+        next(prefetcher)
+
+
 @pytest.mark.skip("Requires internet access")
 def test_create_branch():
     api = HfApi()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gymnasium as gym
+import numpy as np
+import torch
+from torch import nn
+
+from lerobot.common.datasets.online_buffer import OnlineBuffer
+from lerobot.common.utils.utils import seeded_context
+from lerobot.scripts.eval import _compile_episode_data, eval_policy
+
+
+def compile_episode_data_per_episode(
+    rollout_data: dict,
+    done_indices: torch.Tensor,
+    start_episode_index: int,
+    start_data_index: int,
+    fps: float,
+) -> dict:
+    """Reference implementation of `_compile_episode_data`, which compiles the episodes one by one."""
+    ep_dicts = []
+    total_frames = 0
+    for ep_ix in range(rollout_data["action"].shape[0]):
+        # + 2 to include the first done frame and the last observation frame.
+        num_frames = done_indices[ep_ix].item() + 2
+        total_frames += num_frames
+
+        # Here we do `num_frames - 1` as we don't want to include the last observation frame just yet.
+        ep_dict = {
+            "action": rollout_data["action"][ep_ix, : num_frames - 1],
+            "episode_index": torch.tensor([start_episode_index + ep_ix] * (num_frames - 1)),
+            "frame_index": torch.arange(0, num_frames - 1, 1),
+            "timestamp": torch.arange(0, num_frames - 1, 1) / fps,
+            "next.done": rollout_data["done"][ep_ix, : num_frames - 1],
+            "next.success": rollout_data["success"][ep_ix, : num_frames - 1],
+            "next.reward": rollout_data["reward"][ep_ix, : num_frames - 1].type(torch.float32),
+        }
+
+        # For the last observation frame, all other keys will just be copy padded.
+        for k in ep_dict:
+            ep_dict[k] = torch.cat([ep_dict[k], ep_dict[k][-1:]])
+
+        for key in rollout_data["observation"]:
+            ep_dict[key] = rollout_data["observation"][key][ep_ix, :num_frames]
+
+        ep_dicts.append(ep_dict)
+
+    data_dict = {}
+    for key in ep_dicts[0]:
+        data_dict[key] = torch.cat([x[key] for x in ep_dicts])
+
+    data_dict["index"] = torch.arange(start_data_index, start_data_index + total_frames, 1)
+
+    return data_dict
+
+
+def test_compile_episode_data():
+    """Check that the episodes compiled at once match the ones compiled one by one."""
+    batch_size, n_steps = 4, 7
+    # episodes of different lengths, including one which is done at the first step and one at the last step
+    done_indices = torch.tensor([2, 0, 6, 4])
+    with seeded_context(0):
+        rollout_data = {
+            "action": torch.randn(batch_size, n_steps, 2),
+            "reward": torch.rand(batch_size, n_steps, dtype=torch.float64),
+            "success": torch.rand(batch_size, n_steps) > 0.5,
+            "done": torch.arange(n_steps) >= done_indices[:, None],
+            "observation": {
+                "observation.state": torch.randn(batch_size, n_steps + 1, 3),
+                "observation.image": torch.rand(batch_size, n_steps + 1, 3, 8, 8),
+            },
+        }
+
+    kwargs = {"start_episode_index": 5, "start_data_index": 100, "fps": 10}
+    expected = compile_episode_data_per_episode(rollout_data, done_indices, **kwargs)
+    actual = _compile_episode_data(rollout_data, done_indices, **kwargs)
+    assert set(actual) == set(expected)
+    for key in expected:
+        assert actual[key].dtype == expected[key].dtype, key
+        assert torch.equal(actual[key], expected[key]), key
+
+
+class CountingEnv(gym.Env):
+    """Terminates (successfully) after a number of steps which depends on the seed. The state is the step."""
+
+    metadata = {"render_fps": 10}
+
+    def __init__(self):
+        self.observation_space = gym.spaces.Dict(
+            {"agent_pos": gym.spaces.Box(low=-np.inf, high=np.inf, shape=(2,), dtype=np.float32)}
+        )
+        self.action_space = gym.spaces.Box(low=-1, high=1, shape=(2,), dtype=np.float32)
+        self._max_episode_steps = 20
+
+    def _observation(self):
+        return {"agent_pos": np.array([self.step_index, self.episode_length], dtype=np.float32)}
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        self.episode_length = 3 + (seed or 0) % 4
+        self.step_index = 0
+        return self._observation(), {}
+
+    def step(self, action):
+        self.step_index += 1
+        terminated = self.step_index >= self.episode_length
+        return self._observation(), 1.0, terminated, False, {"is_success": terminated}
+
+
+class ConstantPolicy(nn.Module):
+    name = "constant"
+
+    def __init__(self, config=None, dataset_stats=None):
+        super().__init__()
+        self.action = nn.Parameter(torch.full((2,), 0.5), requires_grad=False)
+
+    def reset(self):
+        pass
+
+    def forward(self, batch):
+        return {}
+
+    def select_action(self, batch):
+        return self.action.expand(len(batch["observation.state"]), -1)
+
+
+def test_eval_policy_episode_data_callback(tmp_path):
+    """Check that the episode data of each batch of rollouts can be added to an `OnlineBuffer`."""
+    env = gym.vector.SyncVectorEnv([CountingEnv, CountingEnv])
+    fps = CountingEnv.metadata["render_fps"]
+    buffer = OnlineBuffer(
+        tmp_path / "online_buffer",
+        data_spec={
+            "observation.state": {"shape": (2,), "dtype": np.dtype("float32")},
+            "action": {"shape": (2,), "dtype": np.dtype("float32")},
+            "next.reward": {"shape": (), "dtype": np.dtype("float32")},
+            "next.done": {"shape": (), "dtype": np.dtype("?")},
+            "next.success": {"shape": (), "dtype": np.dtype("?")},
+        },
+        buffer_capacity=100,
+        fps=fps,
+    )
+
+    info = eval_policy(
+        env, ConstantPolicy(), n_episodes=4, start_seed=0, episode_data_callback=buffer.add_data
+    )
+    assert "episodes" not in info
+    assert info["aggregated"]["pc_success"] == 100
+
+    # the episodes last 3 to 6 steps, plus the last observation frame
+    episode_lengths = [4, 5, 6, 7]
+    assert buffer.num_episodes == 4
+    assert buffer.num_samples == sum(episode_lengths)
+    np.testing.assert_array_equal(buffer.get_data_by_key("index").numpy(), np.arange(sum(episode_lengths)))
+    expected_episode_index = np.repeat(np.arange(4), episode_lengths)
+    np.testing.assert_array_equal(buffer.get_data_by_key("episode_index").numpy(), expected_episode_index)
+    # the last observation frame copies the other keys of the done frame
+    expected_frame_index = np.concatenate(
+        [np.append(np.arange(length - 1), length - 2) for length in episode_lengths]
+    )
+    np.testing.assert_array_equal(buffer.get_data_by_key("frame_index").numpy(), expected_frame_index)
+    # the state holds the step of the frame, and the number of steps of its episode (the last observation
+    # frame is skipped, as the vector env returns the observation after its automatic reset)
+    is_last = np.zeros(sum(episode_lengths), dtype=bool)
+    is_last[np.cumsum(episode_lengths) - 1] = True
+    states = buffer.get_data_by_key("observation.state").numpy()
+    np.testing.assert_array_equal(states[~is_last, 0], expected_frame_index[~is_last])
+    expected_num_steps = np.repeat(np.array(episode_lengths) - 1, episode_lengths)
+    np.testing.assert_array_equal(states[~is_last, 1], expected_num_steps[~is_last])
+    np.testing.assert_allclose(buffer.get_data_by_key("timestamp").numpy(), expected_frame_index / fps)
+    np.testing.assert_array_equal(buffer.get_data_by_key("action").numpy(), 0.5)
+    # the last two frames of each episode (the done frame and its copy padded observation frame) are done
+    done = buffer.get_data_by_key("next.done").numpy()
+    assert done.sum() == 2 * 4
+    assert done[is_last].all()
+    env.close()
@@ -22,7 +22,6 @@ pytest -sx 'tests/test_motors.py::test_motors_bus[dynamixel-True]'
 
 # TODO(rcadene): measure fps in nightly?
 # TODO(rcadene): test logs
-# TODO(rcadene): test calibration
 # TODO(rcadene): add compatibility with other motors bus
 
 import time
@@ -30,6 +29,8 @@ import time
 import numpy as np
 import pytest
 
+from lerobot import available_motors
+from lerobot.common.robot_devices.motors.dynamixel import CalibrationMode, JointOutOfRangeError
 from lerobot.common.robot_devices.utils import RobotDeviceAlreadyConnectedError, RobotDeviceNotConnectedError
 from lerobot.scripts.find_motors_bus_port import find_port
 from tests.utils import TEST_MOTOR_TYPES, make_motors_bus, require_motor
@@ -142,3 +143,78 @@ def test_motors_bus(request, motor_type, mock):
     time.sleep(1)
     new_values = motors_bus.read("Present_Position")
     assert (new_values == values).all()
+
+    # Test writing and reading several contiguous fields in a single transaction
+    if motor_type == "dynamixel":
+        fields = {"Torque_Enable": 1, "LED": 1}
+    elif motor_type == "feetech":
+        fields = {"Torque_Enable": 1, "Acceleration": 254}
+    motors_bus.write_fields(fields)
+    values = motors_bus.read_fields(list(fields))
+    assert values.shape == (len(motors_bus.motors),)
+    for data_name, value in fields.items():
+        assert (values[data_name] == value).all()
+    with pytest.raises(ValueError):
+        # the fields are not contiguous in the control table
+        motors_bus.write_fields({"Torque_Enable": 1, "Goal_Position": 0})
+
+
+@pytest.mark.parametrize("motor_type", available_motors)
+def test_decode_signed_values(motor_type):
+    """Check that the velocities and loads read when moving backward are decoded to negative values."""
+    motors_bus = make_motors_bus(motor_type, mock=True)
+    motor_names = motors_bus.motor_names[:3]
+    if motor_type == "dynamixel":
+        # two's complement, on 4 and 2 bytes
+        raw = {"Present_Velocity": [5, 2**32 - 5, 0], "Present_Current": [100, 2**16 - 100, 2**16 - 1]}
+        expected = {"Present_Velocity": [5, -5, 0], "Present_Current": [100, -100, -1]}
+    elif motor_type == "feetech":
+        # sign-magnitude, with the sign on bit 15 for the speed and bit 10 for the load
+        raw = {"Present_Speed": [5, 2**15 + 5, 2**15], "Present_Load": [300, 2**10 + 300, 0]}
+        expected = {"Present_Speed": [5, -5, 0], "Present_Load": [300, -300, 0]}
+    for data_name, values in raw.items():
+        decoded = motors_bus.decode_read_values(data_name, np.array(values), motor_names)
+        np.testing.assert_array_equal(decoded, expected[data_name])
+
+
+@pytest.mark.parametrize("motor_type", available_motors)
+def test_calibration(motor_type):
+    """Check the compiled calibration against the per-motor formulas, without motors."""
+    motors_bus = make_motors_bus(motor_type, mock=True)
+    motor_names = motors_bus.motor_names
+    num_motors = len(motor_names)
+    calibration = {
+        "motor_names": motor_names,
+        "calib_mode": [CalibrationMode.DEGREE.name] * (num_motors - 1) + [CalibrationMode.LINEAR.name],
+        "drive_mode": [0, 1] * (num_motors // 2),
+        "homing_offset": [-2048 + 100 * i for i in range(num_motors)],
+        "start_pos": [1000] * num_motors,
+        "end_pos": [3000] * num_motors,
+    }
+    motors_bus.set_calibration(calibration)
+
+    # all the motors are at their zero position, except the gripper which is half open
+    sign = np.array([-1 if mode else 1 for mode in calibration["drive_mode"]])
+    raw = sign * (-np.array(calibration["homing_offset"]) + 10 * np.arange(num_motors))
+    raw[-1] = 2000
+    expected = 10 * np.arange(num_motors) / 2048 * 180
+    expected[-1] = 50
+    values = motors_bus.apply_calibration(raw, motor_names)
+    assert values.dtype == np.float32
+    np.testing.assert_allclose(values, expected, atol=1e-4)
+    np.testing.assert_array_equal(motors_bus.revert_calibration(values, motor_names), raw)
+
+    # subsets of motors, in any order
+    subset = [motor_names[-1], motor_names[0]]
+    np.testing.assert_allclose(
+        motors_bus.apply_calibration(raw[[-1, 0]], subset), expected[[-1, 0]], atol=1e-4
+    )
+
+    # a shift of a full turn is detected, then corrected in the homing offset
+    shifted = raw.copy()
+    shifted[0] += 4096
+    with pytest.raises(JointOutOfRangeError):
+        motors_bus.apply_calibration(shifted, motor_names)
+    values = motors_bus.apply_calibration_autocorrect(shifted, motor_names)
+    np.testing.assert_allclose(values, expected, atol=1e-4)
+    assert calibration["homing_offset"][0] == -2048 - 4096
@@ -156,6 +156,77 @@ def test_fifo():
         assert np.array_equal(item[data_key].numpy(), expected_data[data_key][i])
 
 
+@pytest.mark.parametrize("do_reload", [False, True])
+def test_episode_tables_and_getitems(do_reload: bool):
+    """Checks the episode bookkeeping of the buffer, and that `__getitems__` matches `__getitem__`, when the
+    oldest episodes are overwritten."""
+    buffer, write_dir = make_new_buffer(delta_timestamps={data_key: [-0.2, 0, 0.1]})
+    n_frames_per_episode = buffer_capacity // 4 - 2
+    buffer.add_data(make_spoof_data_frames(n_episodes=3, n_frames_per_episode=n_frames_per_episode))
+    buffer.add_data(make_spoof_data_frames(n_episodes=2, n_frames_per_episode=n_frames_per_episode))
+    if do_reload:
+        del buffer
+        buffer, _ = make_new_buffer(write_dir, delta_timestamps={data_key: [-0.2, 0, 0.1]})
+
+    episode_index = buffer.get_data_by_key(OnlineBuffer.EPISODE_INDEX_KEY)
+    assert len(buffer) == buffer_capacity
+    # The first episode was partially overwritten.
+    assert buffer.num_episodes == len(torch.unique(episode_index)) == 5
+
+    frame_index = buffer.get_data_by_key(OnlineBuffer.FRAME_INDEX_KEY)
+    data = buffer.get_data_by_key(data_key)
+    indices = list(range(len(buffer)))
+    for item, expected_item in zip(buffer.__getitems__(indices), [buffer[i] for i in indices], strict=True):
+        assert set(item) == set(expected_item)
+        assert all(torch.equal(item[k], expected_item[k]) for k in item)
+        # The frames are copy padded at the bounds of what remains of the episode in the buffer.
+        episode_mask = episode_index == item[OnlineBuffer.EPISODE_INDEX_KEY]
+        episode_frame_index = frame_index[episode_mask]
+        expected_frame_index = (item[OnlineBuffer.FRAME_INDEX_KEY] + torch.tensor([-2, 0, 1])).clip(
+            episode_frame_index.min(), episode_frame_index.max()
+        )
+        expected_data = torch.stack(
+            [data[episode_mask][episode_frame_index == f][0] for f in expected_frame_index]
+        )
+        assert torch.equal(item[data_key], expected_data)
+
+
+@pytest.mark.parametrize("multiprocessing_context", ["fork", "spawn"])
+def test_add_data_while_loading(multiprocessing_context: str):
+    """Checks that the DataLoader workers read consistent items when data is added to the buffer (overwriting
+    the oldest episodes) while they are iterating over it."""
+    buffer, _ = make_new_buffer(delta_timestamps={data_key: [-1 / fps, 0]})
+
+    def make_data(n_episodes: int, n_frames_per_episode: int, first_index: int) -> dict[str, np.ndarray]:
+        new_data = make_spoof_data_frames(n_episodes, n_frames_per_episode)
+        # The data of each frame is its index in the buffer (once shifted by `add_data`).
+        index = new_data[OnlineBuffer.INDEX_KEY] + first_index
+        new_data[data_key] = np.broadcast_to(index[:, None, None], (len(index), *data_shape)).copy()
+        return new_data
+
+    buffer.add_data(make_data(n_episodes=4, n_frames_per_episode=buffer_capacity // 4, first_index=0))
+    dataloader = torch.utils.data.DataLoader(
+        buffer, batch_size=4, num_workers=2, multiprocessing_context=multiprocessing_context
+    )
+    batches = []
+    for i, batch in enumerate(dataloader):
+        if i == 1:
+            buffer.add_data(make_data(n_episodes=3, n_frames_per_episode=30, first_index=buffer_capacity))
+        batches.append(batch)
+
+    index = torch.cat([batch[OnlineBuffer.INDEX_KEY] for batch in batches])
+    data = torch.cat([batch[data_key] for batch in batches])
+    is_pad = torch.cat([batch[f"{data_key}{OnlineBuffer.IS_PAD_POSTFIX}"] for batch in batches])
+    assert len(index) == buffer_capacity
+    # The last batches were read after the data was added.
+    assert (index >= buffer_capacity).any()
+    # The current frame, and the previous frame of the same episode (copy padded at the first frame of what
+    # remains of the episode in the buffer).
+    assert (data[:, 1] == index[:, None, None]).all()
+    expected_previous_index = torch.where(is_pad[:, 0], index, index - 1)
+    assert (data[:, 0] == expected_previous_index[:, None, None]).all()
+
+
 def test_delta_timestamps_within_tolerance():
     """Check that getting an item with delta_timestamps within tolerance succeeds.
 
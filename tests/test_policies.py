@@ -22,13 +22,20 @@ import pytest
 import torch
 from huggingface_hub import PyTorchModelHubMixin
 from safetensors.torch import load_file
+from torchvision.ops.misc import FrozenBatchNorm2d
 
 from lerobot import available_policies
+from lerobot.common.datasets.backbone_features import backbone_features_key
 from lerobot.common.datasets.factory import make_dataset
 from lerobot.common.datasets.utils import cycle
 from lerobot.common.envs.factory import make_env
 from lerobot.common.envs.utils import preprocess_observation
-from lerobot.common.policies.act.modeling_act import ACTTemporalEnsembler
+from lerobot.common.policies.act.configuration_act import ACTConfig
+from lerobot.common.policies.act.modeling_act import ACTPolicy, ACTTemporalEnsembler
+from lerobot.common.policies.diffusion.configuration_diffusion import DiffusionConfig
+from lerobot.common.policies.diffusion.modeling_diffusion import DiffusionConditionalUnet1d, DiffusionPolicy
+from lerobot.common.policies.export import export_policy
+from lerobot.common.policies.exported import ExportedPolicy
 from lerobot.common.policies.factory import (
     _policy_cfg_from_hydra_cfg,
     get_policy_and_config_classes,
@@ -351,6 +358,56 @@ def test_normalize(insert_temporal_dim):
     unnormalize(output_batch)
 
 
+def test_normalize_values():
+    """Check that the precomputed affine transforms match the normalization formulas, including after the
+    stats are loaded with `load_state_dict`."""
+    shapes = {"observation.image": [3, 96, 96], "observation.state": [10]}
+    modes = {"observation.image": "mean_std", "observation.state": "min_max"}
+    with seeded_context(0):
+        stats = {
+            "observation.image": {"mean": torch.rand(3, 1, 1), "std": torch.rand(3, 1, 1) + 0.1},
+            "observation.state": {"min": -torch.rand(10), "max": torch.rand(10)},
+        }
+        batch = {"observation.image": torch.rand(2, 3, 96, 96), "observation.state": torch.randn(2, 10)}
+    image_stats, state_stats = stats["observation.image"], stats["observation.state"]
+    expected = {
+        "observation.image": (batch["observation.image"] - image_stats["mean"]) / (image_stats["std"] + 1e-8),
+        "observation.state": (batch["observation.state"] - state_stats["min"])
+        / (state_stats["max"] - state_stats["min"] + 1e-8)
+        * 2
+        - 1,
+    }
+
+    normalize = Normalize(shapes, modes, stats=None)
+    normalize.load_state_dict(Normalize(shapes, modes, stats=stats).state_dict())
+    unnormalize = Unnormalize(shapes, modes, stats=stats)
+    normalized = normalize(batch)
+    for key in batch:
+        assert torch.allclose(normalized[key], expected[key], atol=1e-5)
+    unnormalized = unnormalize(normalized)
+    for key in batch:
+        assert torch.allclose(unnormalized[key], batch[key], atol=1e-5)
+
+
+def test_normalize_backbone_features():
+    """Check that only the images replaced by their backbone features may be missing from the batch."""
+    shapes = {"observation.image": [3, 96, 96], "observation.state": [10]}
+    modes = {"observation.image": "mean_std", "observation.state": "min_max"}
+    stats = {
+        "observation.image": {"mean": torch.zeros(3, 1, 1), "std": torch.ones(3, 1, 1)},
+        "observation.state": {"min": -torch.ones(10), "max": torch.ones(10)},
+    }
+    normalize = Normalize(shapes, modes, stats=stats)
+    features = torch.rand(2, 512, 3, 3)
+    batch = {backbone_features_key("observation.image"): features, "observation.state": torch.randn(2, 10)}
+    normalized = normalize(batch)
+    assert normalized[backbone_features_key("observation.image")] is features
+    assert "observation.image" not in normalized
+
+    with pytest.raises(KeyError):
+        normalize({"observation.state": torch.randn(2, 10)})
+
+
 @pytest.mark.parametrize(
     "env_name, policy_name, extra_overrides, file_name_extra",
     [
@@ -462,5 +519,292 @@ def test_act_temporal_ensembler():
         assert torch.allclose(online_avg, offline_avg, atol=1e-4)
 
 
+def test_act_temporal_ensembler_add_chunk():
+    """Check that chunks added every few steps (and possibly truncated) are ensembled with the weights of the
+    order in which they were added."""
+    temporal_ensemble_coeff = 0.1
+    chunk_size = 10
+    chunk_period = 3
+    num_steps = 30
+    ensembler = ACTTemporalEnsembler(temporal_ensemble_coeff, chunk_size)
+    weights = torch.exp(-temporal_ensemble_coeff * torch.arange(chunk_size))
+    with seeded_context(0):
+        # Dimension is (num_chunks, batch(=2), chunk_size, action_dim(=1))
+        chunks = torch.rand(num_steps // chunk_period, 2, chunk_size, 1)
+
+    for step in range(num_steps):
+        if step % chunk_period == 0:
+            # every other chunk is received one step late, so its first action is dropped
+            num_dropped = (step // chunk_period) % 2
+            ensembler.add_chunk(chunks[step // chunk_period, :, num_dropped:])
+        online_avg = ensembler.pop()
+
+        # offline weighted average over the chunks that predicted this step, from the oldest to the newest
+        predictions = []
+        for chunk_idx in range(step // chunk_period + 1):
+            num_dropped = chunk_idx % 2
+            offset = step - chunk_idx * chunk_period + num_dropped
+            if num_dropped <= offset < chunk_size:
+                predictions.append(chunks[chunk_idx, :, offset])
+        predictions = torch.stack(predictions)
+        chunk_weights = weights[: len(predictions), None, None]
+        offline_avg = (predictions * chunk_weights).sum(0) / chunk_weights.sum()
+        assert torch.allclose(online_avg, offline_avg, atol=1e-5)
+
+
+def test_act_temporal_ensembler_capturable():
+    """Check that the capturable variant (with the ring buffer position and size on device) matches the
+    regular one."""
+    temporal_ensemble_coeff = 0.01
+    chunk_size = 8
+    ensembler = ACTTemporalEnsembler(temporal_ensemble_coeff, chunk_size)
+    capturable_ensembler = ACTTemporalEnsembler(temporal_ensemble_coeff, chunk_size, capturable=True)
+    with seeded_context(0):
+        # Dimension is (episode_length, batch, chunk_size, action_dim)
+        chunks = torch.rand(3 * chunk_size, 2, chunk_size, 3)
+
+    for _ in range(2):
+        for actions in chunks:
+            assert torch.allclose(capturable_ensembler.update(actions), ensembler.update(actions), atol=1e-6)
+            assert len(capturable_ensembler) == len(ensembler) == chunk_size - 1
+        ensembler.reset()
+        capturable_ensembler.reset()
+        assert len(capturable_ensembler) == 0
+
+    # chunks added every few steps, possibly truncated
+    for step, actions in enumerate(chunks):
+        if step % 3 == 0:
+            ensembler.add_chunk(actions[:, step % 2 :])
+            capturable_ensembler.add_chunk(actions[:, step % 2 :])
+        assert len(capturable_ensembler) == len(ensembler)
+        assert torch.allclose(capturable_ensembler.ensembled_actions, ensembler.ensembled_actions, atol=1e-6)
+        assert torch.allclose(capturable_ensembler.pop(), ensembler.pop(), atol=1e-6)
+
+
+@pytest.mark.parametrize("use_film_scale_modulation", [False, True])
+def test_diffusion_unet_film_embeds(use_film_scale_modulation):
+    """Check that the FiLM embeddings precomputed for all the denoising steps match the ones computed by the
+    Unet at each step."""
+    config = DiffusionConfig(
+        down_dims=(16, 32),
+        diffusion_step_embed_dim=8,
+        n_groups=4,
+        horizon=8,
+        use_film_scale_modulation=use_film_scale_modulation,
+    )
+    global_cond_dim = 6
+    unet = DiffusionConditionalUnet1d(config, global_cond_dim=global_cond_dim).eval()
+    timesteps = torch.tensor([90, 50, 10, 0])
+    with seeded_context(0):
+        x = torch.randn(2, config.horizon, config.output_shapes["action"][0])
+        global_cond = torch.randn(2, global_cond_dim)
+
+    film_embeds = unet.compute_film_embeds(timesteps, global_cond)
+    with torch.no_grad():
+        for i, t in enumerate(timesteps.tolist()):
+            expected = unet(x, torch.full((2,), t), global_cond=global_cond)
+            actual = unet(x, t, film_embeds=[embeds[i] for embeds in film_embeds])
+            assert torch.allclose(actual, expected, atol=1e-5)
+
+
+def test_diffusion_backbone_features():
+    """Check that the diffusion policy gives the same results with the precomputed backbone features of the
+    images as with the images, and with the image features cached across the steps of a rollout."""
+    config = DiffusionConfig(down_dims=(16, 32), diffusion_step_embed_dim=8, n_groups=4, horizon=8)
+    image_key = "observation.image"
+    with seeded_context(0):
+        stats = {
+            image_key: {"mean": torch.rand(3, 1, 1), "std": torch.rand(3, 1, 1) + 0.1},
+            "observation.state": {"min": -torch.rand(2), "max": torch.rand(2)},
+            "action": {"min": -torch.rand(2), "max": torch.rand(2)},
+        }
+        policy = DiffusionPolicy(config, dataset_stats=stats).eval()
+        batch = {
+            image_key: torch.rand(2, config.n_obs_steps, 3, 96, 96),
+            "observation.state": torch.randn(2, config.n_obs_steps, 2),
+            "action": torch.randn(2, config.horizon, 2),
+            "action_is_pad": torch.zeros(2, config.horizon, dtype=torch.bool),
+        }
+
+    features = policy.encode_backbone_features(image_key, batch[image_key].flatten(0, 1))
+    features_batch = {k: v for k, v in batch.items() if k != image_key}
+    features_batch[backbone_features_key(image_key)] = features.unflatten(0, (2, config.n_obs_steps))
+    with torch.no_grad(), seeded_context(0):
+        expected_loss = policy.forward(batch)["loss"]
+    with torch.no_grad(), seeded_context(0):
+        loss = policy.forward(features_batch)["loss"]
+    assert torch.allclose(loss, expected_loss, atol=1e-6)
+
+    # the image features cached by `observe` and `select_action_chunk` match the encoding of the stacked
+    # observations
+    policy.reset()
+    for step in range(config.n_obs_steps):
+        observation = {k: batch[k][:, step] for k in [image_key, "observation.state"]}
+        if step < config.n_obs_steps - 1:
+            policy.observe(observation)
+            continue
+        with seeded_context(0):
+            actions = policy.select_action_chunk(observation)
+    with torch.no_grad(), seeded_context(0):
+        normalized = policy.normalize_inputs({k: batch[k] for k in [image_key, "observation.state"]})
+        normalized["observation.images"] = normalized[image_key].unsqueeze(2)
+        expected_actions = policy.diffusion.generate_actions(
+            normalized, n_action_steps=config.horizon - config.n_obs_steps + 1
+        )
+        expected_actions = policy.unnormalize_outputs({"action": expected_actions})["action"]
+    assert torch.allclose(actions, expected_actions, atol=1e-5)
+
+
+def make_tiny_act_policy() -> ACTPolicy:
+    """Small ACT policy (without pretrained backbone weights) with random dataset statistics, for one 64x64
+    camera and a state and action of dimension 4."""
+    config = ACTConfig(
+        input_shapes={"observation.images.top": [3, 64, 64], "observation.state": [4]},
+        output_shapes={"action": [4]},
+        input_normalization_modes={"observation.images.top": "mean_std", "observation.state": "min_max"},
+        output_normalization_modes={"action": "mean_std"},
+        chunk_size=10,
+        n_action_steps=5,
+        pretrained_backbone_weights=None,
+        dim_model=32,
+        n_heads=2,
+        dim_feedforward=64,
+        n_decoder_layers=1,
+        use_vae=False,
+    )
+    with seeded_context(0):
+        stats = {
+            "observation.images.top": {"mean": torch.rand(3, 1, 1), "std": torch.rand(3, 1, 1) + 0.1},
+            "observation.state": {"min": -torch.rand(4), "max": torch.rand(4)},
+            "action": {"mean": torch.randn(4), "std": torch.rand(4) + 0.1},
+        }
+        return ACTPolicy(config, dataset_stats=stats)
+
+
+def test_act_backbone_features():
+    """Check that ACT gives the same loss with the precomputed backbone features of the images as with the
+    images."""
+    policy = make_tiny_act_policy().eval()
+    config = policy.config
+    image_key = "observation.images.top"
+    with seeded_context(0):
+        batch = {
+            image_key: torch.rand(2, 3, 64, 64),
+            "observation.state": torch.randn(2, 4),
+            "action": torch.randn(2, config.chunk_size, 4),
+            "action_is_pad": torch.zeros(2, config.chunk_size, dtype=torch.bool),
+        }
+
+    features_batch = {k: v for k, v in batch.items() if k != image_key}
+    features = policy.encode_backbone_features(image_key, batch[image_key])
+    features_batch[backbone_features_key(image_key)] = features
+    with torch.no_grad():
+        expected_loss = policy.forward(batch)["loss"]
+        loss = policy.forward(features_batch)["loss"]
+    assert torch.allclose(loss, expected_loss, atol=1e-6)
+
+
+@pytest.mark.skipif(not hasattr(torch, "export"), reason="torch.export is not available")
+def test_export_act_policy(tmpdir):
+    """Check that the exported policy (with folded normalization and batch norms) matches the original one."""
+    policy = make_tiny_act_policy()
+    config = policy.config
+    with seeded_context(0):
+        # give non trivial running statistics to the batch norms, to check that they are folded correctly
+        for module in policy.modules():
+            if isinstance(module, FrozenBatchNorm2d):
+                module.running_mean.uniform_(-0.1, 0.1)
+                module.running_var.uniform_(0.5, 1.5)
+        policy.eval()
+        batch = {
+            "observation.images.top": torch.rand(1, 3, 64, 64),
+            "observation.state": torch.randn(1, 4),
+        }
+
+    output_path = export_policy(policy, Path(tmpdir) / "act.pt2", fps=30)
+    exported = ExportedPolicy.load(output_path)
+    assert exported.fps == 30
+    assert exported.input_keys == sorted(config.input_shapes)
+
+    with torch.no_grad():
+        expected = policy.select_action_chunk(batch)
+    assert torch.allclose(exported.select_action_chunk(batch), expected, atol=1e-4)
+    for i in range(config.n_action_steps):
+        assert torch.allclose(exported.select_action(batch), expected[:, i], atol=1e-4)
+
+    # the temporal ensembling of the actions is not run by the exported policy
+    policy.config.temporal_ensemble_coeff = 0.01
+    with pytest.raises(ValueError, match="temporal_ensemble_coeff"):
+        export_policy(policy, Path(tmpdir) / "act_ensembled.pt2", fps=30)
+    with pytest.raises(ValueError, match="cpu"):
+        ExportedPolicy.load(Path(tmpdir) / "act.onnx", device="cuda")
+
+
+@pytest.mark.skipif(not hasattr(torch, "export"), reason="torch.export is not available")
+def test_export_diffusion_policy(tmpdir):
+    """Check that the exported diffusion policy (with folded normalization) matches the original one, when the
+    noise of the reverse diffusion is drawn from the same seed."""
+    config = DiffusionConfig(
+        down_dims=(16, 32), diffusion_step_embed_dim=8, n_groups=4, horizon=8, num_inference_steps=5
+    )
+    image_key = "observation.image"
+    with seeded_context(0):
+        stats = {
+            image_key: {"mean": torch.rand(3, 1, 1), "std": torch.rand(3, 1, 1) + 0.1},
+            "observation.state": {"min": -torch.rand(2), "max": torch.rand(2)},
+            "action": {"min": -torch.rand(2), "max": torch.rand(2)},
+        }
+        policy = DiffusionPolicy(config, dataset_stats=stats).eval()
+        steps = [
+            {image_key: torch.rand(1, 3, 96, 96), "observation.state": torch.randn(1, 2)}
+            for _ in range(config.n_obs_steps)
+        ]
+
+    output_path = export_policy(policy, Path(tmpdir) / "diffusion.pt2", fps=10)
+    exported = ExportedPolicy.load(output_path)
+    assert exported.n_obs_steps == config.n_obs_steps
+    assert exported.input_keys == sorted(config.input_shapes)
+
+    policy.reset()
+    exported.reset()
+    for step in steps[:-1]:
+        policy.observe(step)
+        exported.observe(step)
+    with torch.no_grad(), seeded_context(0):
+        expected = policy.select_action_chunk(steps[-1])
+    with seeded_context(0):
+        actions = exported.select_action_chunk(steps[-1])
+    assert actions.shape == (1, config.horizon - config.n_obs_steps + 1, 2)
+    assert torch.allclose(actions, expected, atol=1e-4)
+
+
+def test_exported_policy_observation_history():
+    """Check that the observations given with `observe` make the history of the next chunk, and that the fps
+    is required."""
+    metadata = {
+        "version": 1,
+        "policy": "diffusion",
+        "input_keys": ["observation.state"],
+        "n_obs_steps": 2,
+        "n_action_steps": 4,
+        "fps": 10,
+    }
+    # the stand-in for the exported module returns its stacked observations as actions
+    exported = ExportedPolicy(lambda state: state, metadata)
+    states = [torch.full((1, 3), float(i)) for i in range(3)]
+    exported.observe({"observation.state": states[0]})
+    exported.observe({"observation.state": states[1]})
+    chunk = exported.select_action_chunk({"observation.state": states[2]})
+    assert torch.equal(chunk, torch.stack(states[1:], dim=1))
+
+    # without history, the current observation is repeated
+    exported.reset()
+    chunk = exported.select_action_chunk({"observation.state": states[2]})
+    assert torch.equal(chunk, torch.stack([states[2], states[2]], dim=1))
+
+    with pytest.raises(ValueError, match="fps"):
+        ExportedPolicy(lambda state: state, {**metadata, "fps": None})
+
+
 if __name__ == "__main__":
     test_act_temporal_ensembler()
@@ -92,3 +92,52 @@ def test_init_hydra_config_empty():
     with open(test_file, "w") as f:
         f.write("\n")
     init_hydra_config(test_file)
+
+
+class FakeClock:
+    """Clock advancing by `step_s` every time it is read, and by the requested duration when sleeping."""
+
+    def __init__(self, step_s=1e-4):
+        self.now = 0.0
+        self.step_s = step_s
+
+    def perf_counter(self):
+        self.now += self.step_s
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.mark.parametrize("overrun_policy", ["catch_up", "skip"])
+def test_control_loop_scheduler(monkeypatch, overrun_policy):
+    from lerobot.common.robot_devices import utils as robot_devices_utils
+    from lerobot.common.robot_devices.utils import ControlLoopScheduler
+
+    clock = FakeClock()
+    monkeypatch.setattr(robot_devices_utils.time, "perf_counter", clock.perf_counter)
+    monkeypatch.setattr(robot_devices_utils.time, "sleep", clock.sleep)
+
+    fps = 10
+    scheduler = ControlLoopScheduler(fps, overrun_policy=overrun_policy)
+    scheduler.reset(start=0.0)
+    # the 3rd iteration overruns by 2.5 periods
+    work_s = [0.01, 0.01, 0.35, 0.01, 0.01, 0.01, 0.01]
+    for dt_s in work_s:
+        clock.sleep(dt_s)
+        scheduler.wait()
+
+    stats = scheduler.stats()
+    assert stats["num_ticks"] == len(work_s)
+    assert stats["num_overruns"] >= 1
+    if overrun_policy == "skip":
+        # the missed deadlines are skipped, so the loop stays on the 1 / fps grid
+        assert stats["num_skipped_ticks"] == 3
+        assert scheduler.tick == len(work_s) + 3
+        assert stats["jitter_max_s"] < 1e-3
+    else:
+        # the late iterations run back to back until the loop is back on schedule
+        assert stats["num_skipped_ticks"] == 0
+        assert scheduler.tick == len(work_s)
+    # the deadlines are absolute, so the time does not drift
+    assert clock.now == pytest.approx(scheduler.tick / fps, abs=1e-3)
@@ -16,9 +16,16 @@
 
 from pathlib import Path
 
+import numpy as np
 import pytest
 
-from lerobot.scripts.visualize_dataset_html import visualize_dataset_html
+from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
+from lerobot.scripts.visualize_dataset_html import (
+    get_ep_csv_fname,
+    make_app,
+    visualize_dataset_html,
+    write_episode_data_csv,
+)
 
 
 @pytest.mark.parametrize(
@@ -34,3 +41,78 @@ def test_visualize_dataset_html(tmpdir, repo_id):
         serve=False,
     )
     assert (tmpdir / "static" / "episode_0.csv").exists()
+
+
+def read_episode_rows(dataset: LeRobotDataset, episode_index: int) -> list[list[float]]:
+    """Rows of the csv file of an episode, read frame by frame from the dataset."""
+    from_idx = dataset.episode_data_index["from"][episode_index].item()
+    to_idx = dataset.episode_data_index["to"][episode_index].item()
+    data = dataset.hf_dataset.select_columns(["timestamp", "observation.state", "action"])
+    return [
+        [data[i]["timestamp"].item(), *data[i]["observation.state"].tolist(), *data[i]["action"].tolist()]
+        for i in range(from_idx, to_idx)
+    ]
+
+
+def test_write_episode_data_csv(tmpdir):
+    """Check that the csv files, written from whole arrow columns, match the values of the frames."""
+    tmpdir = Path(tmpdir)
+    dataset = LeRobotDataset("lerobot/pusht")
+    # episodes of different lengths
+    for episode_index in [0, 1]:
+        write_episode_data_csv(tmpdir, get_ep_csv_fname(episode_index), episode_index, dataset)
+        with open(tmpdir / get_ep_csv_fname(episode_index)) as f:
+            header = f.readline().strip().split(",")
+            values = np.loadtxt(f, delimiter=",", ndmin=2)
+        assert header == ["timestamp", "state_0", "state_1", "action_0", "action_1"]
+        np.testing.assert_allclose(values, read_episode_rows(dataset, episode_index), rtol=1e-7)
+    # no temporary file is left behind
+    assert sorted(path.name for path in tmpdir.iterdir()) == ["episode_0.csv", "episode_1.csv"]
+
+
+def test_show_episode_data(tmpdir):
+    """Check that the csv file of an episode is written when it is first requested."""
+    static_dir = Path(tmpdir) / "static"
+    template_dir = Path(__file__).resolve().parent.parent / "lerobot" / "templates"
+    dataset = LeRobotDataset("lerobot/pusht")
+    client = make_app(dataset, [0, 1], static_dir, template_dir).test_client()
+
+    response = client.get("/lerobot/pusht/episode_1.csv")
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert (static_dir / "episode_1.csv").exists()
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == "timestamp,state_0,state_1,action_0,action_1"
+    np.testing.assert_allclose(
+        np.loadtxt(lines[1:], delimiter=",", ndmin=2), read_episode_rows(dataset, 1), rtol=1e-7
+    )
+    response.close()
+
+    response = client.get("/")
+    assert response.status_code == 302
+    assert response.location.endswith("/lerobot/pusht/episode_0")
+
+
+def test_show_episode_data_not_found(tmpdir):
+    """Check that unknown datasets and episodes are not found, and that the csv files of a previous run are
+    not served."""
+    static_dir = Path(tmpdir) / "static"
+    static_dir.mkdir()
+    (static_dir / "episode_0.csv").write_text("stale")
+    template_dir = Path(__file__).resolve().parent.parent / "lerobot" / "templates"
+    dataset = LeRobotDataset("lerobot/pusht")
+    client = make_app(dataset, [0, 1], static_dir, template_dir).test_client()
+
+    response = client.get("/lerobot/pusht/episode_0.csv")
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).splitlines()[0] == "timestamp,state_0,state_1,action_0,action_1"
+    response.close()
+
+    for url in [
+        "/lerobot/aloha/episode_0.csv",
+        "/other/pusht/episode_0.csv",
+        "/lerobot/pusht/episode_2.csv",
+        "/lerobot/pusht/episode_2",
+    ]:
+        assert client.get(url).status_code == 404
+    assert not (static_dir / "episode_2.csv").exists()